@@ -0,0 +1,253 @@
+"""Accumulate click sums by key and describe them per IR
+
+GitHub repository URL: <https://github.com/imls-measuring-up/ramp-analyses-scripts>
+
+The ccdAgg and itemAgg statistics in "RAMP_summary_stats_YYYYMMDD.csv" describe the
+distribution of click sums per URL and per item within each IR: their sum, count, mean,
+standard deviation, minimum, quartiles and maximum, as reported by pandas' describe().
+Computing them with groupby(...).describe() runs describe() separately for every IR
+on a materialized data frame.
+
+describe_groups computes the describe() statistics of all IR at once from an array of
+values and an array of IR labels. The values are grouped with a stable sort, so each IR's
+values stay in the order pandas would see them, and then:
+
+* the count, sum, minimum and maximum are exact,
+* the mean and standard deviation use the same two-pass formula as pandas (the mean is
+  the sum divided by the count, and the variance is the sum of squared deviations from
+  the mean divided by count - 1), so they are equal to describe() up to floating-point
+  rounding of the standard deviation (the squared deviations can be summed in a different
+  order, so its last digit can differ), and
+* the quartiles are exact, interpolated linearly between the sorted values as numpy's
+  percentile does, which is what pandas uses.
+
+With concentration=True, describe_groups also reports how concentrated each IR's clicks
+are: the share of the clicks held by the top 1% and 10% of values, and the Gini
+coefficient. Both are computed from the same sorted values as the quartiles, so they
+don't cost another sort. top_by_group finds the largest values of each IR, e.g. the most
+clicked items, by partial selection (np.partition) rather than by sorting all of them.
+
+count_unique and sum_by_code count unique values and sum clicks per IR and key when the
+keys are integer codes (see encode_urls in "ramp_aggregate"), combining each IR and code
+into a single integer, so no strings are hashed.
+
+A streaming (Welford) update of the moments isn't used: the values being described are
+click sums per key, which are only final once the sums of every chunk, file and month
+have been merged (see merge_url_clicks in "ramp_aggregate"), and the
+two-pass formula over the final sums is both cheap and as accurate as pandas at that
+point.
+
+Dependencies:
+
+Python modules pandas and numpy, available from <https://pandas.pydata.org/> and
+<https://numpy.org/>.
+
+"""
+
+
+import numpy as np
+
+import pandas as pd
+
+
+# The statistics reported by describe_groups, in the order of pandas' describe(),
+# after the sum.
+DESCRIBE_STATS = ['sum', 'count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max']
+
+# The quantiles reported by describe().
+QUARTILES = {'25%': 0.25, '50%': 0.5, '75%': 0.75}
+
+# The concentration statistics reported by describe_groups with concentration=True: the
+# share of the total held by the top 1% and 10% of values (at least one value), and the
+# Gini coefficient of the values.
+TOP_SHARES = {'top1': 1, 'top10': 10}
+CONCENTRATION_STATS = list(TOP_SHARES) + ['gini']
+
+
+def describe_values(values, concentration=False):
+    """Compute the sum and the pandas describe() statistics of a 1-D numpy
+       array of numbers.
+
+    Parameters
+    ----------
+
+    values:
+        A non-empty numpy array.
+    concentration:
+        Whether to add the statistics listed in CONCENTRATION_STATS.
+
+    Returns
+    -------
+
+    stats:
+        A dictionary with the keys listed in DESCRIBE_STATS, and in
+        CONCENTRATION_STATS if requested. The count and all statistics except
+        the sum are floats, as in describe().
+
+    """
+
+    n = len(values)
+    total = values.sum()
+    mean = values.sum(dtype=np.float64) / n
+    std = np.nan
+    if n > 1:
+        std = np.sqrt(((mean - values) ** 2).sum(dtype=np.float64) / (n - 1))
+    ordered = np.sort(values)
+    stats = {'sum': total, 'count': float(n), 'mean': mean, 'std': std,
+             'min': float(ordered[0]), 'max': float(ordered[-1])}
+    quantiles = np.percentile(ordered, [100 * q for q in QUARTILES.values()])
+    stats.update(zip(QUARTILES, quantiles.astype(np.float64)))
+    if concentration:
+        total = float(total)
+        for name, percent in TOP_SHARES.items():
+            top = max(1, -(-n * percent // 100))
+            stats[name] = ordered[n - top:].sum(dtype=np.float64) / total if total else np.nan
+        # With the values in ascending order x_1, ..., x_n:
+        # G = 2 * sum(i * x_i) / (n * sum(x)) - (n + 1) / n.
+        ranks = np.arange(1, n + 1, dtype=np.float64)
+        stats['gini'] = 2 * (ranks * ordered).sum() / (n * total) - (n + 1) / n if total else np.nan
+    return stats
+
+
+def count_unique(groups, codes, n_groups):
+    """Count the unique codes in each group.
+
+    Parameters
+    ----------
+
+    groups:
+        A numpy array of integer group codes from 0 to n_groups - 1, e.g. from
+        pd.factorize.
+    codes:
+        A numpy array of integer codes of the same length, e.g. dictionary codes
+        of URLs. Negative codes (missing values) are counted as one value, as
+        pd.unique counts missing values.
+    n_groups:
+        The number of groups.
+
+    Returns
+    -------
+
+    counts:
+        A numpy array of the number of unique codes in each group.
+
+    """
+
+    # Shift the codes so missing values are 0, and combine each group and code
+    # into one integer.
+    codes = np.maximum(np.asarray(codes, dtype=np.int64), -1) + 1
+    width = int(codes.max(initial=0)) + 1
+    pairs = pd.unique(np.asarray(groups, dtype=np.int64) * width + codes)
+    return np.bincount(pairs // width, minlength=n_groups)
+
+
+def sum_by_code(groups, codes, values):
+    """Sum integer values per group and code, skipping rows with a negative
+       (missing) code, as groupby does.
+
+    Parameters
+    ----------
+
+    groups:
+        A numpy array of non-negative integer group codes.
+    codes:
+        A numpy array of integer codes of the same length, e.g. dictionary codes
+        of item URIs.
+    values:
+        A numpy array of integers of the same length, e.g. click sums per URL.
+
+    Returns
+    -------
+
+    group_of_sums:
+        A numpy array of the group code of each sum.
+    code_of_sums:
+        A numpy array of the code of each sum.
+    sums:
+        A numpy array of int64 sums, one per (group, code) pair, in order of
+        first appearance.
+
+    """
+
+    codes = np.asarray(codes, dtype=np.int64)
+    valid = codes >= 0
+    width = int(codes.max(initial=0)) + 1
+    pair_codes, pairs = pd.factorize(np.asarray(groups, dtype=np.int64)[valid] * width + codes[valid])
+    sums = np.zeros(len(pairs), dtype=np.int64)
+    np.add.at(sums, pair_codes, np.asarray(values, dtype=np.int64)[valid])
+    return pairs // width, pairs % width, sums
+
+
+def describe_groups(groups, values, concentration=False):
+    """Compute the sum and the pandas describe() statistics of the values in
+       each group.
+
+    Parameters
+    ----------
+
+    groups:
+        An array-like of group labels, e.g. RAMP page-click index names.
+    values:
+        A numpy array of the same length, e.g. click sums per URL.
+    concentration:
+        Whether to add the statistics listed in CONCENTRATION_STATS.
+
+    Returns
+    -------
+
+    desc:
+        A data frame indexed by group, in order of first appearance, with the
+        columns listed in DESCRIBE_STATS (and CONCENTRATION_STATS). The sum has
+        the type of the values, and the other columns are floats.
+
+    """
+
+    codes, labels = pd.factorize(np.asarray(groups))
+    order = np.argsort(codes, kind='stable')
+    values = np.asarray(values)[order]
+    bounds = np.searchsorted(codes[order], np.arange(len(labels) + 1))
+    rows = [describe_values(values[bounds[g]:bounds[g + 1]], concentration) for g in range(len(labels))]
+    columns = DESCRIBE_STATS + (CONCENTRATION_STATS if concentration else [])
+    desc = pd.DataFrame(rows, index=pd.Index(labels, name='index'), columns=columns)
+    desc['sum'] = desc['sum'].astype(values.dtype)
+    return desc
+
+
+def top_by_group(groups, values, n):
+    """Find the n largest values in each group by partial selection.
+
+    Parameters
+    ----------
+
+    groups:
+        A numpy array of non-negative integer group codes.
+    values:
+        A numpy array of numbers of the same length, e.g. click sums per item.
+    n:
+        The number of values to find in each group.
+
+    Returns
+    -------
+
+    positions:
+        A numpy array of the positions of the largest values of each group, in
+        order of group code and of descending value. Equal values are in order
+        of position, so the result doesn't depend on the selection algorithm.
+
+    """
+
+    groups = np.asarray(groups, dtype=np.int64)
+    values = np.asarray(values)
+    order = np.argsort(groups, kind='stable')
+    bounds = np.searchsorted(groups[order], np.arange(groups.max(initial=-1) + 2))
+    selected = []
+    for first, last in zip(bounds[:-1], bounds[1:]):
+        group = order[first:last]
+        if len(group) > n:
+            # Keep the values above the n-th largest, and the first of those equal to it.
+            kth = np.partition(values[group], len(group) - n)[len(group) - n]
+            above = group[values[group] > kth]
+            group = np.concatenate([above, group[values[group] == kth][:n - len(above)]])
+        selected.append(group[np.lexsort([group, -values[group]])])
+    return np.concatenate(selected) if selected else np.array([], dtype=np.int64)
+
@@ -0,0 +1,445 @@
+"""Aggregate RAMP page-click data into per-IR summary statistics
+
+GitHub repository URL: <https://github.com/imls-measuring-up/ramp-analyses-scripts>
+
+The functions in this module compute the RAMP statistics reported in the
+"RAMP_summary_stats_YYYYMMDD.csv" file (see "RAMP_summary_stats_documentation.md"
+in the "results" directory) for every IR at once. Citable content rows with a
+positive click count are selected from the page-click data once and summed per
+IR and URL. Every statistic in the output file can be computed from these per-URL
+sums: item URLs are inferred once per unique URL and normalizer, and all of the counts,
+sums and descriptive statistics are computed by grouping on the RAMP page-click index,
+instead of filtering the full data set separately for each IR.
+
+The URLs, and the item URLs and URIs inferred from them, are dictionary-encoded as
+integer codes first (encode_urls), so the unique counts and the per-item sums are
+computed on integer arrays rather than by hashing long URL strings again for every
+statistic.
+
+Because per-URL sums of different files or chunks of a file can be merged, the page-
+click data don't have to be loaded into memory all at once (see "ramp_load_data").
+
+Dependencies:
+
+Python modules pandas and numpy, available from <https://pandas.pydata.org/> and
+<https://numpy.org/>, and the "ramp_accumulate," "ramp_normalize," "ramp_profile" and "ramp_windows" modules
+included in the same directory.
+
+"""
+
+
+import numpy as np
+
+import pandas as pd
+
+from ramp_accumulate import count_unique, describe_groups, sum_by_code, top_by_group
+
+from ramp_normalize import Normalizer, get_normalizer
+
+from ramp_profile import RunReport, error_record
+
+from ramp_windows import date_segments
+
+
+# The RAMP statistics computed per IR, in the order they appear in the output file.
+STAT_COLS = ['countCcdUrls', 'countItemUrls', 'countItemUris', 'sumCcd',
+             'ccdAggSum', 'ccdAggCount', 'ccdAggMean', 'ccdAggStd', 'ccdAggMin',
+             'ccdAgg25', 'ccdAgg50', 'ccdAgg75', 'ccdAggMax',
+             'itemAggSum', 'itemAggCount', 'itemAggMean', 'itemAggStd', 'itemAggMin',
+             'itemAgg25', 'itemAgg50', 'itemAgg75', 'itemAggMax',
+             'itemTop1Share', 'itemTop10Share', 'itemGini',
+             'serp1', 'serp1CcdSum', 'serp100', 'serp100CcdSum']
+
+# The per-URL sums that the statistics are computed from.
+URL_CLICK_COLS = ['clicks', 'serp1', 'serp1CcdSum', 'serp100', 'serp100CcdSum']
+
+# The largest search result position counted for the serp1 and serp100 statistics.
+SERP_POSITIONS = {'serp1': 10, 'serp100': 1000}
+
+# The integer code columns added by encode_urls, by encoded column.
+ENCODED_COLS = {'url': 'url_code', 'html_url': 'html_code', 'unique_item_uri': 'item_code'}
+
+# Suffixes used for the sum and pandas describe() statistics in the output columns.
+DESCRIBE_SUFFIXES = {'sum': 'Sum', 'count': 'Count', 'mean': 'Mean', 'std': 'Std', 'min': 'Min',
+                     '25%': '25', '50%': '50', '75%': '75', 'max': 'Max'}
+
+# The output columns of the concentration statistics of the per-item click sums (see
+# describe_groups in "ramp_accumulate").
+CONCENTRATION_COLS = {'top1': 'itemTop1Share', 'top10': 'itemTop10Share', 'gini': 'itemGini'}
+
+# The columns of the most clicked items and URLs of each IR, see describe_urls.
+TOP_COLS = ['index', 'kind', 'rank', 'key', 'html_url', 'clicks', 'share']
+
+
+def citable_clicks(ramp_data):
+    """Select the rows of RAMP page-click data that are used for the summary
+       statistics: citable content URLs with a positive click count.
+
+    Parameters
+    ----------
+
+    ramp_data:
+        A pandas data frame of RAMP page-click data.
+
+    Returns
+    -------
+
+    clicks:
+        A data frame with the 'index', 'url', 'clicks' and 'position' columns
+        of the selected rows, and the 'date' column if ramp_data has one.
+
+    """
+
+    citable = ramp_data['citableContent']
+    # Files loaded with the declared schema (see "ramp_load_data") have a boolean column.
+    if citable.dtype != bool:
+        citable = citable == 'Yes'
+    selected = citable & (ramp_data['clicks'] > 0)
+    # Dates are kept if they were read, for statistics by date window.
+    columns = ['index', 'url', 'clicks', 'position'] + (['date'] if 'date' in ramp_data.columns else [])
+    return ramp_data.loc[selected, columns]
+
+
+def normalizer_groups(normalizers):
+    """Group RAMP page-click index names by normalizer.
+
+    Returns
+    -------
+
+    groups:
+        A dictionary mapping normalizer keys to (normalizer, list of RAMP page-click
+        index names) pairs.
+
+    """
+
+    groups = {}
+    for pc_index, normalizer in normalizers.items():
+        groups.setdefault(normalizer.key, (normalizer, []))[1].append(pc_index)
+    return groups
+
+
+def encode_urls(urls, normalizers, url_cache=None, errors=None):
+    """Dictionary-encode the URLs of per-URL sums, and the item URLs and URIs
+       inferred from them, as integer codes. Each unique URL is normalized once,
+       as a dictionary entry, and the item URLs and URIs of the entries are
+       encoded in turn, so no string column has to be hashed more than once.
+
+    Parameters
+    ----------
+
+    urls:
+        A pandas data frame of per-URL sums with 'index' and 'url' columns, e.g.
+        url_clicks.reset_index().
+    normalizers:
+        A dictionary mapping RAMP page-click index names to normalizers.
+    url_cache:
+        An optional NormalizationCache used instead of calling the normalizers
+        directly.
+    errors:
+        An optional list. If given, an error raised while normalizing the URLs
+        of a normalizer doesn't stop the others: an error record (see error_record
+        in "ramp_profile") is appended to the list for each IR of the normalizer,
+        and their rows are left out of the result.
+
+    Returns
+    -------
+
+    codes:
+        The per-URL sums with the int64 columns listed in ENCODED_COLS instead
+        of the 'url' column. Missing values, and rows of IR without a normalizer,
+        have the code -1.
+    dictionary:
+        A dictionary mapping 'url', 'html_url' and 'unique_item_uri' to numpy
+        object arrays of the encoded values: the value with code i is at
+        position i.
+
+    """
+
+    codes = {col: np.full(len(urls), -1, dtype=np.int64) for col in ENCODED_COLS}
+    entries = {col: [] for col in ENCODED_COLS}
+    offsets = dict.fromkeys(ENCODED_COLS, 0)
+    failed = np.zeros(len(urls), dtype=bool)
+    for normalizer, indexes in normalizer_groups(normalizers).values():
+        selected = urls['index'].isin(indexes).to_numpy()
+        if not selected.any():
+            continue
+        url_codes, url_entries = pd.factorize(urls['url'][selected])
+        url_entries = pd.Series(np.asarray(url_entries, dtype=object))
+        try:
+            if url_cache is not None:
+                items = url_cache.normalize(url_entries, normalizer)
+            else:
+                items = normalizer.normalize(url_entries)
+        except Exception as e:
+            if errors is None:
+                raise
+            ir_indexes = pd.unique(np.asarray(urls['index'][selected], dtype=object))
+            errors.extend(error_record('normalize', e, pc_index=pc_index, normalizer=normalizer.key)
+                          for pc_index in ir_indexes)
+            failed |= selected
+            continue
+        entry_codes = {'url': (np.arange(len(url_entries)), url_entries)}
+        entry_codes['html_url'] = pd.factorize(items['html_url'])
+        entry_codes['unique_item_uri'] = pd.factorize(items['unique_item_uri'])
+        for col, (col_codes, values) in entry_codes.items():
+            row_codes = np.where(url_codes >= 0, col_codes[url_codes], -1)
+            codes[col][selected] = np.where(row_codes >= 0, row_codes + offsets[col], -1)
+            entries[col].append(np.asarray(values, dtype=object))
+            offsets[col] += len(values)
+
+    encoded = urls.drop(columns=['url'])
+    for col, code_col in ENCODED_COLS.items():
+        encoded[code_col] = codes[col]
+    if failed.any():
+        encoded = encoded[~failed]
+    dictionary = {col: np.concatenate(entries[col]) if entries[col] else np.array([], dtype=object)
+                  for col in ENCODED_COLS}
+    return encoded, dictionary
+
+
+def aggregate_url_clicks(clicks, bounds=None):
+    """Sum citable content clicks per IR and URL. The result is a partial
+       aggregate: aggregates of different files, or of chunks of the same file,
+       can be combined with merge_url_clicks.
+
+    Parameters
+    ----------
+
+    clicks:
+        A pandas data frame of citable content rows with positive clicks,
+        as returned by citable_clicks.
+    bounds:
+        Optional boundaries of date window segments, as returned by window_bounds
+        (see "ramp_windows"). If given, clicks needs a 'date' column, and clicks
+        are summed per segment, IR and URL. Rows outside of all segments are left
+        out.
+
+    Returns
+    -------
+
+    url_clicks:
+        A data frame indexed by RAMP page-click index and URL (and segment, first,
+        if bounds are given) with the columns listed in URL_CLICK_COLS: the sum of
+        clicks, the number of rows with a position of 10 or less and 1000 or less,
+        and the clicks in those rows.
+
+    """
+
+    # Sum clicks as 64-bit integers, even if they were loaded as 32-bit integers.
+    click_counts = clicks['clicks'].astype('int64')
+    columns = {'index': clicks['index'], 'url': clicks['url'], 'clicks': click_counts}
+    for serp, max_position in SERP_POSITIONS.items():
+        on_serp = clicks['position'] <= max_position
+        columns[serp] = on_serp.astype('int64')
+        columns[serp + 'CcdSum'] = click_counts.where(on_serp, 0)
+    if bounds is None:
+        return pd.DataFrame(columns).groupby(['index', 'url'], sort=False, observed=True).sum()
+    columns = pd.DataFrame(columns)
+    columns.insert(0, 'segment', date_segments(clicks['date'], bounds))
+    columns = columns[columns['segment'].to_numpy() >= 0]
+    return columns.groupby(['segment', 'index', 'url'], sort=False, observed=True).sum()
+
+
+def merge_url_clicks(partials, bounds=None):
+    """Combine partial per-URL aggregates returned by aggregate_url_clicks.
+
+    Parameters
+    ----------
+
+    partials:
+        A list of data frames returned by aggregate_url_clicks or merge_url_clicks.
+    bounds:
+        The date window segment boundaries the partials were aggregated with, if
+        any. Only used to make an empty result with the right index.
+
+    Returns
+    -------
+
+    url_clicks:
+        A single data frame of per-URL sums for all of the partial aggregates.
+
+    """
+
+    partials = [p for p in partials if len(p) > 0]
+    if len(partials) == 0:
+        return aggregate_url_clicks(pd.DataFrame(columns=['index', 'url', 'clicks', 'position', 'date']), bounds)
+    if len(partials) == 1:
+        return partials[0]
+    return pd.concat(partials).groupby(level=list(partials[0].index.names), sort=False, observed=True).sum()
+
+
+def top_rows(irs, groups, codes, values, top_n, keys, html_codes, html_urls, totals):
+    """Make the rows of the most clicked keys (items or URLs) of each IR. Used
+       by describe_urls.
+
+    Parameters
+    ----------
+
+    irs:
+        A pandas index of RAMP page-click index names, by IR code.
+    groups, codes, values:
+        Numpy arrays of the IR code, key code and click sum of each key.
+    top_n:
+        The number of keys per IR.
+    keys:
+        A numpy array of the keys, by key code.
+    html_codes:
+        A numpy array of the item URL code of each key, or -1.
+    html_urls:
+        A numpy array of the item URLs, by item URL code.
+    totals:
+        A numpy array of the total clicks of each IR, by IR code.
+
+    Returns
+    -------
+
+    top:
+        A data frame with the columns listed in TOP_COLS except 'kind'.
+
+    """
+
+    positions = top_by_group(groups, values, top_n)
+    top_groups = groups[positions]
+    top_codes = codes[positions]
+    top_html = html_codes[positions]
+    return pd.DataFrame({'index': np.asarray(irs[top_groups], dtype=object),
+                         'rank': pd.Series(top_groups).groupby(top_groups).cumcount().to_numpy() + 1,
+                         'key': keys[top_codes],
+                         'html_url': np.where(top_html >= 0, html_urls[np.maximum(top_html, 0)], None),
+                         'clicks': values[positions],
+                         'share': values[positions] / totals[top_groups]})
+
+
+def describe_urls(urls, dictionary=None, top=None, top_n=10):
+    """Compute the RAMP summary statistics for the IR in dictionary-encoded
+       per-URL sums, as returned by encode_urls. Used by summarize_url_clicks.
+       The URLs, item URLs and item URIs are only counted and grouped by their
+       integer codes.
+
+    Parameters
+    ----------
+
+    urls:
+        A pandas data frame of per-URL sums with an 'index' column and the
+        columns listed in ENCODED_COLS.
+    dictionary:
+        The dictionary of the encoded values returned by encode_urls. Only
+        needed for top.
+    top:
+        An optional list. If given, a data frame of the top_n most clicked items
+        and URLs of each IR is appended to it, with the columns listed in
+        TOP_COLS: the IR's page-click 'index', the 'kind' ('item' or 'url'), the
+        'rank', the item URI or URL ('key'), its item URL ('html_url'; for an
+        item, the first seen), its 'clicks' and its 'share' of the IR's clicks.
+    top_n:
+        The number of items and URLs per IR in top.
+
+    Returns
+    -------
+
+    stats:
+        A data frame indexed by RAMP page-click index with the columns listed
+        in STAT_COLS, for the IR in the data only.
+
+    """
+
+    ir_codes, irs = pd.factorize(np.asarray(urls['index'], dtype=object))
+    irs = pd.Index(irs, name='index')
+    stats = pd.DataFrame({
+        # Missing item URLs and URIs are counted as one value, as pd.unique does.
+        col: count_unique(ir_codes, urls[code_col].to_numpy(), len(irs))
+        for col, code_col in zip(['countCcdUrls', 'countItemUrls', 'countItemUris'], ENCODED_COLS.values())
+    }, index=irs)
+    sums = urls[URL_CLICK_COLS].groupby(ir_codes).sum()
+    stats['sumCcd'] = sums['clicks'].to_numpy()
+
+    clicks = urls['clicks'].to_numpy(dtype=np.int64)
+    item_codes = urls['item_code'].to_numpy()
+    item_groups, item_keys, item_sums = sum_by_code(ir_codes, item_codes, clicks)
+    aggs = {'ccdAgg': (ir_codes, clicks), 'itemAgg': (item_groups, item_sums)}
+    for prefix, (groups, values) in aggs.items():
+        # The concentration statistics are computed from the same sorted values
+        # as the quartiles.
+        desc = describe_groups(groups, values, concentration=prefix == 'itemAgg')
+        desc.index = irs[desc.index.to_numpy(dtype=np.int64)]
+        desc = desc.rename(columns=lambda c: prefix + DESCRIBE_SUFFIXES[c] if c in DESCRIBE_SUFFIXES else c)
+        stats = stats.join(desc.rename(columns=CONCENTRATION_COLS))
+    for serp in SERP_POSITIONS:
+        stats[serp] = sums[serp].to_numpy()
+        stats[serp + 'CcdSum'] = sums[serp + 'CcdSum'].to_numpy()
+
+    if top is not None and top_n > 0:
+        html_codes = urls['html_code'].to_numpy()
+        # The item URL of each item is the first one seen: assigning in reverse
+        # order leaves the first value.
+        item_html = np.full(len(dictionary['unique_item_uri']), -1, dtype=np.int64)
+        with_item = np.flatnonzero(item_codes >= 0)[::-1]
+        item_html[item_codes[with_item]] = html_codes[with_item]
+        totals = sums['clicks'].to_numpy()
+        kinds = {'item': (item_groups, item_keys, item_sums, dictionary['unique_item_uri'], item_html[item_keys]),
+                 'url': (ir_codes, urls['url_code'].to_numpy(), clicks, dictionary['url'], html_codes)}
+        frames = [top_rows(irs, groups, codes, values, top_n, keys, html, dictionary['html_url'], totals)
+                  .assign(kind=kind) for kind, (groups, codes, values, keys, html) in kinds.items()]
+        top_items = pd.concat(frames, ignore_index=True)
+        # Order the rows by IR, in order of first appearance, then items before URLs.
+        order = np.lexsort([top_items['kind'].to_numpy() == 'url', irs.get_indexer(top_items['index'])])
+        top.append(top_items.take(order)[TOP_COLS].reset_index(drop=True))
+    return stats
+
+
+def summarize_url_clicks(url_clicks, normalizers, url_cache=None, report=None, errors=None, top=None, top_n=10):
+    """Compute the RAMP summary statistics for all IR from per-URL sums.
+
+    Parameters
+    ----------
+
+    url_clicks:
+        A pandas data frame returned by aggregate_url_clicks or merge_url_clicks.
+    normalizers:
+        A dictionary mapping RAMP page-click index names to normalizers, e.g.
+        from normalizers_for, or to IR platforms, e.g. built from the
+        'ir_page_click_index' and 'Platform' columns of "RAMP_IR_base_info.csv."
+    url_cache:
+        An optional NormalizationCache used to infer item URLs.
+    report:
+        An optional RunReport, to which 'normalize' and 'describe' stages are added.
+    errors:
+        An optional list to collect error records in, see encode_urls. If it isn't
+        given, errors are raised.
+    top, top_n:
+        An optional list, to which a data frame of the top_n most clicked items
+        and URLs of each IR is appended, see describe_urls.
+
+    Returns
+    -------
+
+    stats:
+        A data frame indexed by RAMP page-click index with the columns listed
+        in STAT_COLS. IR without any citable clicks get zero counts and sums.
+        IR without a normalizer, and IR with errors, are left out.
+
+    """
+
+    normalizers = {k: v if isinstance(v, Normalizer) else get_normalizer(v)
+                   for k, v in normalizers.items()}
+    normalizers = {k: v for k, v in normalizers.items() if v is not None}
+    report = report or RunReport(enabled=False)
+    urls = url_clicks.reset_index()
+    urls = urls[urls['index'].isin(list(normalizers))]
+    # Item URLs only need to be inferred once for each unique URL, and are only
+    # counted and grouped as integer codes.
+    first_error = len(errors) if errors is not None else 0
+    with report.stage('normalize', rows=len(urls)):
+        urls, dictionary = encode_urls(urls, normalizers, url_cache, errors)
+    failed = {e['pc_index'] for e in (errors or [])[first_error:]}
+
+    with report.stage('describe', rows=len(urls)):
+        stats = describe_urls(urls, dictionary, top, top_n)
+
+    # Add IR without citable clicks, keeping integer counts and sums as integers.
+    dtypes = stats.dtypes
+    stats = stats.reindex([pc_index for pc_index in normalizers if pc_index not in failed])
+    totals = [c for c in STAT_COLS if c.startswith(('count', 'sum', 'serp')) or c.endswith(('Sum', 'Count'))]
+    stats[totals] = stats[totals].fillna(0)
+    stats = stats.astype(dtypes[totals])
+    return stats[STAT_COLS]
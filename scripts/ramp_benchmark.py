@@ -0,0 +1,308 @@
+"""Benchmark the RAMP summary statistics pipeline on synthetic data
+
+GitHub repository URL: <https://github.com/imls-measuring-up/ramp-analyses-scripts>
+
+This script times the stages of "ramp_summary_stats_normalize_urls.py" and measures
+the peak memory used by each, without the RAMP data from Dryad or network access.
+A synthetic RAMP data subset is written first (see "ramp_synthetic_data"), and the
+same functions the summary statistics script uses are then run on it:
+
+* ingest: read the page-click files and sum citable content clicks per URL
+  (load_url_clicks).
+* normalize: infer item URLs for every unique URL and encode the URLs as integer
+  codes (encode_urls, with a new NormalizationCache).
+* aggregate: compute the per-IR statistics (summarize_url_clicks).
+* output: join the statistics with the IR information and write a CSV file.
+* access: read the country-device files and compute the access tables
+  (stream_country_device and summarize_country_device).
+
+Peak memory is measured with tracemalloc, which counts memory allocated by Python and
+numpy in this process; page-click files read by other processes (workers greater than
+1) are not included in the ingest stage. The largest resident set size of this process
+and of its child processes is reported as well.
+
+The results are printed and can be saved as a JSON report. If a report from an earlier
+run is given as a baseline, any stage that is slower or uses more memory than in the
+baseline by more than the tolerance is reported, and the script exits with status 1,
+so performance regressions can be caught offline. For example:
+
+    python ramp_benchmark.py --rows 1000000 --report baseline.json
+    (make changes)
+    python ramp_benchmark.py --rows 1000000 --baseline baseline.json
+
+Dependencies:
+
+Python modules pandas and numpy, available from <https://pandas.pydata.org/> and
+<https://numpy.org/>, and the "ramp_synthetic_data," "ramp_load_data," "ramp_aggregate,"
+"ramp_normalize," "ramp_country_device" and "ramp_profile" modules included in the same
+directory.
+
+"""
+
+
+import os
+
+import sys
+
+import json
+
+import time
+
+import shutil
+
+import platform
+
+import argparse
+
+import tempfile
+
+import tracemalloc
+
+import pandas as pd
+
+from ramp_aggregate import encode_urls, summarize_url_clicks
+
+from ramp_country_device import read_country_codes, stream_country_device, summarize_country_device
+
+from ramp_load_data import find_ramp_files, load_url_clicks
+
+from ramp_normalize import NormalizationCache, normalizers_for
+
+from ramp_profile import max_rss_mb
+
+from ramp_synthetic_data import write_synthetic_subset
+
+# The pipeline stages, in the order they are run.
+STAGES = ['ingest', 'normalize', 'aggregate', 'output', 'access']
+
+# Stages faster than this (in seconds) in the baseline aren't checked for time
+# regressions, since their timings are mostly noise.
+MIN_SECONDS = 0.1
+
+
+def measure(func, *args, trace_memory=True):
+    """Call a function and measure the time it takes and the peak memory it
+       allocates.
+
+    Parameters
+    ----------
+
+    func:
+        The function to call.
+    args:
+        The arguments to call it with.
+    trace_memory:
+        Whether to measure peak memory with tracemalloc. Tracing makes some
+        functions slower.
+
+    Returns
+    -------
+
+    result:
+        The value returned by the function.
+    timing:
+        A dictionary with the 'seconds' taken and the 'peak_mb' allocated
+        (None if memory wasn't traced).
+
+    """
+
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    seconds = time.perf_counter() - start
+    peak_mb = None
+    if trace_memory:
+        peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+    return result, {'seconds': seconds, 'peak_mb': peak_mb}
+
+
+def write_summary(ir_info, stats, path):
+    """Join the per-IR statistics with the IR information and write them to
+       a CSV file, like the output file of the summary statistics script."""
+
+    out = ir_info.join(stats, on='ir_page_click_index')
+    out.to_csv(path, index=False)
+    return out
+
+
+def country_device_tables(files, country_codes, chunk_size=1000000, cache_dir=None):
+    """Compute the country-device access tables, as the summary statistics script does."""
+
+    return summarize_country_device(stream_country_device(files, chunk_size, cache_dir), country_codes)
+
+
+def run_pipeline(files, ir_info, out_path, chunk_size=1000000, cache_dir=None, workers=1,
+                 trace_memory=True, access_files=(), country_codes=None):
+    """Run the stages of the summary statistics script once and measure each.
+
+    Parameters
+    ----------
+
+    files:
+        A list of paths of RAMP page-click files.
+    ir_info:
+        A pandas data frame read from "RAMP_IR_base_info.csv."
+    out_path:
+        The path of the output CSV file.
+    chunk_size:
+        The number of rows to read at a time, or None to read whole files.
+    cache_dir:
+        The Parquet cache directory, or None to read the CSV files directly.
+    workers:
+        The number of processes used to read files.
+    trace_memory:
+        Whether to measure peak memory.
+    access_files:
+        A list of paths of RAMP country-device files.
+    country_codes:
+        The north/south lookup table, as returned by read_country_codes.
+
+    Returns
+    -------
+
+    timings:
+        A dictionary mapping stage names to the dictionaries returned by measure.
+
+    """
+
+    timings = {}
+    url_clicks, timings['ingest'] = measure(load_url_clicks, files, chunk_size, cache_dir, workers,
+                                            trace_memory=trace_memory)
+    normalizers = normalizers_for(ir_info)
+    url_cache = NormalizationCache()
+    urls = url_clicks.reset_index()
+    encoded, timings['normalize'] = measure(encode_urls, urls, normalizers, url_cache,
+                                          trace_memory=trace_memory)
+    stats, timings['aggregate'] = measure(summarize_url_clicks, url_clicks, normalizers, url_cache,
+                                          trace_memory=trace_memory)
+    out, timings['output'] = measure(write_summary, ir_info, stats, out_path,
+                                     trace_memory=trace_memory)
+    tables, timings['access'] = measure(country_device_tables, access_files, country_codes,
+                                        chunk_size or 1000000, cache_dir, trace_memory=trace_memory)
+    return timings
+
+
+def best_timings(runs):
+    """Combine the timings of repeated runs: the shortest time and the largest
+       peak memory of each stage."""
+
+    best = {}
+    for stage in STAGES:
+        peaks = [run[stage]['peak_mb'] for run in runs if run[stage]['peak_mb'] is not None]
+        best[stage] = {'seconds': min(run[stage]['seconds'] for run in runs),
+                       'peak_mb': max(peaks) if peaks else None}
+    return best
+
+
+def find_regressions(stages, baseline, tolerance=0.25):
+    """Compare stage timings with a baseline report.
+
+    Parameters
+    ----------
+
+    stages:
+        A dictionary of stage timings, as returned by best_timings.
+    baseline:
+        A report from an earlier run of this script.
+    tolerance:
+        The fraction by which a stage may be slower or use more memory than
+        in the baseline.
+
+    Returns
+    -------
+
+    regressions:
+        A list of messages describing the stages that got worse.
+
+    """
+
+    regressions = []
+    for stage, base in baseline['stages'].items():
+        if stage not in stages:
+            continue
+        now = stages[stage]
+        if base['seconds'] >= MIN_SECONDS and now['seconds'] > base['seconds'] * (1 + tolerance):
+            regressions.append(stage + ': ' + str(round(now['seconds'], 2)) + ' seconds, baseline ' +
+                               str(round(base['seconds'], 2)))
+        if base['peak_mb'] and now['peak_mb'] and now['peak_mb'] > base['peak_mb'] * (1 + tolerance):
+            regressions.append(stage + ': ' + str(round(now['peak_mb'], 1)) + ' MB peak memory, baseline ' +
+                               str(round(base['peak_mb'], 1)))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the RAMP summary statistics pipeline.')
+    parser.add_argument('--data-dir', help='directory for the synthetic data; a temporary directory '
+                        'is used and removed afterwards by default. Existing data are reused.')
+    parser.add_argument('--ir-info', default='../ir_data/RAMP_IR_base_info.csv', help='path of RAMP_IR_base_info.csv')
+    parser.add_argument('--country-codes', default='../country_codes/north_south.csv', help='path of north_south.csv')
+    parser.add_argument('--months', type=int, default=2, help='number of months of synthetic data')
+    parser.add_argument('--rows', type=int, default=200000, help='page-click rows per month')
+    parser.add_argument('--country-device-rows', type=int, default=20000, help='country-device rows per month')
+    parser.add_argument('--items', type=int, default=1000, help='items per IR')
+    parser.add_argument('--seed', type=int, default=0, help='random seed for the synthetic data')
+    parser.add_argument('--chunk-size', type=int, default=1000000, help='rows read at a time; 0 reads whole files')
+    parser.add_argument('--cache-dir', help='Parquet cache directory; CSV files are read directly by default')
+    parser.add_argument('--workers', type=int, default=1, help='processes used to read files')
+    parser.add_argument('--repeat', type=int, default=1, help='number of runs; the best time is reported')
+    parser.add_argument('--no-memory', action='store_true', help="don't trace memory (faster, less overhead)")
+    parser.add_argument('--report', help='path to save the JSON report to')
+    parser.add_argument('--baseline', help='JSON report of an earlier run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown before a '
+                        'stage counts as a regression, as a fraction of the baseline')
+    args = parser.parse_args()
+
+    ir_info = pd.read_csv(args.ir_info)
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix='ramp_benchmark_')
+    try:
+        files = find_ramp_files(data_dir, '*page-clicks*')
+        if not files:
+            months = [str(2019 + m // 12) + '-' + str(m % 12 + 1).zfill(2) for m in range(args.months)]
+            start = time.perf_counter()
+            write_synthetic_subset(data_dir, ir_info, args.country_codes, months, args.rows,
+                                   args.country_device_rows, args.items, args.seed)
+            print('Wrote synthetic data in ' + str(round(time.perf_counter() - start, 2)) + ' seconds.')
+            files = find_ramp_files(data_dir, '*page-clicks*')
+        access_files = find_ramp_files(data_dir, '*country-device*')
+        data_mb = sum(os.path.getsize(f) for f in files + access_files) / 2 ** 20
+        country_codes = read_country_codes(args.country_codes)
+
+        runs = []
+        for i in range(args.repeat):
+            runs.append(run_pipeline(files, ir_info, os.path.join(data_dir, 'RAMP_summary_stats_benchmark.csv'),
+                                     args.chunk_size or None, args.cache_dir, args.workers,
+                                     not args.no_memory, access_files, country_codes))
+        stages = best_timings(runs)
+    finally:
+        if not args.data_dir:
+            shutil.rmtree(data_dir)
+
+    rss, children_rss = max_rss_mb()
+    report = {'stages': stages, 'max_rss_mb': rss, 'children_max_rss_mb': children_rss,
+              'files': len(files) + len(access_files), 'data_mb': data_mb,
+              'settings': vars(args), 'python': platform.python_version(), 'pandas': pd.__version__}
+
+    for stage in STAGES:
+        line = stage.ljust(10) + str(round(stages[stage]['seconds'], 3)).rjust(10) + ' s'
+        if stages[stage]['peak_mb'] is not None:
+            line += str(round(stages[stage]['peak_mb'], 1)).rjust(10) + ' MB peak'
+        print(line)
+    print('total'.ljust(10) + str(round(sum(s['seconds'] for s in stages.values()), 3)).rjust(10) + ' s')
+    if rss is not None:
+        print('Max resident set size: ' + str(round(rss, 1)) + ' MB (child processes: ' +
+              str(round(children_rss, 1)) + ' MB)')
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(stages, json.load(f), args.tolerance)
+        for r in regressions:
+            print('Regression in ' + r)
+        if regressions:
+            sys.exit(1)
+        print('No regressions compared with ' + args.baseline + '.')
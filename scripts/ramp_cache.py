@@ -0,0 +1,321 @@
+"""Cache RAMP data files in Parquet format
+
+GitHub repository URL: <https://github.com/imls-measuring-up/ramp-analyses-scripts>
+
+Parsing the monthly RAMP CSV files from Dryad takes most of the time needed to run
+the analysis scripts. The functions in this module convert each page-click and
+country-device file once to a compressed, typed Parquet file in a cache directory,
+and read the Parquet file on later runs instead of the CSV file.
+
+Low-cardinality text columns ('index', 'citableContent', 'country', 'device') are
+stored dictionary encoded and read back as pandas categoricals. Clicks and impressions
+are stored as integers, and CTR and position as floats.
+
+Each cached file has a small JSON file next to it recording the size, modification
+time and SHA-256 hash of the CSV file it was made from. If the size and modification
+time of the CSV file still match, the cache is used. If only the modification time has
+changed (e.g. because the file was downloaded again), the hash is compared, and the
+cache is only rebuilt if the contents of the CSV file have changed.
+
+Files that can't be converted (e.g. because their counts have missing or fractional
+values) are recorded the same way, with the error in place of a Parquet file, so later
+runs read the CSV file directly instead of hashing and converting it again.
+
+Dependencies:
+
+Python modules pandas and pyarrow, available from <https://pandas.pydata.org/> and
+<https://arrow.apache.org/docs/python/>. pyarrow is optional: if it isn't installed,
+cached_file returns None and the CSV files are read as usual.
+
+"""
+
+
+import os
+
+import json
+
+import fnmatch
+
+import hashlib
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+# Parquet column types of the RAMP data files, by file name pattern. Columns that
+# aren't listed here are stored as text.
+RAMP_SCHEMAS = {
+    '*page-clicks*': {'url': 'string', 'index': 'string', 'clicks': 'int64',
+                      'impressions': 'int64', 'ctr': 'float64', 'date': 'string',
+                      'position': 'float64', 'citableContent': 'string'},
+    '*country-device*': {'country': 'string', 'device': 'string', 'index': 'string',
+                         'clicks': 'int64', 'impressions': 'int64', 'ctr': 'float64',
+                         'date': 'string', 'position': 'float64'},
+}
+
+# Columns that are read back as pandas categoricals.
+CATEGORY_COLS = ['index', 'citableContent', 'country', 'device']
+
+
+def file_sha256(path, block_size=1 << 20):
+    """Return the hex SHA-256 hash of a file's contents."""
+
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def schema_for(path):
+    """Return the column types for a RAMP data file, based on its name, or None
+       if the file isn't a page-click or country-device file."""
+
+    for pattern, schema in RAMP_SCHEMAS.items():
+        if fnmatch.fnmatch(os.path.basename(path), pattern):
+            return schema
+
+
+def cache_paths(path, cache_dir):
+    """Return the paths of the cached Parquet file and its JSON metadata file
+       for a RAMP CSV file."""
+
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir, name + '.parquet'), os.path.join(cache_dir, name + '.json')
+
+
+def write_meta(path, cache_dir, st, sha256, error=None):
+    """Record the size, modification time and SHA-256 hash of a RAMP CSV file
+       in the cache, with the error if it couldn't be converted."""
+
+    meta = {'source': os.path.basename(path), 'size': st.st_size, 'mtime': st.st_mtime, 'sha256': sha256}
+    if error is not None:
+        meta['error'] = error
+    with open(cache_paths(path, cache_dir)[1], 'w') as f:
+        json.dump(meta, f)
+
+
+def read_meta(path, cache_dir):
+    """Return the cache metadata of a RAMP CSV file if it was recorded for the
+       current contents of the file, or None.
+
+    Parameters
+    ----------
+
+    path:
+        The path of a RAMP CSV file.
+    cache_dir:
+        The cache directory.
+
+    Returns
+    -------
+
+    meta:
+        A dictionary with the 'size', 'mtime' and 'sha256' of the CSV file, and
+        the 'error' if it couldn't be converted, or None if there's no metadata
+        or the contents of the file have changed.
+
+    """
+
+    meta_path = cache_paths(path, cache_dir)[1]
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    st = os.stat(path)
+    if meta['size'] != st.st_size:
+        return None
+    if meta['mtime'] == st.st_mtime:
+        return meta
+    if meta['sha256'] != file_sha256(path):
+        return None
+    # Same contents, new modification time: remember it to skip hashing next time.
+    meta['mtime'] = st.st_mtime
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+    return meta
+
+
+def is_cached(path, cache_dir):
+    """Check whether the cached copy of a RAMP CSV file is up to date.
+
+    Parameters
+    ----------
+
+    path:
+        The path of a RAMP CSV file.
+    cache_dir:
+        The cache directory.
+
+    Returns
+    -------
+
+    True if the cached Parquet file was made from the current contents of the
+    CSV file, False otherwise.
+
+    """
+
+    if not os.path.exists(cache_paths(path, cache_dir)[0]):
+        return False
+    meta = read_meta(path, cache_dir)
+    return meta is not None and 'error' not in meta
+
+
+def write_cache(path, cache_dir, chunk_size=1000000, sha256=None):
+    """Convert a RAMP CSV file to a Parquet file in the cache directory. The
+       CSV file is read in chunks, so the whole file never has to be in memory.
+
+    Parameters
+    ----------
+
+    path:
+        The path of a RAMP page-click or country-device CSV file.
+    cache_dir:
+        The cache directory. It is created if it doesn't exist.
+    chunk_size:
+        The number of rows to read and write at a time.
+    sha256:
+        The hex SHA-256 hash of the CSV file, if it was already computed.
+
+    Returns
+    -------
+
+    parquet_path:
+        The path of the cached Parquet file.
+
+    """
+
+    schema = schema_for(path)
+    header = pd.read_csv(path, nrows=0).columns
+    types = {c: schema.get(c, 'string') for c in header}
+    arrow_schema = pa.schema([(c, pa.string() if t == 'string' else pa.from_numpy_dtype(t))
+                              for c, t in types.items()])
+    st = os.stat(path)
+    sha256 = sha256 or file_sha256(path)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    parquet_path = cache_paths(path, cache_dir)[0]
+    tmp_path = parquet_path + '.tmp'
+    csv_types = {c: 'str' for c, t in types.items() if t == 'string'}
+    with pq.ParquetWriter(tmp_path, arrow_schema, compression='zstd') as writer:
+        for chunk in pd.read_csv(path, dtype=csv_types, chunksize=chunk_size):
+            for c, t in types.items():
+                if t != 'string':
+                    chunk[c] = pd.to_numeric(chunk[c])
+                    if t == 'int64' and (chunk[c].isna().any() or (chunk[c] % 1 != 0).any()):
+                        raise ValueError("column '" + c + "' has missing or fractional values")
+                    chunk[c] = chunk[c].astype(t)
+            writer.write_table(pa.Table.from_pandas(chunk, schema=arrow_schema, preserve_index=False))
+    os.replace(tmp_path, parquet_path)
+    write_meta(path, cache_dir, st, sha256)
+    return parquet_path
+
+
+def cached_file(path, cache_dir, chunk_size=1000000):
+    """Return the path of an up-to-date Parquet copy of a RAMP CSV file,
+       creating it if needed.
+
+    Parameters
+    ----------
+
+    path:
+        The path of a RAMP page-click or country-device CSV file.
+    cache_dir:
+        The cache directory.
+    chunk_size:
+        The number of rows to convert at a time if the cache has to be written.
+
+    Returns
+    -------
+
+    parquet_path:
+        The path of the cached Parquet file, or None if pyarrow isn't installed,
+        the file isn't a known RAMP data file, or it can't be converted (now or,
+        with the same contents, on an earlier run).
+
+    """
+
+    if pa is None or not cache_dir or schema_for(path) is None:
+        return None
+    parquet_path = cache_paths(path, cache_dir)[0]
+    meta = read_meta(path, cache_dir)
+    if meta is not None and 'error' in meta:
+        return None
+    if meta is not None and os.path.exists(parquet_path):
+        return parquet_path
+    st = os.stat(path)
+    sha256 = file_sha256(path)
+    try:
+        return write_cache(path, cache_dir, chunk_size, sha256)
+    except (ValueError, TypeError, pa.ArrowException) as e:
+        print('Could not cache ' + path + ': ' + str(e))
+        for stale_path in [parquet_path + '.tmp', parquet_path]:
+            if os.path.exists(stale_path):
+                os.remove(stale_path)
+        os.makedirs(cache_dir, exist_ok=True)
+        write_meta(path, cache_dir, st, sha256, str(e))
+        return None
+
+
+def category_cols(parquet_path):
+    """Return the columns of a cached Parquet file that are read as categoricals."""
+
+    names = pq.read_schema(parquet_path).names
+    return [c for c in CATEGORY_COLS if c in names]
+
+
+def read_cached(parquet_path, columns=None):
+    """Read a cached Parquet file into a pandas data frame.
+
+    Parameters
+    ----------
+
+    parquet_path:
+        The path returned by cached_file.
+    columns:
+        A list of columns to read. All columns are read by default.
+
+    Returns
+    -------
+
+    data:
+        A pandas data frame with categorical 'index', 'citableContent',
+        'country' and 'device' columns.
+
+    """
+
+    pf = pq.ParquetFile(parquet_path, read_dictionary=category_cols(parquet_path))
+    return pf.read(columns=columns).to_pandas()
+
+
+def iter_cached(parquet_path, columns=None, chunk_size=1000000):
+    """Read a cached Parquet file in chunks of rows.
+
+    Parameters
+    ----------
+
+    parquet_path:
+        The path returned by cached_file.
+    columns:
+        A list of columns to read. All columns are read by default.
+    chunk_size:
+        The number of rows per chunk.
+
+    Yields
+    ------
+
+    chunk:
+        A pandas data frame with categorical 'index', 'citableContent',
+        'country' and 'device' columns.
+
+    """
+
+    pf = pq.ParquetFile(parquet_path, read_dictionary=category_cols(parquet_path))
+    for batch in pf.iter_batches(batch_size=chunk_size, columns=columns):
+        yield batch.to_pandas()
@@ -0,0 +1,213 @@
+"""Aggregate RAMP country-device data by IR, country, device and global region
+
+GitHub repository URL: <https://github.com/imls-measuring-up/ramp-analyses-scripts>
+
+The RAMP country-device files published at Dryad (<https://doi.org/10.5061/dryad.fbg79cnr0>)
+report clicks and impressions per IR, country, device and day. The analysis of access by
+country and device described in Arlitsch et al., 2020 is done in R (see
+"ramp_country-device-access.R" and "RAMP_use_ratio_and_country_device_analyses.Rmd"),
+which loads all of the monthly files into memory and merges every row with the global
+north/south lookup table in "country_codes/north_south.csv."
+
+The functions in this module compute the same click and impression totals in a single
+pass over the files, reading them in chunks of rows (using the Parquet cache if given,
+see "ramp_cache"). Each chunk is reduced to sums per IR, country and device, which are
+small enough to merge as the files are read. The north/south lookup table is read once
+into an index keyed by lowercase country code, as the codes appear in the RAMP data,
+and joined to the summed counts rather than to every row. As in the R script, the
+country, device and north/south tables are computed from the rows whose country is in
+the lookup table (the inner merge "country_device_n"), and the percent of clicks of each
+global region and device is computed within the region. Unmatched countries can be
+listed with unmatched_countries. The IR table, which isn't in the R script, sums all
+rows.
+
+Dependencies:
+
+Python module pandas, available from <https://pandas.pydata.org/>, and the
+"ramp_load_data" module included in the same directory.
+
+"""
+
+
+import os
+
+import pandas as pd
+
+from ramp_load_data import fits_integer, iter_ramp_file
+
+
+# The country-device columns used for the access tables.
+COUNTRY_DEVICE_COLS = ['index', 'country', 'device', 'clicks', 'impressions']
+
+# The sums computed for each table: clicks, impressions and number of rows.
+ACCESS_SUM_COLS = ['clicks', 'impressions', 'rows']
+
+# The columns each access table is grouped by, by table name. 'Location' is the
+# global region from "north_south.csv": 0 for the global south, 1 for the north.
+ACCESS_TABLES = {'ir': ['index'], 'country': ['country'], 'device': ['device'],
+                 'location': ['Location'], 'location_device': ['Location', 'device']}
+
+# Tables whose percent of clicks is computed within each value of a column rather than
+# of the whole table, as by the grouped mutate() in the R script.
+PERCENT_WITHIN = {'location_device': 'Location'}
+
+
+def read_country_codes(path):
+    """Read the global north/south lookup table.
+
+    Parameters
+    ----------
+
+    path:
+        The path of "north_south.csv."
+
+    Returns
+    -------
+
+    country_codes:
+        A pandas series of 'Location' values indexed by lowercase three letter
+        country code, as the codes appear in the RAMP data.
+
+    """
+
+    lookup = pd.read_csv(path, encoding='latin-1')
+    return pd.Series(lookup['Location'].values, index=lookup['Countryabbre'].str.lower(),
+                     name='Location')
+
+
+def aggregate_country_device(access_data):
+    """Sum clicks, impressions and rows per IR, country and device. The result
+       is a partial aggregate that can be combined with merge_country_device.
+
+    Parameters
+    ----------
+
+    access_data:
+        A pandas data frame of RAMP country-device data.
+
+    Returns
+    -------
+
+    counts:
+        A data frame indexed by RAMP access-info index, country and device with
+        the columns listed in ACCESS_SUM_COLS.
+
+    """
+
+    columns = access_data[['index', 'country', 'device', 'clicks', 'impressions']].assign(rows=1)
+    # Sum counts as 64-bit integers, unless some are missing or fractional (see
+    # "ramp_load_data"); missing counts are then skipped, as groupby does.
+    for c in ['clicks', 'impressions']:
+        if fits_integer(columns[c], 'int64'):
+            columns[c] = columns[c].astype('int64')
+    return columns.groupby(['index', 'country', 'device'], sort=False, observed=True).sum()
+
+
+def merge_country_device(partials):
+    """Combine partial aggregates returned by aggregate_country_device."""
+
+    partials = [p for p in partials if len(p) > 0]
+    if len(partials) == 0:
+        return aggregate_country_device(pd.DataFrame(columns=COUNTRY_DEVICE_COLS))
+    if len(partials) == 1:
+        return partials[0]
+    return pd.concat(partials).groupby(level=['index', 'country', 'device'], sort=False, observed=True).sum()
+
+
+def stream_country_device(files, chunk_size=1000000, cache_dir=None):
+    """Read country-device files in chunks and sum clicks, impressions and
+       rows per IR, country and device.
+
+    Parameters
+    ----------
+
+    files:
+        A list of paths of RAMP country-device files.
+    chunk_size:
+        The number of rows to read at a time.
+    cache_dir:
+        The Parquet cache directory, or None to read the CSV files directly.
+
+    Returns
+    -------
+
+    counts:
+        A data frame of sums for all files, as returned by aggregate_country_device.
+
+    """
+
+    partials = [aggregate_country_device(chunk) for f in files
+                for chunk in iter_ramp_file(f, chunk_size, cache_dir, COUNTRY_DEVICE_COLS)]
+    return merge_country_device(partials)
+
+
+def add_locations(counts, country_codes):
+    """Return the counts as a data frame with a 'Location' column looked up from
+       the country codes. Countries that aren't in the lookup table get a missing
+       Location."""
+
+    counts = counts.reset_index()
+    counts['country'] = counts['country'].astype(object)
+    counts['Location'] = counts['country'].map(country_codes).astype('Int64')
+    return counts
+
+
+def unmatched_countries(counts, country_codes):
+    """Return a sorted list of the country codes in the counts that aren't in the
+       north/south lookup table."""
+
+    countries = pd.Series(counts.index.get_level_values('country').astype(object)).dropna().unique()
+    return sorted(c for c in countries if c not in country_codes.index)
+
+
+def summarize_country_device(counts, country_codes):
+    """Compute the access tables from per-IR, per-country, per-device sums.
+
+    Parameters
+    ----------
+
+    counts:
+        A pandas data frame returned by aggregate_country_device, merge_country_device
+        or stream_country_device.
+    country_codes:
+        A pandas series returned by read_country_codes.
+
+    Returns
+    -------
+
+    tables:
+        A dictionary mapping the names in ACCESS_TABLES to data frames with the
+        group columns, the columns listed in ACCESS_SUM_COLS, and the percent of
+        the clicks in the table (or, for the tables in PERCENT_WITHIN, in the
+        rows with the same value of the column), sorted by clicks in descending
+        order. The country table also has each country's Location. All tables
+        except the IR table only include countries that are in the lookup table.
+
+    """
+
+    counts = add_locations(counts, country_codes)
+    matched = counts[counts['Location'].notna()]
+    tables = {}
+    for name, keys in ACCESS_TABLES.items():
+        table = (counts if name == 'ir' else matched).groupby(keys, sort=False, observed=True)[ACCESS_SUM_COLS].sum()
+        table = table.sort_values('clicks', ascending=False, kind='stable').reset_index()
+        if name in PERCENT_WITHIN:
+            totals = table.groupby(PERCENT_WITHIN[name], sort=False, observed=True)['clicks'].transform('sum')
+        else:
+            totals = table['clicks'].sum()
+        table['percent'] = table['clicks'] / totals * 100
+        tables[name] = table
+    tables['country'].insert(1, 'Location', tables['country']['country'].map(country_codes).astype('Int64'))
+    return tables
+
+
+def write_access_tables(tables, results_dir, fname_date):
+    """Write the access tables to CSV files named
+       "RAMP_country_device_<table>_YYYYMMDD.csv" and return their paths."""
+
+    paths = []
+    for name, table in tables.items():
+        path = os.path.join(results_dir, 'RAMP_country_device_' + name + '_' + str(fname_date) + '.csv')
+        table.to_csv(path, index=False)
+        paths.append(path)
+    return paths
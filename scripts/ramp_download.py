@@ -0,0 +1,236 @@
+"""Download the RAMP data subset from Dryad
+
+GitHub repository URL: <https://github.com/imls-measuring-up/ramp-analyses-scripts>
+
+The RAMP data subset published at Dryad (<https://doi.org/10.5061/dryad.fbg79cnr0>) is
+several gigabytes, so the functions in this module avoid downloading more than needed:
+
+* Files that were already downloaded are skipped without contacting the server if their
+  size and SHA-256 hash match the manifest record of the download (or the expected hash).
+  Files are only hashed once: if the file's size and modification time still match the
+  record, its recorded hash is used. The server is only asked about files that are
+  missing, partial or don't match.
+* Downloads are written to a ".part" file first. If a download is interrupted, the next
+  run resumes it with an HTTP Range request instead of starting over.
+* Files are fetched in large chunks by several threads sharing one pooled session.
+
+The SHA-256 hash, size and modification time of every completed download are
+recorded in a manifest file in the download directory, so files can be checked against
+it on later runs.
+
+Dependencies:
+
+Python module requests, available from <https://requests.readthedocs.io/en/master/>, and
+the "ramp_cache" module included in the same directory.
+
+"""
+
+
+import os
+
+import json
+
+import requests
+
+from concurrent.futures import ThreadPoolExecutor
+
+from ramp_cache import file_sha256
+
+
+# Name of the file in the download directory recording the SHA-256 hash, size and
+# modification time of each download.
+MANIFEST_NAME = 'ramp_download_manifest.json'
+
+
+class DownloadError(Exception):
+    """Raised when a downloaded file doesn't have the expected size or hash."""
+
+
+def make_session(workers=4, retries=3):
+    """Create a requests session with a connection pool large enough for
+       the given number of download threads, retrying failed connections."""
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=workers, pool_maxsize=workers,
+                                            max_retries=retries)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def remote_size(session, url, timeout=60):
+    """Return the size in bytes of a remote file, or None if the server doesn't
+       report it."""
+
+    r = session.head(url, allow_redirects=True, timeout=timeout)
+    r.raise_for_status()
+    size = r.headers.get('Content-Length')
+    return int(size) if size is not None else None
+
+
+def file_record(path, sha256):
+    """Describe a downloaded file for the manifest."""
+
+    stat = os.stat(path)
+    return {'sha256': sha256, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def local_match(path, sha256=None, record=None):
+    """Return the manifest record of a local file if it matches its earlier
+       download and the expected hash, or None if it has to be fetched.
+
+    The file is hashed unless its size and modification time still match the
+    record. Without a record or an expected hash, there's nothing to check the
+    file against, so None is returned.
+
+    """
+
+    if not os.path.exists(path):
+        return None
+    if record is None:
+        if sha256 is None:
+            return None
+        record = file_record(path, file_sha256(path))
+        return record if record['sha256'] == sha256 else None
+    stat = os.stat(path)
+    if record.get('size') != stat.st_size:
+        return None
+    if record.get('mtime_ns') != stat.st_mtime_ns:
+        record = file_record(path, file_sha256(path))
+    return record if sha256 in (None, record['sha256']) else None
+
+
+def download_file(session, url, path, sha256=None, record=None, chunk_size=1 << 20, timeout=60):
+    """Download a file unless an identical copy already exists, resuming a
+       partial download if possible.
+
+    Parameters
+    ----------
+
+    session:
+        A requests session, e.g. from make_session.
+    url:
+        The URL of the file.
+    path:
+        The path to save the file to.
+    sha256:
+        The expected hex SHA-256 hash of the file, if known.
+    record:
+        The manifest record of an earlier download of the file, if any. If the
+        file still matches it, the server isn't contacted.
+    chunk_size:
+        The number of bytes to write at a time.
+    timeout:
+        Seconds to wait for the server to respond.
+
+    Returns
+    -------
+
+    status:
+        'skipped' if an identical file already existed, 'resumed' if a partial
+        download was completed, or 'downloaded'.
+    record:
+        The manifest record of the file, see file_record.
+
+    """
+
+    match = local_match(path, sha256, record)
+    if match is not None:
+        return 'skipped', match
+
+    size = remote_size(session, url, timeout)
+    if os.path.exists(path) and sha256 is None and (size is None or os.path.getsize(path) == size):
+        # Nothing is known about the file but its size, which the server confirms.
+        return 'skipped', file_record(path, file_sha256(path))
+
+    part_path = path + '.part'
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    if size is not None and offset > size:
+        offset = 0
+    headers = {'Range': 'bytes=' + str(offset) + '-'} if offset else {}
+    status = 'downloaded'
+    with session.get(url, headers=headers, stream=True, timeout=timeout) as r:
+        if offset and r.status_code == 206:
+            status = 'resumed'
+        elif offset and r.status_code == 416 and offset == size:
+            # The partial file is already complete.
+            status = 'resumed'
+        else:
+            r.raise_for_status()
+            offset = 0
+        if r.status_code != 416:
+            with open(part_path, 'ab' if offset else 'wb') as dl:
+                for chunk in r.iter_content(chunk_size=chunk_size):
+                    dl.write(chunk)
+
+    if size is not None and os.path.getsize(part_path) != size:
+        raise DownloadError(path + ': expected ' + str(size) + ' bytes, got ' +
+                            str(os.path.getsize(part_path)))
+    digest = file_sha256(part_path)
+    if sha256 is not None and digest != sha256:
+        os.remove(part_path)
+        raise DownloadError(path + ': SHA-256 hash does not match')
+    os.replace(part_path, path)
+    return status, file_record(path, digest)
+
+
+def download_files(files, download_dir, workers=4, checksums=None, chunk_size=1 << 20):
+    """Download several files concurrently, skipping files that are already
+       present and resuming partial downloads.
+
+    Parameters
+    ----------
+
+    files:
+        A dictionary mapping file names to URLs, like ramp_subset in
+        "ramp_summary_stats_normalize_urls.py."
+    download_dir:
+        The directory to save the files to.
+    workers:
+        The number of files to download at a time.
+    checksums:
+        A dictionary mapping file names to expected hex SHA-256 hashes. Hashes
+        recorded in the download directory's manifest by earlier downloads are
+        used for files not listed here.
+    chunk_size:
+        The number of bytes to write at a time.
+
+    Returns
+    -------
+
+    results:
+        A dictionary mapping file names to 'skipped', 'resumed' or 'downloaded',
+        or to the exception raised if a download failed.
+
+    """
+
+    manifest_path = os.path.join(download_dir, MANIFEST_NAME)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    expected = {name: r['sha256'] for name, r in manifest.items()}
+    expected.update(checksums or {})
+
+    session = make_session(workers)
+
+    def fetch(file_name):
+        path = os.path.join(download_dir, file_name)
+        return download_file(session, files[file_name], path, expected.get(file_name), manifest.get(file_name),
+                             chunk_size)
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {name: pool.submit(fetch, name) for name in files}
+        for name, future in futures.items():
+            try:
+                status, record = future.result()
+                manifest[name] = record
+                results[name] = status
+            except (requests.RequestException, DownloadError, OSError) as e:
+                results[name] = e
+    session.close()
+
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return results
@@ -0,0 +1,322 @@
+"""Read the rows of single IR or dates from RAMP data files through a byte-range index
+
+GitHub repository URL: <https://github.com/imls-measuring-up/ramp-analyses-scripts>
+
+Rerunning the summary statistics for one IR (e.g. while debugging its URL normalizer),
+or for one month, still means parsing every row of every page-click file. The functions
+in this module build a side index for each file, once, which maps each IR ('index') and
+'date' to the byte ranges of its rows. A filtered read then memory-maps the file, slices
+out the byte ranges of the requested IR and dates, and parses only those rows.
+
+Byte ranges are only useful if the rows of each IR and date are stored together. If they
+aren't (the rows of every (index, date) pair are not one contiguous run), a partitioned
+copy of the file, with its rows grouped by IR and date, is written next to the index,
+and the index refers to the copy. The copy has the same header and rows as the original,
+so it can also be read as a whole.
+
+The index is saved as a JSON file in the index directory, "<file name>.index.json," with
+the size and modification time of the file it was built from, and the partitioned copy
+as "<file name>.partitioned." The index is rebuilt if the file changes.
+
+Row boundaries are found by searching for line breaks, so a file with quoted line breaks
+inside values, or blank lines, can't be indexed; build_file_index raises a ValueError for
+such files.
+
+Dependencies:
+
+Python modules pandas and numpy, available from <https://pandas.pydata.org/> and
+<https://numpy.org/>, and the "ramp_aggregate" and "ramp_load_data" modules included in
+the same directory.
+
+"""
+
+
+import io
+
+import os
+
+import mmap
+
+import json
+
+import numpy as np
+
+import pandas as pd
+
+from ramp_aggregate import aggregate_url_clicks, citable_clicks, merge_url_clicks
+
+from ramp_load_data import PAGE_CLICK_COLS, apply_schema, csv_types, frame_schema
+
+
+# The columns the side index is keyed by.
+INDEX_KEYS = ['index', 'date']
+
+# Bytes searched for line breaks at a time.
+SCAN_BLOCK_SIZE = 1 << 26
+
+
+def index_paths(path, index_dir):
+    """Return the paths of a file's side index and of its partitioned copy."""
+
+    name = os.path.basename(path)
+    # The copy doesn't end in '.csv', so find_ramp_files doesn't list it as a data file.
+    return (os.path.join(index_dir, name + '.index.json'),
+            os.path.join(index_dir, name + '.partitioned'))
+
+
+def row_offsets(data):
+    """Find the rows of a CSV file's contents.
+
+    Parameters
+    ----------
+
+    data:
+        The contents of the file, e.g. an mmap.
+
+    Returns
+    -------
+
+    header_end:
+        The offset of the first byte after the header line.
+    offsets:
+        A numpy array of the start offset of each data row, followed by the end
+        of the last row.
+
+    """
+
+    ends = []
+    for start in range(0, len(data), SCAN_BLOCK_SIZE):
+        block = np.frombuffer(data[start:start + SCAN_BLOCK_SIZE], dtype=np.uint8)
+        ends.append(np.flatnonzero(block == ord('\n')) + start + 1)
+    ends = np.concatenate(ends) if ends else np.array([], dtype=np.int64)
+    if len(data) and (len(ends) == 0 or ends[-1] != len(data)):
+        # The last row doesn't end with a line break.
+        ends = np.append(ends, len(data))
+    if len(ends) == 0:
+        raise ValueError('The file is empty.')
+    return int(ends[0]), ends.astype(np.int64)
+
+
+def key_runs(keys):
+    """Find the runs of consecutive rows with the same key.
+
+    Parameters
+    ----------
+
+    keys:
+        A numpy array of integer key codes, one per row.
+
+    Returns
+    -------
+
+    starts:
+        A numpy array of the first row of each run, followed by the number of rows.
+
+    """
+
+    changes = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+    return np.concatenate([[0], changes, [len(keys)]]).astype(np.int64)
+
+
+def write_partitioned(data, header_end, offsets, order, path):
+    """Write a copy of a CSV file with its rows in a new order.
+
+    Parameters
+    ----------
+
+    data:
+        The contents of the file.
+    header_end, offsets:
+        The header end and row offsets, as returned by row_offsets.
+    order:
+        A numpy array of row numbers in the order they are written.
+    path:
+        The path of the copy.
+
+    """
+
+    # Rows that stay next to each other are copied together.
+    breaks = np.flatnonzero(order[1:] != order[:-1] + 1) + 1
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data[:header_end])
+        for first, last in zip(np.concatenate([[0], breaks]), np.concatenate([breaks, [len(order)]])):
+            chunk = data[offsets[order[first]]:offsets[order[last - 1] + 1]]
+            f.write(chunk)
+            if not chunk.endswith(b'\n'):
+                f.write(b'\n')
+    os.replace(tmp_path, path)
+
+
+def build_file_index(path, index_dir):
+    """Build the side index of a RAMP data file, writing a partitioned copy of
+       the file first if its rows aren't grouped by IR and date.
+
+    Parameters
+    ----------
+
+    path:
+        The path of a RAMP page-click or country-device CSV file.
+    index_dir:
+        The directory the index (and partitioned copy) is saved in. It is created
+        if it doesn't exist.
+
+    Returns
+    -------
+
+    file_index:
+        The index, as saved: a dictionary with the 'source' file's 'size' and
+        'mtime', the path of the 'data' file the byte ranges refer to, its
+        'header' length, and the 'ranges': a list of [index, date, start, end,
+        rows] lists.
+
+    """
+
+    os.makedirs(index_dir, exist_ok=True)
+    index_path, partitioned_path = index_paths(path, index_dir)
+    st = os.stat(path)
+    keys = pd.read_csv(path, usecols=INDEX_KEYS, dtype=str, keep_default_na=False)
+    codes = keys.groupby(INDEX_KEYS, sort=False).ngroup().to_numpy()
+    keys = {k: keys[k].to_numpy(dtype=object) for k in INDEX_KEYS}
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        header_end, offsets = row_offsets(data)
+        if len(offsets) - 1 != len(codes):
+            raise ValueError(os.path.basename(path) + ' has ' + str(len(offsets) - 1) + ' lines but ' +
+                             str(len(codes)) + ' rows; it has quoted line breaks or blank lines.')
+        runs = key_runs(codes)
+        data_path = path
+        if len(runs) - 1 > codes.max(initial=-1) + 1:
+            # Group the rows by IR and date, keeping their order within each group.
+            order = np.lexsort([np.arange(len(codes)), codes])
+            write_partitioned(data, header_end, offsets, order, partitioned_path)
+            data_path = partitioned_path
+            lengths = np.diff(offsets)
+            if data[len(data) - 1:] != b'\n':
+                # write_partitioned adds the missing line break.
+                lengths[-1] += 1
+            offsets = np.concatenate([[header_end], header_end + np.cumsum(lengths[order])])
+            codes = codes[order]
+            keys = {k: v[order] for k, v in keys.items()}
+            runs = key_runs(codes)
+        elif os.path.exists(partitioned_path):
+            os.remove(partitioned_path)
+
+    ranges = [[keys['index'][first], keys['date'][first], int(offsets[first]), int(offsets[last]), int(last - first)]
+              for first, last in zip(runs[:-1], runs[1:])]
+    file_index = {'source': os.path.basename(path), 'size': st.st_size, 'mtime': st.st_mtime,
+                  'data': os.path.basename(data_path), 'header': header_end, 'ranges': ranges}
+    tmp_path = index_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(file_index, f)
+    os.replace(tmp_path, index_path)
+    return file_index
+
+
+def data_file(path, index_dir, saved):
+    """Return the path of the file the byte ranges of a saved index refer to:
+       the file itself or its partitioned copy."""
+
+    return path if saved['data'] == saved['source'] else os.path.join(index_dir, saved['data'])
+
+
+def file_index(path, index_dir):
+    """Return the side index of a file, building it if it doesn't exist or the
+       file has changed since it was built."""
+
+    index_path = index_paths(path, index_dir)[0]
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            saved = json.load(f)
+        st = os.stat(path)
+        if (saved['size'] == st.st_size and saved['mtime'] == st.st_mtime
+                and os.path.exists(data_file(path, index_dir, saved))):
+            return saved
+    return build_file_index(path, index_dir)
+
+
+def read_filtered(path, index_dir, indexes=None, start=None, end=None, columns=None):
+    """Read the rows of some IR and dates from a RAMP data file, using its side
+       index to parse only those rows.
+
+    Parameters
+    ----------
+
+    path:
+        The path of a RAMP page-click or country-device CSV file.
+    index_dir:
+        The directory of the side index, see build_file_index.
+    indexes:
+        A list of RAMP page-click (or access-info) index names to read. All IR are
+        read if this is None.
+    start, end:
+        Optional first and last days to read.
+    columns:
+        A list of columns to read. All columns are read by default.
+
+    Returns
+    -------
+
+    data:
+        A pandas data frame with the declared schema (see "ramp_load_data"), with
+        the selected rows in the order of the (partitioned) file.
+
+    """
+
+    saved = file_index(path, index_dir)
+    data_path = data_file(path, index_dir, saved)
+    ranges = pd.DataFrame(saved['ranges'], columns=INDEX_KEYS + ['start', 'end', 'rows'])
+    selected = np.ones(len(ranges), dtype=bool)
+    if indexes is not None:
+        selected &= ranges['index'].isin(indexes).to_numpy()
+    if start is not None:
+        selected &= (ranges['date'] >= pd.Timestamp(start).strftime('%Y-%m-%d')).to_numpy()
+    if end is not None:
+        selected &= (ranges['date'] <= pd.Timestamp(end).strftime('%Y-%m-%d')).to_numpy()
+    ranges = ranges[selected]
+
+    schema = frame_schema(path, columns)
+    buffer = io.BytesIO()
+    with open(data_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        buffer.write(data[:saved['header']])
+        for first, last in zip(ranges['start'], ranges['end']):
+            chunk = data[first:last]
+            buffer.write(chunk)
+            if not chunk.endswith(b'\n'):
+                buffer.write(b'\n')
+    buffer.seek(0)
+    return apply_schema(pd.read_csv(buffer, usecols=columns, dtype=csv_types(schema)), schema)
+
+
+def indexed_url_clicks(files, index_dir, indexes=None, start=None, end=None, bounds=None):
+    """Sum citable content clicks per IR and URL for some IR and dates, reading
+       only their rows from the page-click files.
+
+    Parameters
+    ----------
+
+    files:
+        A list of paths of RAMP page-click files.
+    index_dir:
+        The directory of the side indexes, see build_file_index.
+    indexes:
+        A list of RAMP page-click index names, or None for all IR.
+    start, end:
+        Optional first and last days to read.
+    bounds:
+        Optional date window segment boundaries (see "ramp_windows"), to sum clicks
+        per segment as well.
+
+    Returns
+    -------
+
+    url_clicks:
+        A data frame of per-URL sums, as returned by merge_url_clicks.
+
+    """
+
+    columns = PAGE_CLICK_COLS if bounds is None else PAGE_CLICK_COLS + ['date']
+    partials = []
+    for f in files:
+        data = read_filtered(f, index_dir, indexes, start, end, columns)
+        partials.append(aggregate_url_clicks(citable_clicks(data), bounds))
+    return merge_url_clicks(partials, bounds)
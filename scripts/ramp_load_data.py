@@ -0,0 +1,399 @@
+"""Load RAMP data files
+
+GitHub repository URL: <https://github.com/imls-measuring-up/ramp-analyses-scripts>
+
+The RAMP data subset published at Dryad (<https://doi.org/10.5061/dryad.fbg79cnr0>)
+is split into monthly page-click and country-device files. The page-click files are
+large, so besides reading them whole, the functions in this module can stream them in
+chunks of rows. Only the columns used by the summary statistics are read, only citable
+content rows with a positive click count are kept, and each chunk is reduced to per-URL
+sums (see "ramp_aggregate") before the next chunk is read. Peak memory then depends on
+the number of unique URLs rather than the number of rows in the files. Given the
+boundaries of date windows (see "ramp_windows"), the 'date' column is read as well and
+the sums are kept per window segment.
+
+If a cache directory is given, files are read from Parquet copies instead of being
+parsed from CSV each time (see "ramp_cache"). load_url_clicks reads several files at
+once in separate processes.
+
+Whether they are read from CSV or from the cache, files are loaded with a declared,
+memory-compact schema (FRAME_SCHEMAS) instead of the types pandas would infer: low-
+cardinality text columns are categoricals, 'citableContent' is a boolean, counts are
+32-bit integers, and URLs are Arrow strings if pyarrow is installed. Counts are parsed
+with the types pandas infers and only converted to 32-bit integers if none of them is
+missing or fractional; otherwise they keep the inferred type, as in the CSV cache (see
+"ramp_cache"). memory_report estimates how much memory this saves for each file.
+
+Dependencies:
+
+Python module pandas, available from <https://pandas.pydata.org/>, and the
+"ramp_aggregate" and "ramp_cache" modules included in the same directory.
+
+"""
+
+
+import os
+
+import time
+
+import numpy as np
+
+import fnmatch
+
+import pandas as pd
+
+from concurrent.futures import ProcessPoolExecutor
+
+from itertools import repeat
+
+from ramp_aggregate import aggregate_url_clicks, citable_clicks, merge_url_clicks
+
+from ramp_cache import cached_file, iter_cached, read_cached
+
+try:
+    STRING = pd.StringDtype('pyarrow')
+except ImportError:
+    STRING = object
+
+
+# The page-click columns used by the summary statistics.
+PAGE_CLICK_COLS = ['index', 'url', 'clicks', 'position', 'citableContent']
+
+# In-memory column types of the RAMP data files, by file name pattern. 'bool' columns
+# are True where the file has 'Yes'. Position is kept as a 64-bit float, since the
+# serp1 and serp100 statistics compare it exactly with 10 and 1000. Columns that
+# aren't listed here are read with the types pandas infers.
+FRAME_SCHEMAS = {
+    '*page-clicks*': {'url': STRING, 'index': 'category', 'clicks': 'int32', 'impressions': 'int32',
+                      'ctr': 'float32', 'date': 'category', 'position': 'float64',
+                      'citableContent': 'bool'},
+    '*country-device*': {'country': 'category', 'device': 'category', 'index': 'category',
+                         'clicks': 'int32', 'impressions': 'int32', 'ctr': 'float32',
+                         'date': 'category', 'position': 'float64'},
+}
+
+
+def find_ramp_files(ramp_data_dir, pattern):
+    """List RAMP CSV data files matching a file name pattern.
+
+    Parameters
+    ----------
+
+    ramp_data_dir:
+        The directory the RAMP data were downloaded to.
+    pattern:
+        A file name pattern, e.g. '*page-clicks*' or '*country-device-info*'.
+
+    Returns
+    -------
+
+    files:
+        A sorted list of the paths of matching files.
+
+    """
+
+    files = []
+    for r, d, n in os.walk(ramp_data_dir):
+        for f in n:
+            if fnmatch.fnmatch(f, pattern) and f.endswith('.csv'):
+                files.append(os.path.join(r, f))
+    return sorted(files)
+
+
+def frame_schema(path, columns=None):
+    """Return the in-memory column types for a RAMP data file, based on its name,
+       limited to the given columns. The dictionary is empty if the file isn't a
+       page-click or country-device file."""
+
+    for pattern, schema in FRAME_SCHEMAS.items():
+        if fnmatch.fnmatch(os.path.basename(path), pattern):
+            return {c: t for c, t in schema.items() if columns is None or c in columns}
+    return {}
+
+
+def csv_types(schema):
+    """Return the types to pass to read_csv for a schema. Boolean columns are
+       read as categoricals, and integer columns with the types pandas infers,
+       and both are converted by apply_schema."""
+
+    return {c: 'category' if t == 'bool' else t for c, t in schema.items()
+            if not pd.api.types.is_integer_dtype(t)}
+
+
+def fits_integer(values, dtype):
+    """Check that a column can be converted to an integer type without losing
+       values: none is missing or fractional, and all are in the type's range."""
+
+    if pd.api.types.is_integer_dtype(values.dtype) and np.dtype(values.dtype).itemsize <= np.dtype(dtype).itemsize:
+        return True
+    if not pd.api.types.is_numeric_dtype(values.dtype) or values.isna().any():
+        return False
+    info = np.iinfo(dtype)
+    return bool(((values % 1 == 0) & (values >= info.min) & (values <= info.max)).all())
+
+
+def apply_schema(data, schema):
+    """Convert the columns of a data frame to the types of a schema, e.g. after
+       reading a file from the Parquet cache.
+
+    Parameters
+    ----------
+
+    data:
+        A pandas data frame of RAMP data.
+    schema:
+        A dictionary of column types, as returned by frame_schema.
+
+    Returns
+    -------
+
+    data:
+        The data frame, with 'bool' columns True where the value was 'Yes'.
+        Integer columns with missing or fractional values keep their type.
+
+    """
+
+    for c, t in schema.items():
+        if c not in data.columns or data[c].dtype == t:
+            continue
+        if t == 'bool':
+            data[c] = (data[c] == 'Yes').to_numpy(dtype=bool)
+        elif pd.api.types.is_integer_dtype(t):
+            if fits_integer(data[c], t):
+                data[c] = data[c].astype(t)
+        else:
+            data[c] = data[c].astype(t)
+    return data
+
+
+def read_ramp_file(path, cache_dir=None, columns=None):
+    """Read a RAMP data file with the declared in-memory schema, using the
+       Parquet cache if possible.
+
+    Parameters
+    ----------
+
+    path:
+        The path of a RAMP page-click or country-device CSV file.
+    cache_dir:
+        The Parquet cache directory (see "ramp_cache"). The CSV file is read
+        directly if this is None.
+    columns:
+        A list of columns to read. All columns are read by default.
+
+    Returns
+    -------
+
+    data:
+        A pandas data frame.
+
+    """
+
+    schema = frame_schema(path, columns)
+    parquet_path = cached_file(path, cache_dir)
+    if parquet_path:
+        return apply_schema(read_cached(parquet_path, columns), schema)
+    return apply_schema(pd.read_csv(path, usecols=columns, dtype=csv_types(schema)), schema)
+
+
+def iter_ramp_file(path, chunk_size=1000000, cache_dir=None, columns=None):
+    """Read a RAMP data file in chunks of rows, with the declared in-memory
+       schema, using the Parquet cache if possible. Parameters are as for
+       read_ramp_file.
+
+    Yields
+    ------
+
+    chunk:
+        A pandas data frame of at most chunk_size rows.
+
+    """
+
+    schema = frame_schema(path, columns)
+    parquet_path = cached_file(path, cache_dir, chunk_size)
+    if parquet_path:
+        chunks = iter_cached(parquet_path, columns, chunk_size)
+    else:
+        chunks = pd.read_csv(path, usecols=columns, dtype=csv_types(schema), chunksize=chunk_size)
+    for chunk in chunks:
+        yield apply_schema(chunk, schema)
+
+
+def memory_report(files, sample_rows=100000):
+    """Estimate the memory needed to load RAMP data files with the types pandas
+       infers and with the declared schema. A sample of rows from the start of
+       each file is read both ways, and the sizes are scaled to the whole file.
+
+    Parameters
+    ----------
+
+    files:
+        A list of paths of RAMP CSV files.
+    sample_rows:
+        The number of rows to read from each file.
+
+    Returns
+    -------
+
+    report:
+        A data frame with one row per file and the columns 'file', 'rows'
+        (estimated), 'inferred_mb', 'compact_mb', 'saved_mb' and 'saved_pct'.
+
+    """
+
+    rows = []
+    for path in files:
+        schema = frame_schema(path)
+        inferred = pd.read_csv(path, nrows=sample_rows)
+        compact = apply_schema(pd.read_csv(path, nrows=sample_rows, dtype=csv_types(schema)), schema)
+        # Scale the sample to the file by the share of the file's bytes it covers.
+        with open(path, 'rb') as f:
+            sample_bytes = sum(len(line) for line, i in zip(f, range(len(inferred) + 1)))
+        scale = os.path.getsize(path) / sample_bytes if len(inferred) else 0
+        inferred_mb = inferred.memory_usage(deep=True).sum() * scale / 2 ** 20
+        compact_mb = compact.memory_usage(deep=True).sum() * scale / 2 ** 20
+        rows.append({'file': os.path.basename(path), 'rows': int(round(len(inferred) * scale)),
+                     'inferred_mb': inferred_mb, 'compact_mb': compact_mb,
+                     'saved_mb': inferred_mb - compact_mb,
+                     'saved_pct': 100 * (1 - compact_mb / inferred_mb) if inferred_mb else np.nan})
+    return pd.DataFrame(rows, columns=['file', 'rows', 'inferred_mb', 'compact_mb', 'saved_mb', 'saved_pct'])
+
+
+def stream_url_clicks(files, chunk_size=1000000, cache_dir=None, bounds=None):
+    """Read page-click files in chunks and sum citable content clicks per
+       IR and URL.
+
+    Parameters
+    ----------
+
+    files:
+        A list of paths of RAMP page-click files.
+    chunk_size:
+        The number of rows to read at a time.
+    cache_dir:
+        The Parquet cache directory, or None to read the CSV files directly.
+    bounds:
+        Optional date window segment boundaries (see "ramp_windows"). If given,
+        the 'date' column is read too, and clicks are summed per segment, IR
+        and URL.
+
+    Returns
+    -------
+
+    url_clicks:
+        A data frame of per-URL sums for all files, as returned by
+        merge_url_clicks.
+
+    """
+
+    columns = PAGE_CLICK_COLS if bounds is None else PAGE_CLICK_COLS + ['date']
+    total = merge_url_clicks([], bounds)
+    pending = []
+    pending_rows = 0
+    for f in files:
+        for chunk in iter_ramp_file(f, chunk_size, cache_dir, columns):
+            part = aggregate_url_clicks(citable_clicks(chunk), bounds)
+            pending.append(part)
+            pending_rows += len(part)
+            # Fold the chunk sums into the running total once they are as large
+            # as the total, so each row of the total is only re-summed a few times.
+            if pending_rows >= max(len(total), chunk_size):
+                total = merge_url_clicks([total] + pending, bounds)
+                pending = []
+                pending_rows = 0
+    return merge_url_clicks([total] + pending, bounds)
+
+
+def file_url_clicks(path, chunk_size=1000000, cache_dir=None, bounds=None):
+    """Sum citable content clicks per IR and URL for a single page-click file.
+       This is the work done by each process in load_url_clicks.
+
+    Parameters
+    ----------
+
+    path:
+        The path of a RAMP page-click file.
+    chunk_size:
+        The number of rows to read at a time, or None to read the whole file.
+    cache_dir:
+        The Parquet cache directory, or None to read the CSV file directly.
+    bounds:
+        Optional date window segment boundaries, see stream_url_clicks.
+
+    Returns
+    -------
+
+    path:
+        The path of the file.
+    url_clicks:
+        A data frame of per-URL sums, as returned by aggregate_url_clicks.
+    seconds:
+        The time taken to read and reduce the file.
+
+    """
+
+    start = time.perf_counter()
+    if chunk_size:
+        url_clicks = stream_url_clicks([path], chunk_size, cache_dir, bounds)
+    else:
+        data = read_ramp_file(path, cache_dir, PAGE_CLICK_COLS if bounds is None else PAGE_CLICK_COLS + ['date'])
+        url_clicks = aggregate_url_clicks(citable_clicks(data), bounds)
+    return path, url_clicks, time.perf_counter() - start
+
+
+def read_url_clicks(files, chunk_size=1000000, cache_dir=None, workers=None, bounds=None):
+    """Read page-click files in parallel and sum citable content clicks per
+       IR and URL for each file. Each file is read and reduced to per-URL sums
+       by a separate process, so only the sums are sent back. The time taken
+       for each file is printed.
+
+    Parameters
+    ----------
+
+    files:
+        A list of paths of RAMP page-click files.
+    chunk_size:
+        The number of rows to read at a time, or None to read whole files.
+    cache_dir:
+        The Parquet cache directory, or None to read the CSV files directly.
+    workers:
+        The number of processes to use. Defaults to the number of CPUs.
+        If 1, the files are read one at a time in the current process.
+    bounds:
+        Optional date window segment boundaries, see stream_url_clicks.
+
+    Returns
+    -------
+
+    results:
+        A list with one (path, url_clicks, seconds) tuple per file, as returned
+        by file_url_clicks, in the same order as files.
+
+    """
+
+    args = (files, repeat(chunk_size), repeat(cache_dir), repeat(bounds))
+    if workers == 1 or len(files) <= 1:
+        results = list(map(file_url_clicks, *args))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(file_url_clicks, *args))
+    for path, url_clicks, seconds in results:
+        print('Read ' + os.path.basename(path) + ' in ' + str(round(seconds, 2)) + ' seconds.')
+    return results
+
+
+def load_url_clicks(files, chunk_size=1000000, cache_dir=None, workers=None, bounds=None):
+    """Read page-click files in parallel and sum citable content clicks per
+       IR and URL across all files. Parameters are as for read_url_clicks.
+
+    Returns
+    -------
+
+    url_clicks:
+        A data frame of per-URL sums for all files, as returned by
+        merge_url_clicks.
+
+    """
+
+    results = read_url_clicks(files, chunk_size, cache_dir, workers, bounds)
+    return merge_url_clicks([url_clicks for path, url_clicks, seconds in results], bounds)
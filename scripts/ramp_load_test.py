@@ -0,0 +1,211 @@
+"""Load test the RAMP summary statistics service
+
+GitHub repository URL: <https://github.com/imls-measuring-up/ramp-analyses-scripts>
+
+This script sends a mix of queries to the JSON service in "ramp_service.py" from several
+threads at once and reports the throughput, the latency percentiles and the response
+statuses. The queries are made from the IR, platforms, countries, types and windows of
+the run being served, with a fixed seed, so runs can be compared:
+
+* per-IR statistics of one IR, platform, country or type, for all data or a window,
+  with all columns or a few,
+* rollups by platform, country and type, unfiltered or filtered, and
+* per-window breakdowns of one IR.
+
+With --distinct, only that many different queries are made, so most requests are answered
+from the service's response cache; with --distinct 0 every request is new.
+
+The service is started in this process on a free port, from the output files in the
+results directory, unless the URL of a running service is given. For example:
+
+    python ramp_load_test.py --results-dir ../results --requests 20000 --concurrency 16
+    python ramp_load_test.py --url http://127.0.0.1:8050 --requests 20000
+
+Dependencies:
+
+Python modules pandas, numpy and requests, available from <https://pandas.pydata.org/>,
+<https://numpy.org/> and <https://requests.readthedocs.io/en/master/>, and the
+"ramp_service" and "ramp_download" modules included in the same directory.
+
+"""
+
+
+import sys
+
+import json
+
+import time
+
+import argparse
+
+import threading
+
+import numpy as np
+
+from concurrent.futures import ThreadPoolExecutor
+
+from urllib.parse import urlencode
+
+from ramp_download import make_session
+
+from ramp_service import FILTER_COLS, ROLLUP_COLS, SummaryServer, SummaryService
+
+
+# Columns requested by the queries that ask for a few columns.
+QUERY_COLUMNS = ['ir', 'countItems', 'countItemUris', 'useRatio', 'sumCcd']
+
+
+def query_values(session, url):
+    """Return the values each filter can take, and the windows, in a running
+       service."""
+
+    r = session.get(url + '/stats')
+    r.raise_for_status()
+    stats = r.json()
+    values = {param: sorted({row[col] for row in stats if row.get(col) is not None})
+              for param, col in FILTER_COLS.items()}
+    r = session.get(url + '/windows')
+    r.raise_for_status()
+    return values, r.json()
+
+
+def make_queries(values, windows, n, seed=0):
+    """Make a mix of n query paths.
+
+    Parameters
+    ----------
+
+    values:
+        A dictionary mapping the parameters in FILTER_COLS to lists of values.
+    windows:
+        A list of window names.
+    n:
+        The number of queries.
+    seed:
+        The random seed.
+
+    Returns
+    -------
+
+    queries:
+        A list of paths with query strings, e.g. '/stats?ir=montana'.
+
+    """
+
+    rng = np.random.default_rng(seed)
+    windows = [None] + list(windows)
+    queries = []
+    for kind in rng.choice(['stats', 'rollup', 'breakdown'], size=n, p=[0.6, 0.3, 0.1]):
+        params = {}
+        param = str(rng.choice(list(FILTER_COLS)))
+        if kind == 'breakdown':
+            param = 'ir'
+        if values[param] and (kind != 'rollup' or rng.random() < 0.5):
+            params[param] = values[param][rng.integers(len(values[param]))]
+        window = windows[rng.integers(len(windows))]
+        if window is not None and kind != 'breakdown':
+            params['window'] = window
+        if kind != 'rollup' and rng.random() < 0.5:
+            params['columns'] = ','.join(QUERY_COLUMNS)
+        path = '/rollup/' + str(rng.choice(list(ROLLUP_COLS))) if kind == 'rollup' else '/' + kind
+        queries.append(path + ('?' + urlencode(params) if params else ''))
+    return queries
+
+
+def run_load(url, queries, concurrency=8, seed=0):
+    """Send the queries to the service from several threads.
+
+    Parameters
+    ----------
+
+    url:
+        The scheme, host and port of the service.
+    queries:
+        A list of paths with query strings, each sent once, in random order.
+    concurrency:
+        The number of requests sent at a time.
+    seed:
+        The random seed for the order of the requests.
+
+    Returns
+    -------
+
+    results:
+        A dictionary with the 'seconds' taken, the 'requests' per second, the
+        latency percentiles in milliseconds ('p50_ms', 'p95_ms', 'p99_ms' and
+        'max_ms'), and the number of responses with each status ('statuses').
+
+    """
+
+    order = np.random.default_rng(seed).permutation(len(queries))
+    session = make_session(concurrency)
+    latencies = np.zeros(len(queries))
+    statuses = {}
+    lock = threading.Lock()
+
+    def send(i):
+        start = time.perf_counter()
+        status = session.get(url + queries[i]).status_code
+        latencies[i] = time.perf_counter() - start
+        with lock:
+            statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(send, order))
+    seconds = time.perf_counter() - start
+    session.close()
+
+    p50, p95, p99 = np.percentile(latencies * 1000, [50, 95, 99])
+    return {'seconds': seconds, 'requests': len(queries) / seconds, 'p50_ms': p50, 'p95_ms': p95,
+            'p99_ms': p99, 'max_ms': latencies.max() * 1000, 'statuses': statuses}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test the RAMP summary statistics service.')
+    parser.add_argument('--url', help='URL of a running service, e.g. http://127.0.0.1:8050; by default '
+                        'a service is started in this process')
+    parser.add_argument('--results-dir', default='../results/', help='output files to serve')
+    parser.add_argument('--date', help='date of the run to serve, YYYYMMDD; defaults to the latest')
+    parser.add_argument('--cache-size', type=int, default=1024, help='responses kept in the LRU cache')
+    parser.add_argument('--requests', type=int, default=10000, help='number of requests')
+    parser.add_argument('--distinct', type=int, default=500, help='number of different queries; '
+                        '0 makes every request different')
+    parser.add_argument('--concurrency', type=int, default=8, help='requests sent at a time')
+    parser.add_argument('--seed', type=int, default=0, help='random seed for the queries')
+    parser.add_argument('--report', help='path to save the JSON report to')
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if url is None:
+        server = SummaryServer(SummaryService(args.results_dir, args.date, args.cache_size), port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = server.url
+
+    session = make_session()
+    values, windows = query_values(session, url)
+    distinct = make_queries(values, windows, args.distinct or args.requests, args.seed)
+    queries = [distinct[i % len(distinct)] for i in range(args.requests)]
+    results = run_load(url, queries, args.concurrency, args.seed)
+    results['cache'] = session.get(url + '/').json()['cache']
+    session.close()
+    if server is not None:
+        server.shutdown()
+        server.server_close()
+
+    print(str(args.requests) + ' requests (' + str(len(set(queries))) + ' different) in ' +
+          str(round(results['seconds'], 2)) + ' s: ' + str(round(results['requests'])) + ' requests/s')
+    print('Latency: ' + ', '.join(k[:-3] + ' ' + str(round(results[k], 2)) + ' ms'
+                                  for k in ['p50_ms', 'p95_ms', 'p99_ms', 'max_ms']))
+    print('Statuses: ' + ', '.join(str(s) + ': ' + str(n) for s, n in sorted(results['statuses'].items())))
+    print('Response cache: ' + str(results['cache']['hits']) + ' hits, ' + str(results['cache']['misses']) +
+          ' misses')
+
+    if args.report:
+        results['settings'] = vars(args)
+        with open(args.report, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if set(results['statuses']) != {200}:
+        sys.exit(1)
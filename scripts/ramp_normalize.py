@@ -0,0 +1,738 @@
+"""Normalize RAMP content file URLs to item URLs and URIs
+
+GitHub repository URL: <https://github.com/imls-measuring-up/ramp-analyses-scripts>
+
+RAMP page-click data report clicks on content files (PDFs, DSpace bitstreams, etc.).
+The use ratio described in Arlitsch et al., 2020 counts the items ("HTML pages")
+containing those files, so each content file URL has to be mapped back to the URL
+of its parent item and to a URI that deduplicates http and https versions of the
+same item.
+
+The per-row functions below (make_dspace_html_url, etc.) document how this is done
+for each IR platform. They are kept as the reference implementation. The analysis
+scripts use normalizer objects, which do the same thing for a whole column of URLs at
+once: each URL is split into its scheme, host and path by a single precompiled regular
+expression, and the platform specific patterns are applied to the whole column with
+pandas string methods. URLs with an unusual shape that the column-wise split can't
+reproduce exactly are handled one at a time with urlparse instead.
+
+Normalizers are registered per platform in NORMALIZERS. IR whose URLs don't follow
+their platform's pattern can be given their own item ID pattern in an optional
+'Item ID Pattern' column of "RAMP_IR_base_info.csv" (see normalizers_for).
+
+NormalizationCache memoizes normalizers by URL, so that URLs which occur in many rows
+or in many monthly files are only normalized once, optionally across runs.
+
+Dependencies:
+
+Python module pandas, available from <https://pandas.pydata.org/>.
+
+"""
+
+
+import os
+
+import re
+
+import pandas as pd
+
+from urllib.parse import urlparse
+
+
+def make_dspace_html_url(bitstream_url):
+    """For DSpace IR, generate a URL for an HTML page that contains a bitstream
+       that has a positive click count in RAMP. Basically, this function attempts
+       to infer or reverse-engineer the URL of a bitstream's parent HTML page
+       using the bitstream's URL. For DSpace IR this requires extracting the item's
+       Handle from the bitstream URL and inserting it into an item URL.
+
+    Parameters
+    ----------
+
+    bitstream_url:
+        The URL of a DSpace bitstream with a positive click count in RAMP.
+
+    Returns
+    -------
+
+    An HTML URL:
+        The URL of the HTML page ("item") that includes the bitstream.
+        
+    """
+    
+    p = urlparse(bitstream_url)
+
+    # Compile a regular expression to find the DSpace handle in the bitstream URL.
+    handle = re.compile("\/[0-9\?\.]+\/[0-9][0-9]+")
+
+    # Search the bitstream URL for the UI type.
+    xmlui = re.compile('xmlui')
+    jspui = re.compile('jspui')
+    dspace = re.compile('dspace')
+    h = handle.search(p.path)
+    x = xmlui.search(p.path)
+    j = jspui.search(p.path)
+    ds = dspace.search(p.path)
+
+    # Construct and return the item HTML page.
+    if h:
+        if j:
+            return p.scheme + '://' + p.netloc + '/' + 'jspui' + '/' + 'handle' + h.group()
+        elif x:
+            return p.scheme + '://' + p.netloc + '/' + 'xmlui' + '/' + 'handle' + h.group()
+        elif ds:
+            return p.scheme + '://' + p.netloc + '/' + 'dspace' + '/' + 'handle' + h.group()
+        else:
+            return p.scheme + '://' + p.netloc + '/' + 'handle' + h.group()
+
+
+def make_dspace_item_uri(bitstream_url):
+    """For DSpace IR, generate a URI for an HTML page that contains a bitstream
+       that has a positive click count in RAMP. Basically, this function attempts
+       to infer or reverse-engineer the URL of a bitstream's parent HTML page
+       using the bitstream's URL. For DSpace IR this requires extracting the item's
+       Handle from the bitstream URL and inserting it into an item URL.
+
+       This is the same function as above, only instead of a URL, this returns
+       a unique URI that can be used to deduplicate HTML URLs where both
+       http and https protocols are present.
+
+    Parameters
+    ----------
+
+    bitstream_url:
+        The URL of a DSpace bitstream with a positive click count in RAMP.
+
+    Returns
+    -------
+
+    An item URI:
+        A locally unique URI of the HTML page ("item") that includes the bitstream.
+        
+    """
+    
+    p = urlparse(bitstream_url)
+
+    # Compile a regular expression to find the DSpace handle in the bitstream URL.
+    handle = re.compile("\/[0-9\?\.]+\/[0-9][0-9]+")
+
+    # Search the bitstream URL for the UI type.
+    xmlui = re.compile('xmlui')
+    jspui = re.compile('jspui')
+    dspace = re.compile('dspace')
+    h = handle.search(p.path)
+    x = xmlui.search(p.path)
+    j = jspui.search(p.path)
+    ds = dspace.search(p.path)
+
+    # Construct and return the item HTML page.
+    if h:
+        return h.group()
+
+def make_eprints_fedora_html_url(pdf_url):
+    """For EPrints and Fedora IR, generate a URL for an HTML page that contains a content file
+       that has a positive click count in RAMP. Basically, this function attempts
+       to infer or reverse-engineer the URL of a file's parent HTML page
+       using the file's URL. For EPrints and Fedora IR this requires extracting the item's
+       internal ID number from the content file URL and inserting it into an item URL.
+       Note that for EPrints and Fedora IR, RAMP is currently only filtering activity
+       on PDF files, and does not filter activity on other content file types.
+
+    Parameters
+    ----------
+
+    pdf_url:
+        The URL of a PDF URL with a positive click count in RAMP.
+
+    Returns
+    -------
+
+    An HTML URL:
+        The URL of the HTML page ("item") that includes the PDF URL.
+        
+    """
+
+    p = urlparse(pdf_url)
+
+    # Compile a regular expression to find the internal ID numberof the item.
+    pdf_path = re.compile("\/[0-9][0-9]+")
+    pdf_id = pdf_path.search(p.path)
+
+    # Construct and return the item HTML page.
+    if pdf_id:
+        return p.scheme + '://' + p.netloc + pdf_id.group()
+
+
+def make_eprints_fedora_item_uri(pdf_url):
+    """For EPrints and Fedora IR, generate a URL for an HTML page that contains a content file
+       that has a positive click count in RAMP. Basically, this function attempts
+       to infer or reverse-engineer the URL of a file's parent HTML page
+       using the file's URL. For EPrints and Fedora IR this requires extracting the item's
+       internal ID number from the content file URL and inserting it into an item URL.
+       Note that for EPrints and Fedora IR, RAMP is currently only filtering activity
+       on PDF files, and does not filter activity on other content file types.
+
+       This is the same function as above, only instead of a URL, this returns
+       a unique URI that can be used to deduplicate HTML URLs where both
+       http and https protocols are present.
+
+    Parameters
+    ----------
+
+    pdf_url:
+        The URL of a PDF URL with a positive click count in RAMP.
+
+    Returns
+    -------
+
+    An item URI:
+        A locally unique URI of the HTML page ("item") that includes the PDF URL.
+        
+    """
+
+    p = urlparse(pdf_url)
+
+    # Compile a regular expression to find the internal ID numberof the item.
+    pdf_path = re.compile("\/[0-9][0-9]+")
+    pdf_id = pdf_path.search(p.path)
+
+    # Construct and return the item HTML page.
+    if pdf_id:
+        return pdf_id.group()
+
+
+def make_fedora_ne_html_url(pdf_url):
+    """This function is the same as make_eprints_fedora_html_url,
+       but the regular expression is modified to include a
+       specific prefix present in all ID numbers.
+
+    Parameters
+    ----------
+
+    pdf_url:
+        The URL of a PDF URL with a positive click count in RAMP.
+
+    Returns
+    -------
+
+    An HTML URL:
+        The URL of the HTML page ("item") that includes the PDF URL.
+        
+    """
+
+    p = urlparse(pdf_url)
+    pdf_path = re.compile("\/files\/neu:[a-z0-9]+")
+    pdf_id = pdf_path.search(p.path)
+    if pdf_id:
+        return p.scheme + '://' + p.netloc + pdf_id.group()
+
+
+def make_fedora_ne_item_uri(pdf_url):
+    """This function is the same as make_eprints_fedora_html_url,
+       but the regular expression is modified to include a
+       specific prefix present in all ID numbers.
+
+       This is the same function as above, only instead of a URL, this returns
+       a unique URI that can be used to deduplicate HTML URLs where both
+       http and https protocols are present.
+
+    Parameters
+    ----------
+
+    pdf_url:
+        The URL of a PDF URL with a positive click count in RAMP.
+
+    Returns
+    -------
+
+    An item URI:
+        A locally unique URI of the HTML page ("item") that includes the PDF URL.
+        
+    """
+
+    p = urlparse(pdf_url)
+    pdf_path = re.compile("\/files\/neu:[a-z0-9]+")
+    pdf_id = pdf_path.search(p.path)
+    if pdf_id:
+        return pdf_id.group()
+
+
+def make_bepress_oai_url(pdf_url):
+    """For BePress Digital Commons IR, generate an OAI-PMH identifier (UID) for an item
+       that contains a content file
+       that has a positive click count in RAMP. Basically, this function attempts
+       to infer or reverse-engineer the OAI-PMH UID of a file's parent HTML page
+       using the file's URL. For Digital Commons IR this requires extracting the item's
+       'context' and 'article' ID numbers from the content file URL and inserting
+       them into an OAI-PMH UID.
+
+    Parameters
+    ----------
+
+    pdf_url:
+        The URL of a PDF URL with a positive click count in RAMP.
+
+    Returns
+    -------
+
+    An OAI-PMH UID:
+        A UID that can be used to make an OAI-PMH request for the item that
+        contains the content file.
+        
+    """
+
+    p = urlparse(pdf_url)
+    base_url = 'oai:' + p.netloc + ':'
+    contextRe = re.compile(r'context=([a-z0-9_\-]*)')
+    articleRe = re.compile(r'article=([0-9][0-9][0-9][0-9])')
+    contextSearch = contextRe.search(pdf_url)
+    articleSearch = articleRe.search(pdf_url)
+    if contextSearch:
+        if articleSearch:
+            context = contextSearch.group().replace('context=', '')
+            article = articleSearch.group().replace('article=', '')
+            return base_url + str(context) + '-' + str(article)
+
+def make_bepress_item_uri(pdf_url):
+    """For BePress Digital Commons IR, generate an OAI-PMH identifier (UID) for an item
+       that contains a content file
+       that has a positive click count in RAMP. Basically, this function attempts
+       to infer or reverse-engineer the OAI-PMH UID of a file's parent HTML page
+       using the file's URL. For Digital Commons IR this requires extracting the item's
+       'context' and 'article' ID numbers from the content file URL and inserting
+       them into an OAI-PMH UID.
+
+       This is the same function as above, only instead of a URL, this returns
+       a unique URI that can be used to deduplicate HTML URLs where both
+       http and https protocols are present.
+
+    Parameters
+    ----------
+
+    pdf_url:
+        The URL of a PDF URL with a positive click count in RAMP.
+
+    Returns
+    -------
+
+    An OAI-PMH UID:
+        A locally unique UID that can be used to make an OAI-PMH request for the item that
+        contains the content file.
+        
+    """
+
+    p = urlparse(pdf_url)
+    base_url = 'oai:' + p.netloc + ':'
+    contextRe = re.compile(r'context=([a-z0-9_\-]*)')
+    articleRe = re.compile(r'article=([0-9][0-9][0-9][0-9])')
+    contextSearch = contextRe.search(pdf_url)
+    articleSearch = articleRe.search(pdf_url)
+    if contextSearch:
+        if articleSearch:
+            context = contextSearch.group().replace('context=', '')
+            article = articleSearch.group().replace('article=', '')
+            return base_url + str(context) + '-' + str(article)
+
+
+# The patterns used by the per-row functions above, for use by the normalizers below.
+DSPACE_HANDLE = re.compile(r"\/[0-9\?\.]+\/[0-9][0-9]+")
+EPRINTS_FEDORA_ID = re.compile(r"\/[0-9][0-9]+")
+FEDORA_NE_ID = re.compile(r"\/files\/neu:[a-z0-9]+")
+BEPRESS_CONTEXT = re.compile(r'context=([a-z0-9_\-]*)')
+BEPRESS_ARTICLE = re.compile(r'article=([0-9][0-9][0-9][0-9])')
+
+# Split a URL into scheme, netloc and path the way urllib.parse.urlparse does for
+# ordinary http(s) URLs. The netloc runs up to the first '/', '?' or '#', and the path
+# is empty or starts with '/'. A ";params" suffix on the last path segment is dropped
+# from the path, as urlparse does. URLs that don't match (upper case schemes, tabs or
+# newlines, hosts with non-ASCII characters, spaces or brackets such as IPv6 hosts,
+# ';' in an earlier path segment, etc.) fall back to the per-row functions so that the
+# results are always identical.
+URL_PARTS = re.compile(r"^(?P<scheme>https?)://"
+                       r"(?P<netloc>(?:(?![/?#\[\]])[\x21-\x7e])*)(?=[/?#]|\Z)"
+                       r"(?P<path>(?:/[^?#;\t\r\n]*)?)"
+                       r"(?:;[^?#/\t\r\n]*)?"
+                       r"(?:[?#][^\t\r\n]*)?\Z")
+
+def split_urls(urls):
+    """Split a column of URLs into scheme, netloc and path in one pass.
+
+    Parameters
+    ----------
+
+    urls:
+        A pandas series of content file URLs.
+
+    Returns
+    -------
+
+    parts:
+        A data frame with 'scheme', 'netloc' and 'path' columns, indexed like urls.
+        All three columns are missing for URLs that need the per-row functions.
+
+    """
+
+    return urls.str.extract(URL_PARTS)
+
+
+class Normalizer:
+    """Base class of the platform normalizers. A normalizer compiles its patterns
+       once, when it is created, and infers item URLs for a whole column of content
+       file URLs at a time.
+
+       Subclasses implement normalize_parts, which works on URLs split by
+       split_urls, and normalize_row, which handles a single URL with urlparse and
+       is used for URLs that split_urls can't split exactly.
+
+    Attributes
+    ----------
+
+    key:
+        A string identifying the normalizer and its patterns, used e.g. by
+        NormalizationCache.
+
+    """
+
+    key = None
+
+    def normalize_parts(self, urls, parts):
+        raise NotImplementedError
+
+    def normalize_row(self, url):
+        raise NotImplementedError
+
+    def normalize(self, urls):
+        """Generate item HTML URLs and unique item URIs for a column of content
+           file URLs.
+
+        Parameters
+        ----------
+
+        urls:
+            A pandas series of content file URLs with positive click counts in RAMP.
+
+        Returns
+        -------
+
+        items:
+            A data frame indexed like urls with two columns, 'html_url' and
+            'unique_item_uri.' Values are missing where no item could be inferred
+            from the URL.
+
+        """
+
+        items = pd.DataFrame(index=urls.index, columns=['html_url', 'unique_item_uri'], dtype=object)
+        if len(urls) == 0:
+            return items
+
+        urls = urls.astype(object)
+        parts = split_urls(urls)
+        html_url, item_uri = self.normalize_parts(urls, parts)
+        items['html_url'] = html_url.astype(object)
+        items['unique_item_uri'] = item_uri.astype(object)
+
+        # Use the per-row function for URLs that couldn't be split.
+        unsplit = parts['scheme'].isna() & urls.notna()
+        if unsplit.any():
+            rows = [self.normalize_row(url) for url in urls[unsplit]]
+            items.loc[unsplit, 'html_url'] = [html_url for html_url, item_uri in rows]
+            items.loc[unsplit, 'unique_item_uri'] = [item_uri for html_url, item_uri in rows]
+        return items
+
+
+class DSpaceNormalizer(Normalizer):
+    """Infer DSpace item URLs from bitstream URLs, like make_dspace_html_url and
+       make_dspace_item_uri."""
+
+    key = 'dspace'
+
+    def __init__(self):
+        self.handle = re.compile('(' + DSPACE_HANDLE.pattern + ')')
+
+    def normalize_parts(self, urls, parts):
+        path = parts['path']
+        handle = path.str.extract(self.handle, expand=False)
+        # The UI type is checked in the same order as make_dspace_html_url.
+        ui = pd.Series('', index=urls.index, dtype=object)
+        ui[path.str.contains('dspace', regex=False, na=False)] = '/dspace'
+        ui[path.str.contains('xmlui', regex=False, na=False)] = '/xmlui'
+        ui[path.str.contains('jspui', regex=False, na=False)] = '/jspui'
+        html_url = parts['scheme'] + '://' + parts['netloc'] + ui + '/handle' + handle
+        return html_url, handle
+
+    def normalize_row(self, url):
+        return make_dspace_html_url(url), make_dspace_item_uri(url)
+
+
+class ItemIdNormalizer(Normalizer):
+    r"""Infer item URLs by appending the first match of an item ID pattern in a
+       content file's path to the file's scheme and host, like
+       make_eprints_fedora_html_url and make_fedora_ne_html_url. The item ID is
+       used as the unique item URI.
+
+    Parameters
+    ----------
+
+    pattern:
+        A regular expression matching the item ID part of the path, including
+        the leading '/', e.g. r"\/[0-9][0-9]+" for EPrints.
+
+    """
+
+    def __init__(self, pattern):
+        self.pattern = re.compile(pattern)
+        self.item_id = re.compile('(' + self.pattern.pattern + ')')
+        self.key = 'item-id:' + self.pattern.pattern
+
+    def normalize_parts(self, urls, parts):
+        item_id = parts['path'].str.extract(self.item_id, expand=False)
+        html_url = parts['scheme'] + '://' + parts['netloc'] + item_id
+        return html_url, item_id
+
+    def normalize_row(self, url):
+        p = urlparse(url)
+        item_id = self.pattern.search(p.path)
+        if item_id:
+            return p.scheme + '://' + p.netloc + item_id.group(), item_id.group()
+        return None, None
+
+
+class BepressNormalizer(Normalizer):
+    """Infer OAI-PMH identifiers of Digital Commons items from content file URLs,
+       like make_bepress_oai_url and make_bepress_item_uri."""
+
+    key = 'bepress-oai'
+
+    def __init__(self):
+        self.context = re.compile(BEPRESS_CONTEXT.pattern)
+        self.article = re.compile(BEPRESS_ARTICLE.pattern)
+
+    def normalize_parts(self, urls, parts):
+        # The context and article numbers are searched for in the whole URL, not the path.
+        context = urls.str.extract(self.context, expand=False)
+        article = urls.str.extract(self.article, expand=False)
+        oai_id = 'oai:' + parts['netloc'] + ':' + context + '-' + article
+        return oai_id, oai_id
+
+    def normalize_row(self, url):
+        return make_bepress_oai_url(url), make_bepress_item_uri(url)
+
+
+# The normalizer used for each IR platform, as given in the 'Platform' column of
+# "RAMP_IR_base_info.csv." Add a platform with register_normalizer.
+NORMALIZERS = {}
+
+
+def register_normalizer(platform, normalizer):
+    """Use a normalizer for the IR on a platform."""
+
+    NORMALIZERS[platform] = normalizer
+
+
+register_normalizer('DSpace', DSpaceNormalizer())
+register_normalizer('EPrints 3', ItemIdNormalizer(EPRINTS_FEDORA_ID.pattern))
+register_normalizer('Fedora', NORMALIZERS['EPrints 3'])
+register_normalizer('Fedora/Samvera', NORMALIZERS['Fedora'])
+register_normalizer('Digital Commons', BepressNormalizer())
+
+
+# Item ID patterns of IR whose content file URLs don't follow their platform's usual
+# pattern, by RAMP page-click index. They are used unless the IR base info table gives
+# the IR an 'Item ID Pattern'. Add an IR with register_item_id_pattern.
+ITEM_ID_PATTERNS = {}
+
+
+def register_item_id_pattern(pc_index, pattern):
+    """Use an item ID pattern for an IR, given by its RAMP page-click index."""
+
+    ITEM_ID_PATTERNS[pc_index] = pattern
+
+
+register_item_id_pattern('northeastern_page_clicks', FEDORA_NE_ID.pattern)
+
+
+def get_normalizer(platform, item_id_pattern=None):
+    """Return the normalizer for an IR.
+
+    Parameters
+    ----------
+
+    platform:
+        The IR's software platform.
+    item_id_pattern:
+        An optional item ID pattern for the IR. If given, an ItemIdNormalizer with
+        this pattern is used instead of the platform's normalizer.
+
+    Returns
+    -------
+
+    normalizer:
+        A Normalizer, or None if the platform has no normalizer.
+
+    """
+
+    if isinstance(item_id_pattern, str) and item_id_pattern:
+        key = 'item-id:' + item_id_pattern
+        if key not in _pattern_normalizers:
+            _pattern_normalizers[key] = ItemIdNormalizer(item_id_pattern)
+        return _pattern_normalizers[key]
+    return NORMALIZERS.get(platform)
+
+
+# ItemIdNormalizers created for per-IR item ID patterns, so each pattern is only
+# compiled once.
+_pattern_normalizers = {}
+
+
+def normalizers_for(ir_info):
+    r"""Return the normalizer for each IR in the IR base info table.
+
+       IR whose item URLs don't follow their platform's usual pattern are given a
+       regular expression matching their item IDs, either in an optional 'Item ID
+       Pattern' column or, for IR without one, in ITEM_ID_PATTERNS (e.g.
+       \/files\/neu:[a-z0-9]+ for Northeastern's Fedora/Samvera IR). Other IR use
+       the normalizer of their 'Platform'.
+
+    Parameters
+    ----------
+
+    ir_info:
+        A pandas data frame read from "RAMP_IR_base_info.csv."
+
+    Returns
+    -------
+
+    normalizers:
+        A dictionary mapping RAMP page-click index names to normalizers. IR
+        without a normalizer are left out.
+
+    """
+
+    patterns = ir_info['Item ID Pattern'] if 'Item ID Pattern' in ir_info else [None] * len(ir_info)
+    normalizers = {}
+    for pc_index, platform, pattern in zip(ir_info['ir_page_click_index'], ir_info['Platform'], patterns):
+        if not (isinstance(pattern, str) and pattern):
+            pattern = ITEM_ID_PATTERNS.get(pc_index)
+        normalizer = get_normalizer(platform, pattern)
+        if normalizer is not None:
+            normalizers[pc_index] = normalizer
+    return normalizers
+
+
+def normalize_urls(urls, platform):
+    """Generate item HTML URLs and unique item URIs for a column of content file URLs.
+       This gives the same results as applying the per-row functions for the
+       platform to each URL, but each URL is only parsed once and all of the
+       regular expressions are compiled ahead of time.
+
+    Parameters
+    ----------
+
+    urls:
+        A pandas series of content file URLs with positive click counts in RAMP.
+    platform:
+        The IR's software platform, as given in the 'Platform' column of
+        "RAMP_IR_base_info.csv," or a Normalizer.
+
+    Returns
+    -------
+
+    items:
+        A data frame indexed like urls with two columns, 'html_url' and
+        'unique_item_uri.' Values are missing where no item could be inferred
+        from the URL. Both columns are missing for unknown platforms.
+
+    """
+
+    normalizer = platform if isinstance(platform, Normalizer) else NORMALIZERS.get(platform)
+    if normalizer is None:
+        return pd.DataFrame(index=urls.index, columns=['html_url', 'unique_item_uri'], dtype=object)
+    return normalizer.normalize(urls)
+
+
+class NormalizationCache:
+    """Memoize normalize_urls by normalizer and URL. The same content file URLs
+       recur in every monthly page-click file, so each unique URL only has to be
+       normalized once, and the results can be saved to a file and reused by
+       later runs.
+
+    Parameters
+    ----------
+
+    path:
+        Optional path of a compressed CSV file the cache is loaded from, if it
+        exists, and saved to by save().
+
+    Attributes
+    ----------
+
+    hits, misses:
+        The number of unique URLs looked up that were or weren't already in
+        the cache.
+    rows:
+        The total number of URLs (rows) looked up.
+
+    """
+
+    # Increment when normalize_urls changes, so results stored by older
+    # versions are ignored.
+    version = 2
+
+    def __init__(self, path=None):
+        self.path = path
+        self.items = {}
+        self.hits = 0
+        self.misses = 0
+        self.rows = 0
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def normalize(self, urls, platform):
+        """Return the same result as normalize_urls(urls, platform), only
+           normalizing URLs that aren't in the cache yet."""
+
+        normalizer = platform if isinstance(platform, Normalizer) else NORMALIZERS.get(platform)
+        if normalizer is None:
+            return normalize_urls(urls, normalizer)
+        known = self.items.get(normalizer.key)
+        unique = pd.Index(urls.dropna().unique())
+        new = unique if known is None else unique.difference(known.index)
+        self.rows += len(urls)
+        self.misses += len(new)
+        self.hits += len(unique) - len(new)
+        if len(new) > 0:
+            computed = normalizer.normalize(pd.Series(new, index=new, dtype=object))
+            known = computed if known is None else pd.concat([known, computed])
+            self.items[normalizer.key] = known
+        if known is None:
+            return normalizer.normalize(urls)
+        items = known.reindex(urls)
+        items.index = urls.index
+        return items
+
+    def hit_rate(self):
+        """Return the share of unique URL lookups that were answered from the cache."""
+
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def load(self, path):
+        """Add the normalized URLs stored in a file to the cache."""
+
+        stored = pd.read_csv(path, dtype=object, compression='gzip')
+        stored = stored[stored['version'] == str(self.version)]
+        if stored.empty:
+            return
+        for key, items in stored.groupby('normalizer'):
+            self.items[key] = items.set_index('url')[['html_url', 'unique_item_uri']]
+
+    def save(self, path=None):
+        """Save the cache to a file, by default the file it was loaded from."""
+
+        path = path or self.path
+        frames = [items.rename_axis('url').reset_index().assign(normalizer=key, version=self.version)
+                  for key, items in self.items.items()]
+        if frames:
+            tmp_path = path + '.tmp'
+            pd.concat(frames).to_csv(tmp_path, index=False, compression='gzip')
+            os.replace(tmp_path, path)
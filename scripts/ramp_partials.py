@@ -0,0 +1,148 @@
+"""Store per-month partial aggregates of RAMP page-click data
+
+GitHub repository URL: <https://github.com/imls-measuring-up/ramp-analyses-scripts>
+
+Every statistic in "RAMP_summary_stats_YYYYMMDD.csv" can be computed from per-IR,
+per-URL sums of clicks and of clicks in the first 10 and 1000 search result positions
+(see "ramp_aggregate"), and sums for different months can simply be added together.
+The functions in this module save those sums for each monthly page-click file in a
+partials directory. When a new month of RAMP data is added, only the new file is read;
+the summary statistics are then regenerated from the stored partials of all months,
+without reading the older raw files again (they can even be deleted).
+
+A partial is recomputed if the size or modification time of its page-click file
+changes. Partials are stored as compressed CSV files, one per page-click file, and
+a "partials.json" file in the same directory records the page-click file each was
+made from. To leave a month out of the summary statistics, delete its partial file.
+
+Dependencies:
+
+Python module pandas, available from <https://pandas.pydata.org/>, and the
+"ramp_aggregate" and "ramp_load_data" modules included in the same directory.
+
+"""
+
+
+import os
+
+import json
+
+import pandas as pd
+
+from ramp_aggregate import URL_CLICK_COLS, merge_url_clicks
+
+from ramp_load_data import read_url_clicks
+
+
+# Name of the file in the partials directory describing the stored partials.
+INDEX_NAME = 'partials.json'
+
+
+def partial_name(path):
+    """Return the name a page-click file's partial is stored under, e.g.
+       '2019-01_RAMP_subset_page-clicks_v2' for the January 2019 file."""
+
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def partial_path(partials_dir, name):
+    """Return the path of a stored partial."""
+
+    return os.path.join(partials_dir, name + '.csv.gz')
+
+
+def read_partial(path):
+    """Read a stored partial.
+
+    Parameters
+    ----------
+
+    path:
+        The path of a stored partial.
+
+    Returns
+    -------
+
+    url_clicks:
+        A data frame of per-URL sums, as returned by aggregate_url_clicks.
+
+    """
+
+    partial = pd.read_csv(path, dtype={'index': str, 'url': str}, compression='gzip')
+    return partial.set_index(['index', 'url'])[URL_CLICK_COLS]
+
+
+def write_partial(url_clicks, path):
+    """Save per-URL sums as a stored partial."""
+
+    tmp_path = path + '.tmp'
+    url_clicks.reset_index().to_csv(tmp_path, index=False, compression='gzip')
+    os.replace(tmp_path, path)
+
+
+def read_index(partials_dir):
+    """Return the dictionary describing the stored partials in a directory."""
+
+    index_path = os.path.join(partials_dir, INDEX_NAME)
+    if not os.path.exists(index_path):
+        return {}
+    with open(index_path) as f:
+        return json.load(f)
+
+
+def is_current(path, entry):
+    """Check whether a stored partial was made from the current version of a
+       page-click file. A partial whose file no longer exists is kept."""
+
+    if not os.path.exists(path):
+        return True
+    st = os.stat(path)
+    return entry['size'] == st.st_size and entry['mtime'] == st.st_mtime
+
+
+def update_partials(files, partials_dir, chunk_size=1000000, cache_dir=None, workers=None):
+    """Store partials for page-click files that don't have a current one, and
+       return the merged per-URL sums of all stored partials.
+
+    Parameters
+    ----------
+
+    files:
+        A list of paths of RAMP page-click files.
+    partials_dir:
+        The directory the partials are stored in. It is created if it doesn't exist.
+    chunk_size:
+        The number of rows to read at a time, or None to read whole files.
+    cache_dir:
+        The Parquet cache directory, or None to read the CSV files directly.
+    workers:
+        The number of processes used to read files.
+
+    Returns
+    -------
+
+    url_clicks:
+        A data frame of per-URL sums for all stored partials, including partials of
+        files that are no longer in the files list, as returned by merge_url_clicks.
+
+    """
+
+    os.makedirs(partials_dir, exist_ok=True)
+    index = read_index(partials_dir)
+    index = {name: entry for name, entry in index.items()
+             if os.path.exists(partial_path(partials_dir, name))}
+    new_files = [f for f in files if partial_name(f) not in index
+                 or not is_current(f, index[partial_name(f)])]
+
+    for path, url_clicks, seconds in read_url_clicks(new_files, chunk_size, cache_dir, workers):
+        name = partial_name(path)
+        write_partial(url_clicks, partial_path(partials_dir, name))
+        st = os.stat(path)
+        index[name] = {'source': os.path.basename(path), 'size': st.st_size,
+                       'mtime': st.st_mtime, 'urls': len(url_clicks)}
+    with open(os.path.join(partials_dir, INDEX_NAME), 'w') as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+
+    print('Using stored partials for ' + str(len(index) - len(new_files)) + ' of ' +
+          str(len(index)) + ' page-click files.')
+    return merge_url_clicks([read_partial(partial_path(partials_dir, name)) for name in sorted(index)])
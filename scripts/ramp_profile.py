@@ -0,0 +1,280 @@
+"""Record the time and memory used by each stage of a RAMP analysis run
+
+GitHub repository URL: <https://github.com/imls-measuring-up/ramp-analyses-scripts>
+
+A RunReport records, for each stage of a run (downloading, reading the page-click
+files, normalizing URLs, computing statistics, etc.) and for each IR in the main loop
+of "ramp_summary_stats_normalize_urls.py":
+
+* the wall clock time,
+* the CPU time used by this process and by child processes (e.g. the processes that
+  read the page-click files) that finished during the stage,
+* the number of rows processed, where the caller knows it, and
+* the peak resident set size (RSS) during the stage.
+
+On Linux, the peak RSS of each stage is measured separately by resetting the process's
+high water mark when the stage starts. On other systems only the peak RSS of the whole
+run so far is available, which is reported instead.
+
+Stages can also be run under cProfile, which writes a ".prof" file that can be read with
+the pstats module (python -m pstats <file>) or a viewer such as snakeviz.
+
+The report is saved as a JSON file, e.g. next to the "RAMP_summary_stats_YYYYMMDD.csv"
+output file. Errors that only affect some IR (e.g. an IR whose URLs can't be normalized)
+are collected as structured error records rather than stopping the run, and are saved
+in the report and in a separate errors file, so that IR missing from the output are
+easy to find.
+
+Dependencies:
+
+The modules used here are all included in the default Python installation. The resource
+module is only available on Unix; without it, CPU time of child processes and peak RSS
+are not reported.
+
+"""
+
+
+import os
+
+import sys
+
+import json
+
+import time
+
+import cProfile
+
+import traceback
+
+from contextlib import contextmanager
+
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# Files used to measure and reset the peak RSS of this process on Linux.
+PROC_STATUS = '/proc/self/status'
+PROC_CLEAR_REFS = '/proc/self/clear_refs'
+
+
+def max_rss_mb():
+    """Return the largest resident set size in megabytes of this process and of
+       its child processes, or None if it isn't available."""
+
+    if resource is None:
+        return None, None
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    scale = 2 ** 20 if sys.platform == 'darwin' else 2 ** 10
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale)
+
+
+def peak_rss_mb():
+    """Return the peak resident set size of this process in megabytes since it
+       was last reset with reset_peak_rss, or since the process started."""
+
+    try:
+        with open(PROC_STATUS) as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 2 ** 10
+    except OSError:
+        pass
+    return max_rss_mb()[0]
+
+
+def reset_peak_rss():
+    """Reset the peak resident set size of this process to its current size.
+       Returns False if this isn't supported (it requires Linux)."""
+
+    try:
+        with open(PROC_CLEAR_REFS, 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def child_cpu_seconds():
+    """Return the CPU time used by finished child processes of this process."""
+
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def error_record(stage, error, **context):
+    """Describe an exception caught while processing part of the data, e.g. one IR.
+
+    Parameters
+    ----------
+
+    stage:
+        The name of the stage the error happened in.
+    error:
+        The exception.
+    context:
+        Values identifying what was being processed, e.g. ir='montana' and
+        pc_index='montana_page_clicks'.
+
+    Returns
+    -------
+
+    record:
+        A dictionary with the stage, the context, the type of error, its message
+        and the traceback, which can be saved as JSON.
+
+    """
+
+    record = {'stage': stage}
+    record.update(context)
+    record.update({'error': type(error).__name__, 'message': str(error),
+                   'traceback': ''.join(traceback.format_exception(type(error), error, error.__traceback__))})
+    return record
+
+
+class RunReport:
+    """Records the time, CPU time, rows and peak memory of the stages of a run.
+
+    Parameters
+    ----------
+
+    enabled:
+        If False, stages are run without recording anything, so functions can
+        accept a report without checking whether one was given.
+    profile_stages:
+        A list of names of stages to run under cProfile.
+    profile_prefix:
+        The path prefix of the ".prof" files, e.g. '../results/RAMP_summary_stats_20190601'.
+        A stage's profile is written to '<profile_prefix>_<stage>.prof'.
+
+    """
+
+    def __init__(self, enabled=True, profile_stages=(), profile_prefix='ramp_profile'):
+        self.enabled = enabled
+        self.profile_stages = set(profile_stages or ())
+        self.profile_prefix = profile_prefix
+        self.started = datetime.now().isoformat(timespec='seconds')
+        self.start = time.perf_counter()
+        self.stages = []
+        self.irs = {}
+        self.info = {}
+        self.errors = []
+        self._open = []
+        self._separate_peaks = reset_peak_rss() if enabled else False
+
+    @contextmanager
+    def stage(self, name, rows=None, ir=None):
+        """Record a stage of the run.
+
+        Parameters
+        ----------
+
+        name:
+            The name of the stage.
+        rows:
+            The number of rows processed, if known. It can also be set while the
+            stage runs, by assigning to record['rows'].
+        ir:
+            If given, the stage is recorded as the work done for this IR in the
+            per-IR part of the report, instead of as a stage.
+
+        Yields
+        ------
+
+        record:
+            The dictionary that is added to the report.
+
+        """
+
+        record = {'name': name, 'rows': rows}
+        if not self.enabled:
+            yield record
+            return
+
+        if self._separate_peaks:
+            # Keep the peak reached so far by the enclosing stage before resetting.
+            if self._open:
+                self._open[-1]['peak_rss_mb'] = max(self._open[-1]['peak_rss_mb'], peak_rss_mb())
+            reset_peak_rss()
+        record['peak_rss_mb'] = 0.0
+        record['stage'] = '/'.join([r['name'] for r in self._open] + [name])
+        # Only one profiler can be active at a time, so stages inside a profiled
+        # stage aren't profiled separately.
+        profiler = None
+        if name in self.profile_stages and not any('profile' in r for r in self._open):
+            profiler = cProfile.Profile()
+            record['profile'] = self.profile_prefix + '_' + name + '.prof'
+        if ir is None:
+            self.stages.append(record)
+        else:
+            self.irs[ir] = record
+        self._open.append(record)
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        child_cpu = child_cpu_seconds()
+        try:
+            if profiler:
+                profiler.enable()
+            yield record
+        finally:
+            if profiler:
+                profiler.disable()
+            record['wall_seconds'] = time.perf_counter() - wall
+            record['cpu_seconds'] = time.process_time() - cpu
+            record['child_cpu_seconds'] = child_cpu_seconds() - child_cpu
+            record['peak_rss_mb'] = max(record['peak_rss_mb'], peak_rss_mb() or 0.0)
+            self._open.pop()
+            if self._open:
+                self._open[-1]['peak_rss_mb'] = max(self._open[-1]['peak_rss_mb'], record['peak_rss_mb'])
+            if profiler:
+                profiler.dump_stats(record['profile'])
+
+    def to_dict(self):
+        """Return the report as a dictionary that can be saved as JSON."""
+
+        rss, children_rss = max_rss_mb()
+        return {'started': self.started, 'wall_seconds': time.perf_counter() - self.start,
+                'cpu_seconds': time.process_time(), 'child_cpu_seconds': child_cpu_seconds(),
+                'max_rss_mb': rss, 'children_max_rss_mb': children_rss,
+                'separate_stage_peaks': self._separate_peaks, 'info': self.info,
+                'stages': self.stages, 'irs': self.irs, 'errors': self.errors}
+
+    def save(self, path):
+        """Save the report to a JSON file."""
+
+        if not self.enabled:
+            return
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2, default=str)
+        os.replace(tmp_path, path)
+
+    def save_errors(self, path):
+        """Save the error records to a JSON file, if there are any. Errors are
+           saved even if the report isn't enabled."""
+
+        if not self.errors:
+            return
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.errors, f, indent=2, default=str)
+        os.replace(tmp_path, path)
+
+    def summary(self):
+        """Return a short text summary of the stages, one line per stage."""
+
+        lines = []
+        for r in self.stages:
+            line = (r['stage'].ljust(30) + str(round(r['wall_seconds'], 2)).rjust(9) + ' s' +
+                    str(round(r['cpu_seconds'] + r['child_cpu_seconds'], 2)).rjust(9) + ' s CPU' +
+                    str(round(r['peak_rss_mb'], 1)).rjust(9) + ' MB')
+            if r['rows'] is not None:
+                line += str(r['rows']).rjust(12) + ' rows'
+            lines.append(line)
+        return '\n'.join(lines)
@@ -0,0 +1,490 @@
+"""Check that reconstructed item URLs and OAI-PMH identifiers resolve
+
+GitHub repository URL: <https://github.com/imls-measuring-up/ramp-analyses-scripts>
+
+The item counts and use ratios in the summary statistics depend on the item URLs and
+URIs inferred from content file URLs (see "ramp_normalize"): item page URLs for DSpace,
+EPrints and Fedora IR, and OAI-PMH identifiers ("oai:<host>:<context>-<article>") for
+BePress Digital Commons IR. Nothing in the normalizers checks that the inferred items
+exist. The functions in this module check them in bulk:
+
+* Item page URLs are requested with HEAD requests, following redirects. Servers that
+  don't allow HEAD (status 405 or 501) are asked with a GET request instead, without
+  reading the page.
+* OAI-PMH identifiers are requested with a GetRecord request to the OAI-PMH endpoint
+  of their host, by default "https://<host>/do/oai/" as for Digital Commons. The
+  response is OK if it has a record, and the item is missing if it has an
+  "idDoesNotExist" error.
+
+Requests are run from asyncio tasks on a pool of threads sharing one pooled requests
+session (as in "ramp_download"), so connections to each host are reused. The number of
+requests to each host at a time is limited, so that no repository gets more than a few
+concurrent requests however many items of it are checked. Connection errors, timeouts,
+and status 429 and 5xx responses are retried with exponential backoff.
+
+Results are stored in a compressed CSV file (see ResolveCache), and items that were
+already found to resolve, or to be missing, are not requested again on later runs.
+Failed checks are retried on every run.
+
+StandInServer is a local OAI-PMH and item page server answering for a given set of
+identifiers and URLs, so the resolver can be tried, and timed, without network access.
+For example, to check 20,000 items against it:
+
+    python ramp_resolve.py --stand-in 20000
+
+Dependencies:
+
+Python modules pandas and requests, available from <https://pandas.pydata.org/> and
+<https://requests.readthedocs.io/en/master/>, and the "ramp_aggregate" and
+"ramp_download" modules included in the same directory.
+
+"""
+
+
+import os
+
+import time
+
+import asyncio
+
+import argparse
+
+import requests
+
+import threading
+
+import pandas as pd
+
+import xml.etree.ElementTree as ET
+
+from concurrent.futures import ThreadPoolExecutor
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from urllib.parse import parse_qs, urlsplit
+
+from ramp_aggregate import encode_urls
+
+from ramp_download import make_session
+
+
+# The namespace of OAI-PMH responses.
+OAI_NS = '{http://www.openarchives.org/OAI/2.0/}'
+
+# The path of the OAI-PMH endpoint of Digital Commons repositories.
+OAI_PATH = '/do/oai/'
+
+# Response statuses that are retried, besides connection errors and timeouts.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# The columns of a resolver result.
+RESOLVE_COLS = ['target', 'status', 'code', 'url', 'message', 'checked']
+
+
+def target_host(target):
+    """Return the host of an item URL or OAI-PMH identifier."""
+
+    if target.startswith('oai:'):
+        return target.split(':')[1]
+    return urlsplit(target).netloc
+
+
+def check_request(target, oai_urls=None, host_urls=None):
+    """Make the request that checks an item URL or OAI-PMH identifier.
+
+    Parameters
+    ----------
+
+    target:
+        An item URL or an OAI-PMH identifier.
+    oai_urls:
+        An optional dictionary mapping hosts to the URLs of their OAI-PMH endpoints,
+        for hosts whose endpoint isn't "https://<host>/do/oai/".
+    host_urls:
+        An optional dictionary mapping hosts to the scheme and host requests are sent
+        to instead, e.g. {'works.bepress.com': 'http://127.0.0.1:8000'} to send them
+        to a StandInServer.
+
+    Returns
+    -------
+
+    method:
+        'GET' for OAI-PMH identifiers, 'HEAD' for item URLs.
+    url:
+        The URL requested.
+    params:
+        The query parameters of an OAI-PMH request, or None.
+
+    """
+
+    host = target_host(target)
+    if target.startswith('oai:'):
+        url = (oai_urls or {}).get(host, 'https://' + host + OAI_PATH)
+        params = {'verb': 'GetRecord', 'metadataPrefix': 'oai_dc', 'identifier': target}
+        method = 'GET'
+    else:
+        url, params, method = target, None, 'HEAD'
+    if host_urls and host in host_urls:
+        parts = urlsplit(url)
+        url = host_urls[host] + parts.path + ('?' + parts.query if parts.query else '')
+    return method, url, params
+
+
+def oai_status(content):
+    """Read the outcome of an OAI-PMH GetRecord response.
+
+    Returns
+    -------
+
+    status:
+        'ok' if the response has a record, 'missing' for an "idDoesNotExist" error,
+        or 'failed' for other errors and responses that aren't OAI-PMH.
+    message:
+        The OAI-PMH error code and message, or None.
+
+    """
+
+    try:
+        root = ET.fromstring(content)
+    except ET.ParseError as e:
+        return 'failed', 'Not an OAI-PMH response: ' + str(e)
+    error = root.find(OAI_NS + 'error')
+    if error is not None:
+        code = error.get('code')
+        return ('missing' if code == 'idDoesNotExist' else 'failed'), code + ': ' + (error.text or '').strip()
+    if root.find(OAI_NS + 'GetRecord/' + OAI_NS + 'record') is not None:
+        return 'ok', None
+    return 'failed', 'The OAI-PMH response has no record.'
+
+
+def check_target(session, target, oai_urls=None, host_urls=None, timeout=30):
+    """Request an item URL or OAI-PMH identifier once.
+
+    Returns
+    -------
+
+    result:
+        A dictionary with the columns listed in RESOLVE_COLS except 'checked': the
+        'status' is 'ok', 'missing' (status 404 or 410, or an "idDoesNotExist"
+        OAI-PMH error) or 'failed', 'code' the HTTP status code, and 'url' the URL
+        the request was redirected to.
+
+    Raises
+    ------
+
+    requests.RequestException:
+        For connection errors and timeouts.
+
+    """
+
+    method, url, params = check_request(target, oai_urls, host_urls)
+    if method == 'HEAD':
+        r = session.head(url, allow_redirects=True, timeout=timeout)
+        if r.status_code in (405, 501):
+            # HEAD isn't allowed; only the status of a GET request is needed.
+            r = session.get(url, allow_redirects=True, timeout=timeout, stream=True)
+            r.close()
+    else:
+        r = session.get(url, params=params, allow_redirects=True, timeout=timeout)
+    result = {'target': target, 'code': r.status_code, 'url': r.url, 'message': None}
+    if r.status_code in (404, 410):
+        result['status'] = 'missing'
+    elif r.status_code >= 400:
+        result['status'] = 'failed'
+        result['message'] = r.reason
+    elif method == 'GET':
+        result['status'], result['message'] = oai_status(r.content)
+    else:
+        result['status'] = 'ok'
+    return result
+
+
+class ResolveCache:
+    """Stores the results of checked items, so they aren't requested again.
+
+    Only definite results ('ok' and 'missing') are kept; failed checks are
+    requested again. The results are kept as a pandas data frame indexed by
+    target, in the 'results' attribute.
+
+    Parameters
+    ----------
+
+    path:
+        Optional path of a compressed CSV file the cache is loaded from, if it
+        exists, and saved to by save().
+
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.results = pd.DataFrame(columns=RESOLVE_COLS).set_index('target')
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def __contains__(self, target):
+        return target in self.results.index
+
+    def __len__(self):
+        return len(self.results)
+
+    def add(self, results):
+        """Add a data frame of results, as returned by resolve, replacing older
+           results for the same targets."""
+
+        results = results[results['status'].isin(['ok', 'missing'])].set_index('target')
+        if len(results) == 0:
+            return
+        kept = self.results[~self.results.index.isin(results.index)]
+        self.results = pd.concat([kept, results[kept.columns]]) if len(kept) else results[self.results.columns]
+
+    def load(self, path):
+        """Add the results stored in a file to the cache."""
+
+        stored = pd.read_csv(path, dtype={'target': object, 'status': object, 'code': 'Int64', 'url': object,
+                                          'message': object, 'checked': object}, compression='gzip')
+        self.add(stored)
+
+    def save(self, path=None):
+        """Save the cache to a file, by default the file it was loaded from."""
+
+        path = path or self.path
+        tmp_path = path + '.tmp'
+        self.results.reset_index().to_csv(tmp_path, index=False, compression='gzip')
+        os.replace(tmp_path, path)
+
+
+async def resolve_async(targets, session, executor, per_host=4, retries=3, backoff=1.0, timeout=30,
+                        oai_urls=None, host_urls=None):
+    """Check item URLs and OAI-PMH identifiers concurrently, with at most per_host
+       requests to each host at a time. See resolve for the parameters."""
+
+    loop = asyncio.get_running_loop()
+    limits = {}
+
+    async def check(target):
+        host = target_host(target)
+        limit = limits.setdefault(host, asyncio.Semaphore(per_host))
+        for attempt in range(retries + 1):
+            delay = backoff * 2 ** attempt
+            async with limit:
+                try:
+                    result = await loop.run_in_executor(executor, check_target, session, target,
+                                                        oai_urls, host_urls, timeout)
+                except requests.RequestException as e:
+                    result = {'target': target, 'status': 'failed', 'code': None, 'url': None,
+                              'message': type(e).__name__ + ': ' + str(e)}
+                    retry = True
+                else:
+                    retry = result['code'] in RETRY_STATUSES
+            if not retry or attempt == retries:
+                break
+            await asyncio.sleep(delay)
+        result['checked'] = pd.Timestamp.now(tz='UTC').isoformat(timespec='seconds')
+        return result
+
+    return await asyncio.gather(*(check(t) for t in targets))
+
+
+def resolve(targets, cache=None, per_host=4, connections=32, retries=3, backoff=1.0, timeout=30,
+            oai_urls=None, host_urls=None):
+    """Check whether item URLs and OAI-PMH identifiers resolve.
+
+    Parameters
+    ----------
+
+    targets:
+        A list of item URLs and OAI-PMH identifiers. Duplicates are checked once.
+    cache:
+        An optional ResolveCache. Targets with a cached result aren't requested
+        again, and new results are added to it (it isn't saved).
+    per_host:
+        The largest number of requests to one host at a time.
+    connections:
+        The largest number of requests at a time over all hosts.
+    retries:
+        The number of times connection errors, timeouts and status 429 and 5xx
+        responses are retried, waiting backoff, 2 * backoff, 4 * backoff, ...
+        seconds in between.
+    timeout:
+        Seconds to wait for a server to respond.
+    oai_urls, host_urls:
+        Optional dictionaries of OAI-PMH endpoints and replacement hosts, see
+        check_request.
+
+    Returns
+    -------
+
+    results:
+        A pandas data frame with the columns listed in RESOLVE_COLS, one row per
+        unique target, in the order of the targets.
+
+    """
+
+    targets = pd.unique(pd.Series(targets, dtype=object).dropna())
+    new = [t for t in targets if cache is None or t not in cache]
+    checked = pd.DataFrame(columns=RESOLVE_COLS)
+    if new:
+        session = make_session(connections, retries=0)
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            records = asyncio.run(resolve_async(new, session, executor, per_host, retries, backoff, timeout,
+                                                oai_urls, host_urls))
+        session.close()
+        checked = pd.DataFrame.from_records(records, columns=RESOLVE_COLS)
+        checked['code'] = checked['code'].astype('Int64')
+    if cache is None:
+        return checked
+    cache.add(checked)
+    results = pd.concat([cache.results.reset_index(), checked[~checked['status'].isin(['ok', 'missing'])]])
+    return results.set_index('target').reindex(targets).rename_axis('target').reset_index()
+
+
+def item_targets(url_clicks, normalizers, url_cache=None):
+    """List the item URLs and OAI-PMH identifiers inferred from per-URL sums.
+
+    Parameters
+    ----------
+
+    url_clicks:
+        A pandas data frame of per-URL sums, as returned by merge_url_clicks.
+    normalizers:
+        A dictionary mapping RAMP page-click index names to normalizers, e.g.
+        from normalizers_for.
+    url_cache:
+        An optional NormalizationCache used to infer item URLs.
+
+    Returns
+    -------
+
+    targets:
+        A pandas data frame with the 'index' and 'html_url' of each unique item.
+
+    """
+
+    urls = url_clicks.reset_index()
+    urls = urls[urls['index'].isin(list(normalizers))]
+    encoded, dictionary = encode_urls(urls, normalizers, url_cache)
+    items = encoded[['index', 'html_code']].drop_duplicates()
+    items = items[items['html_code'] >= 0]
+    return pd.DataFrame({'index': items['index'].to_numpy(),
+                         'html_url': dictionary['html_url'][items['html_code'].to_numpy()]})
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Answers OAI-PMH GetRecord requests and item page requests for the
+       identifiers and paths known to its StandInServer."""
+
+    protocol_version = 'HTTP/1.1'
+    # The headers and body are written separately; send them without waiting for an ACK.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def answer(self, body):
+        parts = urlsplit(self.path)
+        self.server.requests += 1
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        if parts.path == OAI_PATH:
+            identifier = parse_qs(parts.query).get('identifier', [''])[0]
+            if identifier in self.server.known:
+                content = ('<record><header><identifier>' + identifier + '</identifier></header></record>')
+                content = '<GetRecord>' + content + '</GetRecord>'
+            else:
+                content = '<error code="idDoesNotExist">No matching identifier</error>'
+            content = ('<?xml version="1.0" encoding="UTF-8"?><OAI-PMH xmlns="http://www.openarchives.org/OAI/2.0/">' +
+                       content + '</OAI-PMH>').encode()
+            status = 200
+        else:
+            status = 200 if parts.path in self.server.known else 404
+            content = b'<html></html>'
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/xml' if parts.path == OAI_PATH else 'text/html')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        if body:
+            self.wfile.write(content)
+
+    def do_GET(self):
+        self.answer(True)
+
+    def do_HEAD(self):
+        self.answer(False)
+
+
+class StandInServer(ThreadingHTTPServer):
+    """A local stand-in for IR OAI-PMH endpoints and item pages, run in a
+       background thread while used as a context manager.
+
+    Parameters
+    ----------
+
+    known:
+        A collection of the OAI-PMH identifiers and item page paths (e.g.
+        '/handle/123/456') that exist. Other identifiers and paths are missing.
+    delay:
+        Seconds to wait before answering each request, to simulate network latency.
+
+    Attributes
+    ----------
+
+    url:
+        The scheme, host and port of the server, e.g. for host_urls in resolve.
+    requests:
+        The number of requests answered.
+
+    """
+
+    daemon_threads = True
+
+    def __init__(self, known, delay=0.0):
+        super().__init__(('127.0.0.1', 0), StandInHandler)
+        self.known = set(known)
+        self.delay = delay
+        self.requests = 0
+        self.url = 'http://127.0.0.1:' + str(self.server_address[1])
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check that item URLs and OAI-PMH identifiers resolve.')
+    parser.add_argument('targets', nargs='?', help='A text file with one item URL or OAI-PMH identifier per line.')
+    parser.add_argument('--out', help='CSV file to write the results to.')
+    parser.add_argument('--cache', help='Compressed CSV file of stored results, e.g. resolve_cache.csv.gz.')
+    parser.add_argument('--per-host', type=int, default=4, help='Requests to one host at a time.')
+    parser.add_argument('--connections', type=int, default=32, help='Requests at a time over all hosts.')
+    parser.add_argument('--retries', type=int, default=3)
+    parser.add_argument('--stand-in', type=int, default=0, metavar='N',
+                        help='Check N made-up items, 10 percent of them missing, against a local stand-in server.')
+    parser.add_argument('--delay', type=float, default=0.05, help='Latency of the stand-in server in seconds.')
+    args = parser.parse_args()
+
+    cache = ResolveCache(args.cache) if args.cache else None
+    start = time.perf_counter()
+    if args.stand_in:
+        hosts = ['ir' + str(h) + '.example.edu' for h in range(10)]
+        targets = [('oai:' + hosts[i % 10] + ':context-' + str(i)) if i % 2 else
+                   ('https://' + hosts[i % 10] + '/handle/1/' + str(i)) for i in range(args.stand_in)]
+        known = [t if t.startswith('oai:') else urlsplit(t).path for i, t in enumerate(targets) if i % 10]
+        with StandInServer(known, args.delay) as server:
+            results = resolve(targets, cache, args.per_host, args.connections, args.retries,
+                              host_urls={h: server.url for h in hosts})
+    else:
+        with open(args.targets) as f:
+            targets = [line.strip() for line in f if line.strip()]
+        results = resolve(targets, cache, args.per_host, args.connections, args.retries)
+    elapsed = time.perf_counter() - start
+
+    print('Checked ' + str(len(results)) + ' items in ' + str(round(elapsed, 1)) + ' seconds:')
+    print(results['status'].value_counts().to_string())
+    if args.out:
+        results.to_csv(args.out, index=False)
+    if cache is not None:
+        cache.save()
@@ -0,0 +1,131 @@
+"""Collect the per-IR rows of the summary statistics and write the output files
+
+GitHub repository URL: <https://github.com/imls-measuring-up/ramp-analyses-scripts>
+
+The main loop of "ramp_summary_stats_normalize_urls.py" produces one row of output per
+IR. Appending each row to a data frame copies the whole frame every time (and
+DataFrame.append was removed in pandas 2.0). A ResultBuilder instead collects the rows
+as plain records and makes the output data frame once, with the column types declared
+in SUMMARY_DTYPES, so the types of the output don't depend on the values of the first
+rows.
+
+The output can be written as CSV, as before, and also as Parquet or JSON files, which
+keep the column types for other tools, e.g. arrow::read_parquet or
+jsonlite::fromJSON in R.
+
+Dependencies:
+
+Python module pandas, available from <https://pandas.pydata.org/>. Writing Parquet
+files requires the Python module pyarrow, available from
+<https://arrow.apache.org/docs/python/>; without it, Parquet output is skipped.
+
+"""
+
+
+import os
+
+import pandas as pd
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+# The column types of "RAMP_summary_stats_YYYYMMDD.csv." The counts of the describe()
+# statistics are floats, as pandas reports them. 'ctEtd' and 'pctEtd' are text, since
+# they are '.' for IR without ETD.
+SUMMARY_DTYPES = {
+    'ir': 'string', 'pc_index': 'string', 'ai_index': 'string', 'inst': 'string',
+    'repoName': 'string', 'rURL': 'string', 'countItems': 'int64', 'countCcdUrls': 'int64',
+    'countItemUrls': 'int64', 'countItemUris': 'int64', 'useRatio': 'float64', 'sumCcd': 'int64',
+    'ccdAggSum': 'int64', 'ccdAggCount': 'float64', 'ccdAggMean': 'float64', 'ccdAggStd': 'float64',
+    'ccdAggMin': 'float64', 'ccdAgg25': 'float64', 'ccdAgg50': 'float64', 'ccdAgg75': 'float64',
+    'ccdAggMax': 'float64', 'itemAggSum': 'int64', 'itemAggCount': 'float64', 'itemAggMean': 'float64',
+    'itemAggStd': 'float64', 'itemAggMin': 'float64', 'itemAgg25': 'float64', 'itemAgg50': 'float64',
+    'itemAgg75': 'float64', 'itemAggMax': 'float64', 'itemTop1Share': 'float64',
+    'itemTop10Share': 'float64', 'itemGini': 'float64', 'serp1': 'int64', 'serp1CcdSum': 'int64',
+    'serp100': 'int64', 'serp100CcdSum': 'int64', 'irCountry': 'string', 'irType': 'string',
+    'irPlat': 'string', 'normIrPlat': 'string', 'ctMethod': 'string', 'ctEtd': 'string',
+    'pctEtd': 'string', 'gsSO': 'string',
+}
+
+# The output file formats write_results supports, with their file name extensions.
+OUTPUT_FORMATS = {'csv': '.csv', 'parquet': '.parquet', 'json': '.json'}
+
+
+class ResultBuilder:
+    """Collects output rows as records and makes a data frame of them once.
+
+    Parameters
+    ----------
+
+    columns:
+        The list of output columns, in order.
+    dtypes:
+        A dictionary of column types. Columns that aren't listed get the types
+        pandas infers.
+
+    """
+
+    def __init__(self, columns, dtypes=None):
+        self.columns = list(columns)
+        self.dtypes = {c: t for c, t in (dtypes or {}).items() if c in self.columns}
+        self.records = []
+
+    def __len__(self):
+        return len(self.records)
+
+    def add(self, row):
+        """Add a row, given as a list of values in the order of the columns or
+           as a dictionary mapping columns to values."""
+
+        if not isinstance(row, dict):
+            if len(row) != len(self.columns):
+                raise ValueError('Expected ' + str(len(self.columns)) + ' values, got ' + str(len(row)) + '.')
+            row = dict(zip(self.columns, row))
+        self.records.append(row)
+
+    def to_frame(self):
+        """Return the rows as a pandas data frame with the declared column types."""
+
+        frame = pd.DataFrame.from_records(self.records, columns=self.columns)
+        return frame.astype(self.dtypes)
+
+
+def write_results(frame, path_prefix, formats=('csv',)):
+    """Write an output data frame in one or more formats.
+
+    Parameters
+    ----------
+
+    frame:
+        A pandas data frame, e.g. returned by ResultBuilder.to_frame.
+    path_prefix:
+        The path of the output files without the extension, e.g.
+        '../results/RAMP_summary_stats_20190601'.
+    formats:
+        A list of formats listed in OUTPUT_FORMATS.
+
+    Returns
+    -------
+
+    paths:
+        A list of the paths of the files written.
+
+    """
+
+    paths = []
+    for f in formats:
+        path = path_prefix + OUTPUT_FORMATS[f]
+        if f == 'csv':
+            frame.to_csv(path, index=False)
+        elif f == 'parquet':
+            if pyarrow is None:
+                print('pyarrow is not installed; not writing ' + os.path.basename(path) + '.')
+                continue
+            frame.to_parquet(path, index=False)
+        elif f == 'json':
+            frame.to_json(path, orient='records', indent=1)
+        paths.append(path)
+    return paths
@@ -0,0 +1,355 @@
+"""Serve the RAMP summary statistics and their rollups as JSON over local HTTP
+
+GitHub repository URL: <https://github.com/imls-measuring-up/ramp-analyses-scripts>
+
+"ramp_summary_stats_normalize_urls.py" writes its statistics to CSV files, which the R
+notebook and dashboards read and group again for every view. This module loads one run's
+output files into memory once, as "cubes":
+
+* the per-IR statistics in "RAMP_summary_stats_YYYYMMDD.csv,"
+* the same statistics per date window, e.g. per month, from the window files
+  "RAMP_summary_stats_<window>_YYYYMMDD.csv" of the same run, if there are any, and
+* rollups of the per-IR statistics by platform, country and type of IR, as in the
+  group_by(normIrPlat), group_by(irCountry) and group_by(irType) blocks of
+  "RAMP_use_ratio_and_country_device_analyses.Rmd," for all data and each window.
+
+The rows of each cube are indexed by IR, platform, country and type, so filtered queries
+only look up the matching rows. Responses are kept in an LRU cache, so repeated queries
+are answered without encoding them again.
+
+The service is read-only: it answers GET requests only, and by default only from the
+local machine. To run it on the latest output in the 'results' directory:
+
+    python ramp_service.py --results-dir ../results --port 8050
+
+and, for example, request <http://127.0.0.1:8050/stats?platform=DSpace&columns=ir,useRatio>.
+The endpoints are:
+
+* /stats: per-IR statistics. Filters: ir, platform, country, type (each can be
+  repeated or comma separated) and window; columns selects the columns returned.
+  Without window, the statistics of all of the data are returned. If the run only
+  wrote window files, the last window (the latest, for calendar windows) is used
+  instead; the index page reports this default window.
+* /rollup/<platform|country|type>: rollups, with the same filters.
+* /breakdown: the statistics of each window, with the same filters except window.
+* /windows: the date windows of the run.
+* /: the run, the endpoints and the response cache statistics.
+
+"ramp_load_test.py" measures the throughput and latency of the service.
+
+Dependencies:
+
+Python module pandas, available from <https://pandas.pydata.org/>, and the "ramp_results"
+module included in the same directory.
+
+"""
+
+
+import os
+
+import re
+
+import json
+
+import argparse
+
+import pandas as pd
+
+from functools import lru_cache
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from urllib.parse import parse_qs, urlsplit
+
+from ramp_results import SUMMARY_DTYPES
+
+
+# The query parameters that filter IR, with the columns they filter.
+FILTER_COLS = {'ir': 'ir', 'platform': 'normIrPlat', 'country': 'irCountry', 'type': 'irType'}
+
+# The rollups, with the column each groups the IR by.
+ROLLUP_COLS = {'platform': 'normIrPlat', 'country': 'irCountry', 'type': 'irType'}
+
+# The statistics summed in the rollups.
+ROLLUP_SUM_COLS = ['countItems', 'countCcdUrls', 'countItemUrls', 'countItemUris', 'sumCcd',
+                   'serp1', 'serp1CcdSum', 'serp100', 'serp100CcdSum']
+
+# The output files of one run of the summary statistics script, with an optional window.
+SUMMARY_FILE = re.compile(r'^RAMP_summary_stats_(?:(.+)_)?([0-9]{8})\.csv$')
+
+
+def find_summary_files(results_dir, fname_date=None):
+    """Find the summary statistics files of one run.
+
+    Parameters
+    ----------
+
+    results_dir:
+        The directory the summary statistics script wrote its output to.
+    fname_date:
+        The date of the run, 'YYYYMMDD'. Defaults to the latest run.
+
+    Returns
+    -------
+
+    fname_date:
+        The date of the run.
+    files:
+        A dictionary mapping window names to file paths, with None for the file
+        covering all of the data.
+
+    """
+
+    runs = {}
+    for name in sorted(os.listdir(results_dir)):
+        match = SUMMARY_FILE.match(name)
+        if match:
+            runs.setdefault(match.group(2), {})[match.group(1)] = os.path.join(results_dir, name)
+    if not runs or (fname_date is not None and fname_date not in runs):
+        raise FileNotFoundError('No RAMP_summary_stats_' + (fname_date or 'YYYYMMDD') + '.csv files in ' +
+                                results_dir + '.')
+    fname_date = fname_date or max(runs)
+    return fname_date, runs[fname_date]
+
+
+def read_summary(path):
+    """Read a summary statistics file with the column types in SUMMARY_DTYPES."""
+
+    columns = pd.read_csv(path, nrows=0).columns
+    return pd.read_csv(path, dtype={c: t for c, t in SUMMARY_DTYPES.items() if c in columns})
+
+
+def rollup(stats, column):
+    """Roll up per-IR statistics by a column, e.g. 'normIrPlat'.
+
+    Returns
+    -------
+
+    rollup:
+        A data frame with one row per value of the column: the number of IR
+        ('irs'), the sums of the statistics in ROLLUP_SUM_COLS, the use ratio of
+        the group ('useRatio', unique item URIs over items), and the mean and
+        median use ratio of its IR, sorted by the number of items in descending
+        order, as in the R notebook.
+
+    """
+
+    sums = [c for c in ROLLUP_SUM_COLS if c in stats.columns]
+    groups = stats.groupby(column, sort=False, observed=True)
+    table = groups[sums].sum()
+    table.insert(0, 'irs', groups.size())
+    if 'countItemUris' in table.columns:
+        table['useRatio'] = (table['countItemUris'] / table['countItems']).round(2)
+    table['meanUseRatio'] = groups['useRatio'].mean().round(2)
+    table['medianUseRatio'] = groups['useRatio'].median().round(2)
+    return table.sort_values('countItems', ascending=False, kind='stable').reset_index()
+
+
+class SummaryCube:
+    """The per-IR statistics of one file, with an index of the rows of each IR,
+       platform, country and type.
+
+    Parameters
+    ----------
+
+    stats:
+        A data frame read by read_summary.
+
+    """
+
+    def __init__(self, stats):
+        self.stats = stats.reset_index(drop=True)
+        self.index = {param: {value: pd.Index(rows) for value, rows in
+                              self.stats.groupby(col, sort=False, observed=True).indices.items()}
+                      for param, col in FILTER_COLS.items() if col in self.stats.columns}
+        self.rollups = {name: rollup(self.stats, col) for name, col in ROLLUP_COLS.items()}
+
+    def select(self, filters):
+        """Return the rows matching all filters, a dictionary mapping the
+           parameters in FILTER_COLS to lists of values."""
+
+        rows = None
+        for param, values in filters.items():
+            matched = pd.Index([], dtype='int64')
+            for value in values:
+                matched = matched.union(self.index.get(param, {}).get(value, pd.Index([], dtype='int64')))
+            rows = matched if rows is None else rows.intersection(matched)
+        if rows is None:
+            return self.stats
+        return self.stats.take(rows.sort_values())
+
+
+class SummaryService:
+    """Answers queries on the summary statistics of one run, caching the
+       encoded responses.
+
+    Parameters
+    ----------
+
+    results_dir:
+        The directory the summary statistics script wrote its output to.
+    fname_date:
+        The date of the run, 'YYYYMMDD'. Defaults to the latest run.
+    cache_size:
+        The number of responses kept in the LRU cache.
+
+    """
+
+    def __init__(self, results_dir, fname_date=None, cache_size=1024):
+        self.fname_date, files = find_summary_files(results_dir, fname_date)
+        self.cubes = {window: SummaryCube(read_summary(path)) for window, path in files.items()}
+        self.windows = sorted(w for w in self.cubes if w is not None)
+        # Runs with date windows only write window files.
+        self.default_window = None if None in self.cubes else self.windows[-1]
+        self.cached = lru_cache(maxsize=cache_size)(self.answer)
+
+    def respond(self, path, query):
+        """Answer a request from the LRU cache if possible. See answer."""
+
+        # The index page reports the cache statistics, so it isn't cached.
+        if path == '/':
+            return self.answer(path, query)
+        return self.cached(path, query)
+
+    def cube(self, window):
+        """Return the cube of a window, or of all of the data (default_window if
+           there is no file for all of the data) if window is None."""
+
+        if window is None:
+            window = self.default_window
+        if window not in self.cubes:
+            raise KeyError('Unknown window: ' + str(window))
+        return self.cubes[window]
+
+    def answer(self, path, query):
+        """Answer a request.
+
+        Parameters
+        ----------
+
+        path:
+            The path of the request, e.g. '/stats'.
+        query:
+            A sorted tuple of (parameter, value) pairs.
+
+        Returns
+        -------
+
+        status:
+            The HTTP status code.
+        body:
+            The JSON response, encoded.
+
+        """
+
+        params = {}
+        for name, value in query:
+            params.setdefault(name, []).extend(v for v in value.split(',') if v)
+        filters = {p: v for p, v in params.items() if p in FILTER_COLS}
+        window = params.get('window', [None])[0]
+        columns = params.get('columns')
+        unknown = set(params) - set(FILTER_COLS) - {'window', 'columns'}
+        try:
+            if unknown:
+                raise KeyError('Unknown parameters: ' + ', '.join(sorted(unknown)))
+            if path == '/':
+                result = {'run': self.fname_date, 'windows': self.windows, 'defaultWindow': self.default_window,
+                          'endpoints': ['/stats', '/rollup/' + '|'.join(ROLLUP_COLS), '/breakdown', '/windows'],
+                          'cache': self.cached.cache_info()._asdict()}
+            elif path == '/windows':
+                result = self.windows
+            elif path == '/stats':
+                result = self.records(self.cube(window).select(filters), columns)
+            elif path.startswith('/rollup/') and path[len('/rollup/'):] in ROLLUP_COLS:
+                cube = self.cube(window)
+                stats = cube.select(filters) if filters else None
+                name = path[len('/rollup/'):]
+                table = cube.rollups[name] if stats is None else rollup(stats, ROLLUP_COLS[name])
+                result = self.records(table, columns)
+            elif path == '/breakdown':
+                frames = [self.cube(w).select(filters).assign(window=w) for w in self.windows]
+                stats = pd.concat(frames) if frames else self.cube(None).select(filters).iloc[:0].assign(window=None)
+                result = self.records(stats, ['window', 'ir'] + columns if columns else None)
+            else:
+                return 404, json.dumps({'error': 'Unknown path: ' + path}).encode()
+        except KeyError as e:
+            return 400, json.dumps({'error': e.args[0]}).encode()
+        return 200, json.dumps(result).encode()
+
+    @staticmethod
+    def records(frame, columns=None):
+        """Return the rows of a data frame as a list of dictionaries."""
+
+        if columns:
+            missing = [c for c in columns if c not in frame.columns]
+            if missing:
+                raise KeyError('Unknown columns: ' + ', '.join(missing))
+            frame = frame[list(dict.fromkeys(columns))]
+        return json.loads(frame.to_json(orient='records'))
+
+
+class SummaryHandler(BaseHTTPRequestHandler):
+    """Answers GET requests with the server's SummaryService."""
+
+    protocol_version = 'HTTP/1.1'
+    # The headers and body are written separately; send them without waiting for an ACK.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        query = tuple(sorted((name, value) for name, values in parse_qs(parts.query).items() for value in values))
+        status, body = self.server.service.respond(parts.path.rstrip('/') or '/', query)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class SummaryServer(ThreadingHTTPServer):
+    """An HTTP server for a SummaryService.
+
+    Parameters
+    ----------
+
+    service:
+        A SummaryService.
+    host, port:
+        The address to listen on. Port 0 picks a free port.
+    verbose:
+        Whether to log each request.
+
+    """
+
+    daemon_threads = True
+
+    def __init__(self, service, host='127.0.0.1', port=8050, verbose=False):
+        super().__init__((host, port), SummaryHandler)
+        self.service = service
+        self.verbose = verbose
+        self.url = 'http://' + host + ':' + str(self.server_address[1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve the RAMP summary statistics as JSON.')
+    parser.add_argument('--results-dir', default='../results/')
+    parser.add_argument('--date', help='The date of the run to serve, YYYYMMDD. Defaults to the latest.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8050)
+    parser.add_argument('--cache-size', type=int, default=1024, help='Responses kept in the LRU cache.')
+    parser.add_argument('--verbose', action='store_true', help='Log each request.')
+    args = parser.parse_args()
+
+    service = SummaryService(args.results_dir, args.date, args.cache_size)
+    server = SummaryServer(service, args.host, args.port, args.verbose)
+    print('Serving the RAMP summary statistics of ' + service.fname_date + ' (' + str(len(service.windows)) +
+          ' windows) at ' + server.url + '.')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
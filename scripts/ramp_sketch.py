@@ -0,0 +1,425 @@
+"""Estimate unique URL and item counts for any date window from HyperLogLog sketches
+
+GitHub repository URL: <https://github.com/imls-measuring-up/ramp-analyses-scripts>
+
+The countCcdUrls, countItemUrls and countItemUris statistics, and the use ratio, are
+counts of unique URLs and items, which have to be computed exactly from every per-URL
+sum of the window and IR they are wanted for. When exploring many date windows or
+subsets of IR, the functions in this module give approximate counts instead, which
+are quick to compute for any window once the page-click files have been sketched.
+
+A HyperLogLog sketch summarizes a set of values in 2 ** precision small registers:
+each value is hashed, the first precision bits of the hash pick a register, and the
+register keeps the largest number of leading zeros (plus one) seen in the rest of the
+hash. The number of unique values can be estimated from the registers, with a relative
+standard error of about 1.04 / sqrt(2 ** precision), 1.6% for the default precision of
+12. The sketch of the union of two sets is the element-wise maximum of their registers,
+so sketches can be merged exactly.
+
+DaySketches keeps one sketch of the URLs, one of the item URLs and one of the item URIs
+with citable clicks per IR and day. The sketches of the days in a window are merged to
+estimate the counts of each IR for the window. As for the exact counts, the item URLs
+and URIs are inferred by each IR's normalizer (see "ramp_normalize"), and a missing item
+URL or URI is counted as one value.
+
+The sketches of each page-click file are stored in a sketch directory, like partials
+(see "ramp_partials"), so only new or changed files are read on later runs.
+
+Dependencies:
+
+Python modules pandas and numpy, available from <https://pandas.pydata.org/> and
+<https://numpy.org/>, and the "ramp_aggregate" and "ramp_load_data" modules included in
+the same directory.
+
+"""
+
+
+import os
+
+import json
+
+import numpy as np
+
+import pandas as pd
+
+from itertools import compress, count, repeat
+
+from ramp_aggregate import citable_clicks, normalizer_groups
+
+from ramp_load_data import PAGE_CLICK_COLS, iter_ramp_file
+
+
+# The statistics estimated from the sketches, with the values each is counted from.
+SKETCH_COLS = {'countCcdUrls': 'url', 'countItemUrls': 'html_url', 'countItemUris': 'unique_item_uri'}
+
+# The default number of bits of each hash that pick a register.
+PRECISION = 12
+
+# Name of the file in the sketch directory describing the stored sketches.
+INDEX_NAME = 'sketches.json'
+
+
+def relative_error(precision=PRECISION):
+    """Return the relative standard error of HyperLogLog estimates made with
+       2 ** precision registers."""
+
+    return 1.04 / np.sqrt(2 ** precision)
+
+
+def hash_values(values):
+    """Hash an array-like of strings to 64-bit unsigned integers. Missing
+       values all get the same hash."""
+
+    return pd.util.hash_array(np.asarray(values, dtype=object))
+
+
+def register_ranks(hashes, precision=PRECISION):
+    """Split 64-bit hashes into a register number and a rank.
+
+    Returns
+    -------
+
+    registers:
+        A numpy array of the register number of each hash, its first precision bits.
+    ranks:
+        A numpy uint8 array of the number of leading zeros in the rest of each
+        hash, plus one.
+
+    """
+
+    registers = (hashes >> np.uint64(64 - precision)).astype(np.int64)
+    rest = hashes << np.uint64(precision)
+    # Find the highest set bit of the rest of the hash by halving.
+    highest = np.zeros(len(rest), dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        above = rest >= np.uint64(1 << shift)
+        highest[above] += shift
+        rest = np.where(above, rest >> np.uint64(shift), rest)
+    ranks = np.where(hashes << np.uint64(precision) == 0, 64 - precision + 1, 64 - highest)
+    return registers, ranks.astype(np.uint8)
+
+
+def estimate_counts(registers):
+    """Estimate the number of unique values from HyperLogLog registers.
+
+    Parameters
+    ----------
+
+    registers:
+        A numpy array of registers, with the registers of each sketch along the
+        last axis.
+
+    Returns
+    -------
+
+    counts:
+        A numpy array of float estimates, one per sketch. Small counts are
+        estimated from the number of empty registers ("linear counting").
+
+    """
+
+    m = registers.shape[-1]
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw = alpha * m * m / np.ldexp(1.0, -registers.astype(np.int64)).sum(axis=-1)
+    empty = (registers == 0).sum(axis=-1)
+    linear = m * np.log(m / np.maximum(empty, 1))
+    return np.where((raw <= 2.5 * m) & (empty > 0), linear, raw)
+
+
+class DaySketches:
+    """HyperLogLog sketches of the URLs, item URLs and item URIs with citable
+       clicks, per IR and day.
+
+    The registers are kept in a numpy array with one row per IR and day, which
+    grows as new days are seen, with one sketch per statistic in SKETCH_COLS in
+    each row. A dictionary maps each (IR, day) pair to its row.
+
+    Parameters
+    ----------
+
+    precision:
+        The number of bits of each hash that pick a register.
+    capacity:
+        The initial number of rows.
+
+    """
+
+    def __init__(self, precision=PRECISION, capacity=64):
+        self.precision = precision
+        self.slots = {}
+        self.registers = np.zeros((capacity, len(SKETCH_COLS), 2 ** precision), dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.slots)
+
+    def rows(self, pairs):
+        """Return the rows of a list of (IR, day) pairs, adding rows for new pairs."""
+
+        rows = np.fromiter(map(self.slots.get, pairs, repeat(-1)), dtype=np.int64, count=len(pairs))
+        new = rows < 0
+        start = len(self.slots)
+        self.slots.update(zip(compress(pairs, new), count(start)))
+        rows[new] = np.arange(start, len(self.slots))
+        if len(self.slots) > len(self.registers):
+            grown = np.zeros((max(len(self.slots), 2 * len(self.registers)),) + self.registers.shape[1:],
+                             dtype=np.uint8)
+            grown[:len(self.registers)] = self.registers
+            self.registers = grown
+        return rows
+
+    def add(self, indexes, days, hashes):
+        """Add hashed values.
+
+        Parameters
+        ----------
+
+        indexes, days:
+            Array-likes of the RAMP page-click index and day ('YYYY-MM-DD') of
+            each value.
+        hashes:
+            A dictionary mapping the statistics in SKETCH_COLS to numpy arrays of
+            64-bit hashes, see hash_values.
+
+        """
+
+        pair_codes, pairs = pd.factorize(pd.MultiIndex.from_arrays([np.asarray(indexes, dtype=object),
+                                                                    np.asarray(days, dtype=object)]))
+        rows = self.rows(list(pairs))[pair_codes]
+        for i, col in enumerate(SKETCH_COLS):
+            registers, ranks = register_ranks(hashes[col], self.precision)
+            np.maximum.at(self.registers, (rows, i, registers), ranks)
+
+    def update(self, other):
+        """Merge the sketches of another DaySketches with the same precision."""
+
+        if other.precision != self.precision:
+            raise ValueError('Sketches with precision ' + str(other.precision) + ' and ' +
+                             str(self.precision) + " can't be merged.")
+        if len(other) == 0:
+            return
+        # Rows are unique within other, so they can be merged with fancy indexing.
+        rows = self.rows(list(other.slots))
+        self.registers[rows] = np.maximum(self.registers[rows], other.registers[:len(other)])
+
+    def keys(self):
+        """Return a pandas data frame of the 'index' and 'date' of each row."""
+
+        return pd.DataFrame(list(self.slots), columns=['index', 'date'])
+
+    def counts(self, start=None, end=None, indexes=None):
+        """Estimate the counts of unique URLs, item URLs and item URIs of each IR
+           in a date window.
+
+        Parameters
+        ----------
+
+        start, end:
+            Optional first and last days of the window.
+        indexes:
+            An optional list of RAMP page-click index names to estimate the counts
+            of. All IR are included by default.
+
+        Returns
+        -------
+
+        counts:
+            A data frame indexed by RAMP page-click index with the float estimates
+            in the columns listed in SKETCH_COLS, for the IR with citable clicks in
+            the window.
+
+        """
+
+        keys = self.keys()
+        selected = np.ones(len(keys), dtype=bool)
+        if indexes is not None:
+            selected &= keys['index'].isin(indexes).to_numpy()
+        if start is not None:
+            selected &= (keys['date'] >= pd.Timestamp(start).strftime('%Y-%m-%d')).to_numpy()
+        if end is not None:
+            selected &= (keys['date'] <= pd.Timestamp(end).strftime('%Y-%m-%d')).to_numpy()
+        rows = np.flatnonzero(selected)
+        ir_codes, irs = pd.factorize(keys['index'].to_numpy(dtype=object)[rows])
+        # Merge the sketches of each IR's days: the maximum of each register.
+        merged = np.zeros((len(irs),) + self.registers.shape[1:], dtype=np.uint8)
+        for code, ir_rows in pd.Series(rows).groupby(ir_codes, sort=False):
+            merged[code] = self.registers[ir_rows.to_numpy()].max(axis=0)
+        return pd.DataFrame(estimate_counts(merged), index=pd.Index(irs, name='index'), columns=list(SKETCH_COLS))
+
+    def save(self, path):
+        """Save the sketches to a compressed numpy file."""
+
+        keys = self.keys()
+        tmp_path = path + '.tmp.npz'
+        np.savez_compressed(tmp_path, registers=self.registers[:len(self)], precision=self.precision,
+                            index=keys['index'].to_numpy(dtype=str), date=keys['date'].to_numpy(dtype=str))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Load sketches saved by save()."""
+
+        with np.load(path) as saved:
+            sketches = cls(int(saved['precision']), max(len(saved['index']), 1))
+            sketches.slots = dict(zip(zip(saved['index'].tolist(), saved['date'].tolist()), count()))
+            sketches.registers[:len(sketches.slots)] = saved['registers']
+        return sketches
+
+
+def sketch_clicks(sketches, clicks, normalizers, url_cache=None):
+    """Add the URLs and item URLs and URIs of citable clicks to the sketches.
+
+    Parameters
+    ----------
+
+    sketches:
+        A DaySketches.
+    clicks:
+        A pandas data frame of citable clicks with a 'date' column, as returned
+        by citable_clicks.
+    normalizers:
+        A dictionary mapping RAMP page-click index names to normalizers, e.g.
+        from normalizers_for. Rows of IR without a normalizer are left out.
+    url_cache:
+        An optional NormalizationCache used to infer item URLs.
+
+    """
+
+    date_codes, days = pd.factorize(clicks['date'])
+    days = np.asarray(pd.to_datetime(pd.Series(days)).dt.strftime('%Y-%m-%d'), dtype=object)
+    for normalizer, indexes in normalizer_groups(normalizers).values():
+        selected = clicks['index'].isin(indexes).to_numpy()
+        if not selected.any():
+            continue
+        # Each unique URL is normalized and hashed once.
+        url_codes, urls = pd.factorize(clicks['url'][selected])
+        urls = pd.Series(np.asarray(urls, dtype=object))
+        items = url_cache.normalize(urls, normalizer) if url_cache is not None else normalizer.normalize(urls)
+        entries = {'url': urls, 'html_url': items['html_url'], 'unique_item_uri': items['unique_item_uri']}
+        hashes = {col: hash_values(entries[value])[url_codes] for col, value in SKETCH_COLS.items()}
+        sketches.add(clicks['index'][selected], days[date_codes[selected]], hashes)
+
+
+def sketch_file(path, normalizers, url_cache=None, chunk_size=1000000, cache_dir=None, precision=PRECISION):
+    """Sketch the citable clicks of a page-click file, reading it in chunks.
+       See sketch_clicks for the parameters.
+
+    Returns
+    -------
+
+    sketches:
+        A DaySketches of the file.
+
+    """
+
+    sketches = DaySketches(precision)
+    for chunk in iter_ramp_file(path, chunk_size, cache_dir, PAGE_CLICK_COLS + ['date']):
+        sketch_clicks(sketches, citable_clicks(chunk), normalizers, url_cache)
+    return sketches
+
+
+def sketch_path(sketch_dir, path):
+    """Return the path the sketches of a page-click file are stored under."""
+
+    return os.path.join(sketch_dir, os.path.splitext(os.path.basename(path))[0] + '.npz')
+
+
+def update_sketches(files, sketch_dir, normalizers, url_cache=None, chunk_size=1000000, cache_dir=None,
+                    precision=PRECISION):
+    """Store sketches for page-click files that don't have current ones, and
+       return the merged sketches of all of the files.
+
+    Parameters
+    ----------
+
+    files:
+        A list of paths of RAMP page-click files.
+    sketch_dir:
+        The directory the sketches are stored in. It is created if it doesn't exist.
+    normalizers, url_cache:
+        The normalizers used to infer item URLs, see sketch_clicks. Sketches made
+        with other normalizers, or another precision, are made again.
+    chunk_size:
+        The number of rows to read at a time.
+    cache_dir:
+        The Parquet cache directory, or None to read the CSV files directly.
+    precision:
+        The number of bits of each hash that pick a register.
+
+    Returns
+    -------
+
+    sketches:
+        A DaySketches of all of the files.
+
+    """
+
+    os.makedirs(sketch_dir, exist_ok=True)
+    index_path = os.path.join(sketch_dir, INDEX_NAME)
+    index = {}
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            index = json.load(f)
+    used = {pc_index: normalizer.key for pc_index, normalizer in sorted(normalizers.items())}
+    merged = DaySketches(precision)
+    read = 0
+    for path in files:
+        name = os.path.basename(path)
+        st = os.stat(path)
+        entry = {'size': st.st_size, 'mtime': st.st_mtime, 'precision': precision, 'normalizers': used}
+        stored = sketch_path(sketch_dir, path)
+        if index.get(name) == entry and os.path.exists(stored):
+            sketches = DaySketches.load(stored)
+        else:
+            sketches = sketch_file(path, normalizers, url_cache, chunk_size, cache_dir, precision)
+            sketches.save(stored)
+            index[name] = entry
+            read += 1
+        merged.update(sketches)
+    with open(index_path, 'w') as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+
+    print('Using stored sketches for ' + str(len(files) - read) + ' of ' + str(len(files)) + ' page-click files.')
+    return merged
+
+
+def preview_stats(sketches, ir_info, start=None, end=None):
+    """Estimate the unique URL and item counts and the use ratio of each IR in a
+       date window.
+
+    Parameters
+    ----------
+
+    sketches:
+        A DaySketches, e.g. returned by update_sketches.
+    ir_info:
+        The data frame read from "RAMP_IR_base_info.csv."
+    start, end:
+        Optional first and last days of the window.
+
+    Returns
+    -------
+
+    preview:
+        A data frame with the 'ir', 'pc_index' and 'countItems' of each IR, the
+        estimated counts, rounded, in the columns listed in SKETCH_COLS, the
+        estimated 'useRatio', the relative standard error of the estimates
+        'relStdError', and the range of use ratios within two standard errors,
+        'useRatioLow' and 'useRatioHigh'. IR without citable clicks in the window
+        get zero counts.
+
+    """
+
+    counts = sketches.counts(start, end, list(ir_info['ir_page_click_index']))
+    counts = counts.reindex(ir_info['ir_page_click_index']).fillna(0).round().astype('int64')
+    error = relative_error(sketches.precision)
+    preview = pd.DataFrame({'ir': ir_info['ir_index_root'].to_numpy(),
+                            'pc_index': ir_info['ir_page_click_index'].to_numpy(),
+                            'countItems': ir_info['Items in repository on 2019-05-27'].astype('int64').to_numpy()})
+    for col in SKETCH_COLS:
+        preview[col] = counts[col].to_numpy()
+    use_ratio = preview['countItemUris'] / preview['countItems']
+    preview['useRatio'] = use_ratio.round(2)
+    preview['relStdError'] = round(error, 4)
+    preview['useRatioLow'] = (use_ratio * (1 - 2 * error)).round(2)
+    preview['useRatioHigh'] = (use_ratio * (1 + 2 * error)).round(2)
+    return preview
@@ -0,0 +1,279 @@
+"""Load RAMP data into a local SQLite database for ad-hoc queries
+
+GitHub repository URL: <https://github.com/imls-measuring-up/ramp-analyses-scripts>
+
+The summary statistics and access tables are computed from the monthly RAMP CSV files,
+which are read again by every script that asks a new question of the data. The functions
+in this module load the page-click and country-device files once into a SQLite database
+file, with indexes on the 'index', 'date' and 'url' columns, so that further analyses,
+e.g. clicks per URL per month for one IR, are single queries:
+
+    store = open_store('../ramp_data/ramp_data.sqlite')
+    query(store, 'SELECT substr(date, 1, 7) AS month, url, SUM(clicks) AS clicks '
+                 'FROM page_clicks WHERE "index" = ? GROUP BY month, url',
+          ['montana_page_clicks'])
+
+Each file is loaded into the 'page_clicks' or 'country_device' table once. The 'files'
+table records the size and modification time of every file loaded, and a file's rows are
+replaced if the file changes. 'citableContent' is stored as 1 for 'Yes' and 0 otherwise.
+
+"ramp_summary_stats_normalize_urls.py" can compute its statistics from the database:
+query_url_clicks and query_access_counts express the per-URL and per-country-device sums
+(see "ramp_aggregate" and "ramp_country_device") as SQL queries. Item URLs are still
+inferred in Python, since the normalizers don't translate to SQL. Rows are returned in
+order of first appearance in the database, which is the order pandas groups them in if
+the files were loaded in order, so the statistics are identical to those computed from
+the CSV files. (If a changed file is loaded again, its rows move to the end, which can
+change the last digits of the means and standard deviations.)
+
+SQLite is used because it is included in the default Python installation. Its queries
+scan rows rather than columns, so a columnar database such as DuckDB would be faster for
+queries over all rows, but would add a dependency.
+
+Dependencies:
+
+Python module pandas, available from <https://pandas.pydata.org/>, and the
+"ramp_aggregate" and "ramp_load_data" modules included in the same directory.
+
+"""
+
+
+import os
+
+import sqlite3
+
+import fnmatch
+
+import pandas as pd
+
+from ramp_aggregate import SERP_POSITIONS, URL_CLICK_COLS
+
+from ramp_load_data import iter_ramp_file
+
+
+# The database tables the RAMP data files are loaded into, by file name pattern, with
+# their SQL column types. Every table also has a 'file' column, the rowid of the row's
+# file in the 'files' table.
+STORE_TABLES = {
+    '*page-clicks*': ('page_clicks', {'url': 'TEXT', 'index': 'TEXT', 'clicks': 'INTEGER',
+                                      'impressions': 'INTEGER', 'ctr': 'REAL', 'date': 'TEXT',
+                                      'position': 'REAL', 'citableContent': 'INTEGER'}),
+    '*country-device*': ('country_device', {'country': 'TEXT', 'device': 'TEXT', 'index': 'TEXT',
+                                            'clicks': 'INTEGER', 'impressions': 'INTEGER', 'ctr': 'REAL',
+                                            'date': 'TEXT', 'position': 'REAL'}),
+}
+
+# The indexed columns of each table.
+STORE_INDEXES = ['index', 'date', 'url']
+
+
+def table_for(path):
+    """Return the table name and column types for a RAMP data file, based on its
+       name, or None if the file isn't a page-click or country-device file."""
+
+    for pattern, table in STORE_TABLES.items():
+        if fnmatch.fnmatch(os.path.basename(path), pattern):
+            return table
+
+
+def open_store(path):
+    """Open a RAMP database file, creating it and its tables if needed.
+
+    Parameters
+    ----------
+
+    path:
+        The path of the SQLite database file.
+
+    Returns
+    -------
+
+    store:
+        A sqlite3 connection.
+
+    """
+
+    store = sqlite3.connect(path)
+    store.execute('CREATE TABLE IF NOT EXISTS files (name TEXT UNIQUE, size INTEGER, mtime REAL, rows INTEGER)')
+    for name, columns in STORE_TABLES.values():
+        definitions = ', '.join('"' + c + '" ' + t for c, t in columns.items())
+        store.execute('CREATE TABLE IF NOT EXISTS ' + name + ' (' + definitions + ', file INTEGER)')
+        for c in STORE_INDEXES:
+            if c in columns:
+                store.execute('CREATE INDEX IF NOT EXISTS ' + name + '_' + c + ' ON ' + name + ' ("' + c + '")')
+        store.execute('CREATE INDEX IF NOT EXISTS ' + name + '_file ON ' + name + ' (file)')
+    store.commit()
+    return store
+
+
+def is_loaded(store, path):
+    """Check whether the current version of a file is loaded in the database."""
+
+    st = os.stat(path)
+    row = store.execute('SELECT size, mtime FROM files WHERE name = ?', [os.path.basename(path)]).fetchone()
+    return row is not None and row[0] == st.st_size and row[1] == st.st_mtime
+
+
+def load_file(store, path, chunk_size=1000000, cache_dir=None):
+    """Load a RAMP data file into its table, replacing rows loaded from an
+       earlier version of the file.
+
+    Parameters
+    ----------
+
+    store:
+        A connection returned by open_store.
+    path:
+        The path of a RAMP page-click or country-device CSV file.
+    chunk_size:
+        The number of rows to read and insert at a time.
+    cache_dir:
+        The Parquet cache directory, or None to read the CSV file directly.
+
+    Returns
+    -------
+
+    rows:
+        The number of rows loaded.
+
+    """
+
+    table, columns = table_for(path)
+    name = os.path.basename(path)
+    st = os.stat(path)
+    rows = 0
+    with store:
+        old = store.execute('SELECT rowid FROM files WHERE name = ?', [name]).fetchone()
+        if old is not None:
+            for t, c in STORE_TABLES.values():
+                store.execute('DELETE FROM ' + t + ' WHERE file = ?', old)
+            store.execute('DELETE FROM files WHERE rowid = ?', old)
+        file_id = store.execute('INSERT INTO files (name, size, mtime, rows) VALUES (?, ?, ?, 0)',
+                                [name, st.st_size, st.st_mtime]).lastrowid
+        for chunk in iter_ramp_file(path, chunk_size, cache_dir, list(columns)):
+            chunk = chunk[list(columns)].astype({c: object for c, t in columns.items() if t == 'TEXT'})
+            if 'citableContent' in columns:
+                chunk['citableContent'] = chunk['citableContent'].astype(int)
+            chunk['file'] = file_id
+            chunk.to_sql(table, store, if_exists='append', index=False)
+            rows += len(chunk)
+        store.execute('UPDATE files SET rows = ? WHERE rowid = ?', [rows, file_id])
+    return rows
+
+
+def load_files(store, files, chunk_size=1000000, cache_dir=None):
+    """Load RAMP data files that aren't loaded yet, or have changed, into the
+       database. The number of rows loaded from each file is printed.
+
+    Parameters
+    ----------
+
+    store:
+        A connection returned by open_store.
+    files:
+        A list of paths of RAMP page-click and country-device files.
+    chunk_size:
+        The number of rows to read and insert at a time.
+    cache_dir:
+        The Parquet cache directory, or None to read the CSV files directly.
+
+    Returns
+    -------
+
+    loaded:
+        A dictionary mapping the names of the files that were loaded to the
+        number of rows loaded.
+
+    """
+
+    loaded = {}
+    for path in files:
+        if table_for(path) is None or is_loaded(store, path):
+            continue
+        loaded[os.path.basename(path)] = load_file(store, path, chunk_size, cache_dir)
+        print('Loaded ' + str(loaded[os.path.basename(path)]) + ' rows of ' +
+              os.path.basename(path) + ' into the database.')
+    return loaded
+
+
+def query(store, sql, params=()):
+    """Run a query against the database and return the result as a pandas data frame."""
+
+    return pd.read_sql_query(sql, store, params=params)
+
+
+def date_filter(start=None, end=None):
+    """Return a SQL condition and parameters selecting rows dated from start to
+       end, inclusive. Either can be None."""
+
+    conditions = []
+    params = []
+    for op, day in (('>=', start), ('<=', end)):
+        if day is not None:
+            conditions.append('date ' + op + ' ?')
+            params.append(pd.Timestamp(day).strftime('%Y-%m-%d'))
+    return ''.join(' AND ' + c for c in conditions), params
+
+
+def query_url_clicks(store, start=None, end=None):
+    """Sum citable content clicks per IR and URL in the database, as
+       load_url_clicks does for the page-click files.
+
+    Parameters
+    ----------
+
+    store:
+        A connection returned by open_store.
+    start, end:
+        Optional first and last days of the page-click data to include.
+
+    Returns
+    -------
+
+    url_clicks:
+        A pandas data frame indexed by RAMP page-click index and URL with the columns
+        listed in URL_CLICK_COLS, as returned by merge_url_clicks, with rows in order
+        of first appearance in the loaded files.
+
+    """
+
+    # SUM is NULL when every position of a URL is missing, so it is counted as 0.
+    serp_sums = ''.join(', COALESCE(SUM(position <= ' + str(p) + '), 0) AS ' + serp +
+                        ', SUM(CASE WHEN position <= ' + str(p) + ' THEN clicks ELSE 0 END) AS ' + serp + 'CcdSum'
+                        for serp, p in SERP_POSITIONS.items())
+    dates, params = date_filter(start, end)
+    url_clicks = query(store, 'SELECT "index", url, SUM(clicks) AS clicks' + serp_sums +
+                       ' FROM page_clicks WHERE citableContent = 1 AND clicks > 0'
+                       ' AND "index" IS NOT NULL AND url IS NOT NULL' + dates +
+                       ' GROUP BY "index", url ORDER BY MIN(rowid)', params)
+    return url_clicks.set_index(['index', 'url'])[URL_CLICK_COLS].astype('int64')
+
+
+def query_access_counts(store, start=None, end=None):
+    """Sum clicks, impressions and rows per IR, country and device in the
+       database, as stream_country_device does for the country-device files.
+
+    Parameters
+    ----------
+
+    store:
+        A connection returned by open_store.
+    start, end:
+        Optional first and last days of the country-device data to include.
+
+    Returns
+    -------
+
+    counts:
+        A pandas data frame indexed by RAMP access-info index, country and device
+        with the columns listed in ACCESS_SUM_COLS (see "ramp_country_device"), with
+        rows in order of first appearance in the loaded files.
+
+    """
+
+    dates, params = date_filter(start, end)
+    counts = query(store, 'SELECT "index", country, device, COALESCE(SUM(clicks), 0) AS clicks, '
+                          'COALESCE(SUM(impressions), 0) AS impressions, COUNT(*) AS rows FROM country_device '
+                          'WHERE "index" IS NOT NULL AND country IS NOT NULL AND device IS NOT NULL' + dates +
+                          ' GROUP BY "index", country, device ORDER BY MIN(rowid)', params)
+    return counts.set_index(['index', 'country', 'device']).astype('int64')
@@ -19,7 +19,20 @@ and <https://requests.readthedocs.io/en/master/>. Should be installed
 in the Python environment in which this script will be run.
 
 The other imported libraries listed below are all included in the default Python
-installation.
+installation, except for "ramp_normalize," "ramp_aggregate," "ramp_load_data,"
+"ramp_cache," "ramp_download," "ramp_partials," "ramp_country_device," "ramp_profile,"
+"ramp_windows," "ramp_store," "ramp_results," "ramp_file_index," "ramp_resolve" and
+"ramp_sketch," which are included in the GitHub repository in the same "scripts" directory as
+this script. They contain the functions used to infer item URLs from the content file URLs in
+RAMP data, to compute the per-IR statistics, to download, read and incrementally aggregate the
+RAMP data files, to aggregate the country-device data, to time each stage of the script, to
+compute the statistics for several date windows, to load the RAMP data into a database, to
+write the output files, to read the rows of single IR through a side index, to check that
+inferred item URLs resolve, and to estimate unique counts in preview mode.
+
+Optionally, the Python module pyarrow, available from <https://arrow.apache.org/docs/python/>,
+is used to cache the RAMP data files in Parquet format for faster loading, and to write
+the output in Parquet format.
 
 2. "RAMP_IR_base_info.csv": This file contains some IR specific configuration data from
 RAMP, as well as manually collected data including the count of items in each IR. The data
@@ -35,571 +48,532 @@ has been published at Dryad: <https://doi.org/10.5061/dryad.fbg79cnr0>. The data
 large to be included in the GitHub repository, but the repository includes an empty
 directory, 'ramp_data.' The data should be downloaded from Dryad into the 'ramp_data'
 directory. Dataset documentation are included in the item record in Dryad. This script
-includes the necessary code to download the data into the 'ramp_data' directory - please
-be sure to comment out the corresponding lines of code after downloading the data.
+includes the necessary code to download the data into the 'ramp_data' directory. Files
+that have already been downloaded are not downloaded again.
 
 This script will output a CSV file, "RAMP_summary_stats_YYYYMMDD.csv," where "YYYYMMDD"
 will be the date on which the script is run. Brief output file column definitions are
 provided inline below, but additional documentation is provided in the
 "RAMP_summary_stats_documentation.md" file included in the GitHub repository, in the
-"results" directory.
+"results" directory. The output can also be written as Parquet and JSON files with the
+same name (see output_formats below). If date windows are set (see date_windows below), one file is output
+per window instead, "RAMP_summary_stats_<window>_YYYYMMDD.csv," with the statistics of
+the page-click data dated within the window. All windows are computed from one pass over
+the page-click files.
+
+The script also lists the most clicked items and URLs of each IR, with their clicks and
+their share of the IR's clicks, in "RAMP_top_items_YYYYMMDD.csv" (or
+"RAMP_top_items_<window>_YYYYMMDD.csv" per window, see top_items below).
+
+In preview mode (see preview below), the script only outputs estimates of the unique URL
+and item counts and the use ratio of each IR, "RAMP_summary_preview_YYYYMMDD.csv," with
+their relative standard error, and skips the exact statistics and country-device tables.
+
+The script also sums clicks, impressions and rows in the RAMP country-device data by
+IR, country, device and global region (north or south, from the "north_south.csv" file
+in the "country_codes" directory), and outputs one CSV file per table,
+"RAMP_country_device_<table>_YYYYMMDD.csv" (see "ramp_country_device").
+
+A JSON run report, "RAMP_summary_stats_YYYYMMDD_run_report.json," records the wall clock
+time, CPU time, rows processed and peak memory of each stage of the script and of each IR
+in the main loop (see "ramp_profile"). It is saved in the "results" directory.
+
+An error while computing the statistics of one IR (or of the IR sharing a normalizer)
+doesn't stop the others. The IR is left out of the output file, an error record with the
+IR, the stage, the error and its traceback is saved in
+"RAMP_summary_stats_YYYYMMDD_errors.json" in the "results" directory, and the script exits
+with status 1 after writing all of its other output. Failed downloads are recorded the
+same way, since the months they cover are missing from the output.
 
 """
 
 
-import pandas as pd
-
-import os
-
-import fnmatch
+import sys
 
-import re
-
-import requests
-
-from urllib.parse import urlparse
+import pandas as pd
 
 from datetime import date
 
+from ramp_aggregate import summarize_url_clicks
 
-def make_dspace_html_url(bitstream_url):
-    """For DSpace IR, generate a URL for an HTML page that contains a bitstream
-       that has a positive click count in RAMP. Basically, this function attempts
-       to infer or reverse-engineer the URL of a bitstream's parent HTML page
-       using the bitstream's URL. For DSpace IR this requires extracting the item's
-       Handle from the bitstream URL and inserting it into an item URL.
-
-    Parameters
-    ----------
-
-    bitstream_url:
-        The URL of a DSpace bitstream with a positive click count in RAMP.
-
-    Returns
-    -------
-
-    An HTML URL:
-        The URL of the HTML page ("item") that includes the bitstream.
-        
-    """
-    
-    p = urlparse(bitstream_url)
-
-    # Compile a regular expression to find the DSpace handle in the bitstream URL.
-    handle = re.compile("\/[0-9\?\.]+\/[0-9][0-9]+")
-
-    # Search the bitstream URL for the UI type.
-    xmlui = re.compile('xmlui')
-    jspui = re.compile('jspui')
-    dspace = re.compile('dspace')
-    h = handle.search(p.path)
-    x = xmlui.search(p.path)
-    j = jspui.search(p.path)
-    ds = dspace.search(p.path)
-
-    # Construct and return the item HTML page.
-    if h:
-        if j:
-            return p.scheme + '://' + p.netloc + '/' + 'jspui' + '/' + 'handle' + h.group()
-        elif x:
-            return p.scheme + '://' + p.netloc + '/' + 'xmlui' + '/' + 'handle' + h.group()
-        elif ds:
-            return p.scheme + '://' + p.netloc + '/' + 'dspace' + '/' + 'handle' + h.group()
-        else:
-            return p.scheme + '://' + p.netloc + '/' + 'handle' + h.group()
-
-
-def make_dspace_item_uri(bitstream_url):
-    """For DSpace IR, generate a URI for an HTML page that contains a bitstream
-       that has a positive click count in RAMP. Basically, this function attempts
-       to infer or reverse-engineer the URL of a bitstream's parent HTML page
-       using the bitstream's URL. For DSpace IR this requires extracting the item's
-       Handle from the bitstream URL and inserting it into an item URL.
-
-       This is the same function as above, only instead of a URL, this returns
-       a unique URI that can be used to deduplicate HTML URLs where both
-       http and https protocols are present.
-
-    Parameters
-    ----------
-
-    bitstream_url:
-        The URL of a DSpace bitstream with a positive click count in RAMP.
+from ramp_country_device import (read_country_codes, stream_country_device, summarize_country_device,
+                                 unmatched_countries, write_access_tables)
 
-    Returns
-    -------
+from ramp_download import download_files
 
-    An item URI:
-        A locally unique URI of the HTML page ("item") that includes the bitstream.
-        
-    """
-    
-    p = urlparse(bitstream_url)
+from ramp_file_index import indexed_url_clicks
 
-    # Compile a regular expression to find the DSpace handle in the bitstream URL.
-    handle = re.compile("\/[0-9\?\.]+\/[0-9][0-9]+")
+from ramp_load_data import find_ramp_files, load_url_clicks, memory_report
 
-    # Search the bitstream URL for the UI type.
-    xmlui = re.compile('xmlui')
-    jspui = re.compile('jspui')
-    dspace = re.compile('dspace')
-    h = handle.search(p.path)
-    x = xmlui.search(p.path)
-    j = jspui.search(p.path)
-    ds = dspace.search(p.path)
+from ramp_normalize import NormalizationCache, normalizers_for
 
-    # Construct and return the item HTML page.
-    if h:
-        return h.group()
+from ramp_partials import update_partials
 
-def make_eprints_fedora_html_url(pdf_url):
-    """For EPrints and Fedora IR, generate a URL for an HTML page that contains a content file
-       that has a positive click count in RAMP. Basically, this function attempts
-       to infer or reverse-engineer the URL of a file's parent HTML page
-       using the file's URL. For EPrints and Fedora IR this requires extracting the item's
-       internal ID number from the content file URL and inserting it into an item URL.
-       Note that for EPrints and Fedora IR, RAMP is currently only filtering activity
-       on PDF files, and does not filter activity on other content file types.
+from ramp_profile import RunReport, error_record
 
-    Parameters
-    ----------
+from ramp_resolve import ResolveCache, item_targets, resolve
 
-    pdf_url:
-        The URL of a PDF URL with a positive click count in RAMP.
+from ramp_results import SUMMARY_DTYPES, ResultBuilder, write_results
 
-    Returns
-    -------
+from ramp_sketch import preview_stats, update_sketches
 
-    An HTML URL:
-        The URL of the HTML page ("item") that includes the PDF URL.
-        
-    """
+from ramp_store import load_files, open_store, query_access_counts, query_url_clicks
 
-    p = urlparse(pdf_url)
+from ramp_windows import calendar_windows, window_bounds, window_url_clicks
 
-    # Compile a regular expression to find the internal ID numberof the item.
-    pdf_path = re.compile("\/[0-9][0-9]+")
-    pdf_id = pdf_path.search(p.path)
-
-    # Construct and return the item HTML page.
-    if pdf_id:
-        return p.scheme + '://' + p.netloc + pdf_id.group()
-
-
-def make_eprints_fedora_item_uri(pdf_url):
-    """For EPrints and Fedora IR, generate a URL for an HTML page that contains a content file
-       that has a positive click count in RAMP. Basically, this function attempts
-       to infer or reverse-engineer the URL of a file's parent HTML page
-       using the file's URL. For EPrints and Fedora IR this requires extracting the item's
-       internal ID number from the content file URL and inserting it into an item URL.
-       Note that for EPrints and Fedora IR, RAMP is currently only filtering activity
-       on PDF files, and does not filter activity on other content file types.
-
-       This is the same function as above, only instead of a URL, this returns
-       a unique URI that can be used to deduplicate HTML URLs where both
-       http and https protocols are present.
-
-    Parameters
-    ----------
-
-    pdf_url:
-        The URL of a PDF URL with a positive click count in RAMP.
-
-    Returns
-    -------
-
-    An item URI:
-        A locally unique URI of the HTML page ("item") that includes the PDF URL.
-        
-    """
-
-    p = urlparse(pdf_url)
-
-    # Compile a regular expression to find the internal ID numberof the item.
-    pdf_path = re.compile("\/[0-9][0-9]+")
-    pdf_id = pdf_path.search(p.path)
-
-    # Construct and return the item HTML page.
-    if pdf_id:
-        return pdf_id.group()
-
-
-def make_fedora_ne_html_url(pdf_url):
-    """This function is the same as make_eprints_fedora_html_url,
-       but the regular expression is modified to include a
-       specific prefix present in all ID numbers.
-
-    Parameters
-    ----------
-
-    pdf_url:
-        The URL of a PDF URL with a positive click count in RAMP.
-
-    Returns
-    -------
-
-    An HTML URL:
-        The URL of the HTML page ("item") that includes the PDF URL.
-        
-    """
-
-    p = urlparse(pdf_url)
-    pdf_path = re.compile("\/files\/neu:[a-z0-9]+")
-    pdf_id = pdf_path.search(p.path)
-    if pdf_id:
-        return p.scheme + '://' + p.netloc + pdf_id.group()
-
-
-def make_fedora_ne_item_uri(pdf_url):
-    """This function is the same as make_eprints_fedora_html_url,
-       but the regular expression is modified to include a
-       specific prefix present in all ID numbers.
-
-       This is the same function as above, only instead of a URL, this returns
-       a unique URI that can be used to deduplicate HTML URLs where both
-       http and https protocols are present.
-
-    Parameters
-    ----------
-
-    pdf_url:
-        The URL of a PDF URL with a positive click count in RAMP.
-
-    Returns
-    -------
-
-    An item URI:
-        A locally unique URI of the HTML page ("item") that includes the PDF URL.
-        
-    """
-
-    p = urlparse(pdf_url)
-    pdf_path = re.compile("\/files\/neu:[a-z0-9]+")
-    pdf_id = pdf_path.search(p.path)
-    if pdf_id:
-        return pdf_id.group()
-
-
-def make_bepress_oai_url(pdf_url):
-    """For BePress Digital Commons IR, generate an OAI-PMH identifier (UID) for an item
-       that contains a content file
-       that has a positive click count in RAMP. Basically, this function attempts
-       to infer or reverse-engineer the OAI-PMH UID of a file's parent HTML page
-       using the file's URL. For Digital Commons IR this requires extracting the item's
-       'context' and 'article' ID numbers from the content file URL and inserting
-       them into an OAI-PMH UID.
-
-    Parameters
-    ----------
-
-    pdf_url:
-        The URL of a PDF URL with a positive click count in RAMP.
-
-    Returns
-    -------
-
-    An OAI-PMH UID:
-        A UID that can be used to make an OAI-PMH request for the item that
-        contains the content file.
-        
-    """
-
-    p = urlparse(pdf_url)
-    base_url = 'oai:' + p.netloc + ':'
-    contextRe = re.compile(r'context=([a-z0-9_\-]*)')
-    articleRe = re.compile(r'article=([0-9][0-9][0-9][0-9])')
-    contextSearch = contextRe.search(pdf_url)
-    articleSearch = articleRe.search(pdf_url)
-    if contextSearch:
-        if articleSearch:
-            context = contextSearch.group().replace('context=', '')
-            article = articleSearch.group().replace('article=', '')
-            return base_url + str(context) + '-' + str(article)
-
-def make_bepress_item_uri(pdf_url):
-    """For BePress Digital Commons IR, generate an OAI-PMH identifier (UID) for an item
-       that contains a content file
-       that has a positive click count in RAMP. Basically, this function attempts
-       to infer or reverse-engineer the OAI-PMH UID of a file's parent HTML page
-       using the file's URL. For Digital Commons IR this requires extracting the item's
-       'context' and 'article' ID numbers from the content file URL and inserting
-       them into an OAI-PMH UID.
-
-       This is the same function as above, only instead of a URL, this returns
-       a unique URI that can be used to deduplicate HTML URLs where both
-       http and https protocols are present.
-
-    Parameters
-    ----------
-
-    pdf_url:
-        The URL of a PDF URL with a positive click count in RAMP.
-
-    Returns
-    -------
-
-    An OAI-PMH UID:
-        A locally unique UID that can be used to make an OAI-PMH request for the item that
-        contains the content file.
-        
-    """
-
-    p = urlparse(pdf_url)
-    base_url = 'oai:' + p.netloc + ':'
-    contextRe = re.compile(r'context=([a-z0-9_\-]*)')
-    articleRe = re.compile(r'article=([0-9][0-9][0-9][0-9])')
-    contextSearch = contextRe.search(pdf_url)
-    articleSearch = articleRe.search(pdf_url)
-    if contextSearch:
-        if articleSearch:
-            context = contextSearch.group().replace('context=', '')
-            article = articleSearch.group().replace('article=', '')
-            return base_url + str(context) + '-' + str(article)
-
-
-def construct_html_urls(ir_data, platform):
-    """This is a helper function that takes RAMP data for a single IR
-       and passes it to the appropriate function for building the
-       HTML URLs of item pages containing content files with positive click
-       values in RAMP. 
-       
-
-    Parameters
-    ----------
-
-    ir_data:
-        A pandas data frame containing RAMP data for a single IR.
-    platform:
-        The IR's software platform.
-
-    Returns
-    -------
-
-    ir_data:
-        The IR data is returned with two new columns, 'html_url' and
-        'unique_item_uri.' For each row,
-        this is the URL of the HTML page of the item containing the content
-        file URL referenced by the 'url' column in RAMP, and a URI that
-        can be used to deduplicate items which are present in the dataset
-        with both http and https URLs.
-        
-    """
-
-    if platform == 'DSpace':
-        ir_data['html_url'] = ir_ramp_data['url'].apply(make_dspace_html_url)
-        ir_data['unique_item_uri'] = ir_ramp_data['url'].apply(make_dspace_item_uri) 
-    if platform == 'EPrints 3':
-        ir_data['html_url'] = ir_ramp_data['url'].apply(make_eprints_fedora_html_url)
-        ir_data['unique_item_uri'] = ir_ramp_data['url'].apply(make_eprints_fedora_item_uri)
-    if platform == 'Fedora/Samvera':
-        ir_data['html_url'] = ir_ramp_data['url'].apply(make_fedora_ne_html_url)
-        ir_data['unique_item_uri'] = ir_ramp_data['url'].apply(make_fedora_ne_item_uri)
-    if platform == 'Fedora':
-        ir_data['html_url'] = ir_ramp_data['url'].apply(make_eprints_fedora_html_url)
-        ir_data['unique_item_uri'] = ir_ramp_data['url'].apply(make_eprints_fedora_item_uri)
-    if platform == 'Digital Commons':
-        ir_data['html_url'] = ir_ramp_data['url'].apply(make_bepress_oai_url)
-        ir_data['unique_item_uri'] = ir_ramp_data['url'].apply(make_bepress_item_uri)
-    return ir_data
 
 # Set paths to data and output directories. Update as needed.
 data_dir = '../ir_data/'
 ramp_data_dir = '../ramp_data/'
 results_dir = '../results/'
+country_codes_dir = '../country_codes/'
+
+# Number of page-click rows to read at a time. Set to None to read each page-click
+# file into memory whole instead.
+chunk_size = 1000000
+
+# Directory for Parquet copies of the RAMP data files, which are much faster to read
+# than the CSV files on later runs. Requires the pyarrow module; the CSV files are
+# read directly if it isn't installed. Set to None to turn off the cache.
+cache_dir = ramp_data_dir + 'parquet_cache/'
+
+# Directory for the per-URL click sums of each monthly page-click file. Each file
+# is only read once, and later runs (e.g. after adding a new month of data) merge
+# the stored sums. Delete a month's file here to leave it out of the statistics,
+# or set to None to read all page-click files on every run.
+partials_dir = ramp_data_dir + 'partials/'
+
+# File used to store the item URLs inferred for each content file URL, so that URLs
+# seen in earlier runs don't have to be normalized again. Set to None to only cache
+# normalized URLs for the current run.
+url_cache_path = ramp_data_dir + 'url_cache.csv.gz'
+
+# Number of processes used to read the page-click files in parallel. Set to None to
+# use one process per CPU, or to 1 to read the files one at a time.
+workers = None
+
+# Number of RAMP data files to download from Dryad at a time.
+download_workers = 4
+
+# The RAMP data files are loaded with a memory-compact schema (see "ramp_load_data").
+# To report how much memory this saves, this many rows are read from the start of each
+# file both with and without the schema. Set to 0 to skip the report.
+memory_report_rows = 100000
+
+# Number of most clicked items and URLs of each IR to list in "RAMP_top_items_YYYYMMDD.csv,"
+# with their clicks and share of the IR's clicks. Set to 0 to skip the file.
+top_items = 10
+
+# Formats to write "RAMP_summary_stats_YYYYMMDD" in: any of 'csv', 'parquet' (requires
+# pyarrow) and 'json' (one record per IR). Parquet and JSON files keep the column types,
+# e.g. for reading into R.
+output_formats = ['csv']
+
+# Date windows to compute the summary statistics for, as a dictionary mapping window names
+# to (first day, last day) pairs, e.g. {'2019-Q1': ('2019-01-01', '2019-03-31')}. Monthly,
+# quarterly and rolling windows can be made with calendar_windows (see "ramp_windows"), e.g.
+# calendar_windows('2019-01-01', '2019-05-31', months=3, step=1) for rolling three month
+# windows. One output file is written per window. Stored partials don't keep dates, so
+# they aren't used when windows are set. Set to None for a single output file covering
+# all of the page-click data.
+date_windows = None
+
+# SQLite database file to load the page-click and country-device data into (see
+# "ramp_store"). If set, each file is only loaded once, the per-URL and country-device
+# sums are computed by queries against the database, and the database can be queried
+# directly for other analyses. Set to None to read the files instead.
+store_path = None
+
+# IR to rerun the statistics for, e.g. ['montana'] (values of 'ir_index_root' in
+# "RAMP_IR_base_info.csv"), or None for all IR. The output files, including the
+# country-device tables, then only include these IR. Only their rows are read from the page-click files, through a side index of each
+# file that maps IR and dates to byte ranges (see "ramp_file_index"). The index, and a
+# copy of the file with its rows grouped by IR and date if they aren't already, are
+# saved in file_index_dir the first time.
+rerun_irs = None
+file_index_dir = ramp_data_dir + 'file_index/'
+
+# Preview mode: set to True to only estimate countCcdUrls, countItemUrls, countItemUris and
+# the use ratio of each IR (for each date window, if set), and write them to
+# "RAMP_summary_preview_YYYYMMDD.csv," instead of computing the exact statistics. The
+# estimates come from HyperLogLog sketches of each IR's URLs and items per day (see
+# "ramp_sketch"), and are within about 3% (two standard errors) of the exact counts. The
+# sketches of each page-click file are stored in sketch_dir, so previews of other windows
+# or IR only read new files.
+preview = False
+sketch_dir = ramp_data_dir + 'sketches/'
+
+# Check that the item URLs and OAI-PMH identifiers inferred for each IR resolve (see
+# "ramp_resolve"), and write the results to "RAMP_item_resolution_YYYYMMDD.csv." This
+# sends a request to the IR for every item, so it is off by default. Results are stored
+# in resolve_cache_path, and items that were already checked aren't requested again.
+resolve_items = False
+resolve_cache_path = ramp_data_dir + 'resolve_cache.csv.gz'
+
+# Stages of this script to run under cProfile, e.g. ['ingest', 'normalize']. A ".prof" file
+# is saved for each in the 'results' directory. The stages are 'download', 'ingest',
+# 'memory_report', 'summarize' (with 'normalize' and 'describe' inside it), 'output',
+# 'resolve' and 'access', or 'preview' in preview mode.
+profile_stages = []
 
 # Get today's date for the output filename.
 today = date.today()
 fname_date = today.strftime("%Y%m%d")
 
-# Download the January - May 2019 RAMP data subset from Dryad.
-# This only needs to be done the first time the analysis is run.
-# Please comment out lines 278-282 as needed following download.
-
-# These are the file URLs.
-ramp_201901_ai = 'https://datadryad.org/stash/downloads/file_stream/237857'
-ramp_201901_pc = 'https://datadryad.org/stash/downloads/file_stream/237862'
-ramp_201902_ai = 'https://datadryad.org/stash/downloads/file_stream/237856'
-ramp_201902_pc = 'https://datadryad.org/stash/downloads/file_stream/237861'
-ramp_201903_ai = 'https://datadryad.org/stash/downloads/file_stream/237858'
-ramp_201903_pc = 'https://datadryad.org/stash/downloads/file_stream/237863'
-ramp_201904_ai = 'https://datadryad.org/stash/downloads/file_stream/237859'
-ramp_201904_pc = 'https://datadryad.org/stash/downloads/file_stream/237864'
-ramp_201905_ai = 'https://datadryad.org/stash/downloads/file_stream/237860'
-ramp_201905_pc = 'https://datadryad.org/stash/downloads/file_stream/237865'
-
-# Build a dictionary to match filenames with corresponding file URLs.
-ramp_subset = {}
-ramp_subset['2019-01_RAMP_subset_country-device-info.csv'] = ramp_201901_ai
-ramp_subset['2019-01_RAMP_subset_page-clicks_v2.csv'] = ramp_201901_pc
-ramp_subset['2019-02_RAMP_subset_country-device-info.csv'] = ramp_201902_ai
-ramp_subset['2019-02_RAMP_subset_page-clicks_v2.csv'] = ramp_201902_pc
-ramp_subset['2019-03_RAMP_subset_country-device-info.csv'] = ramp_201903_ai
-ramp_subset['2019-03_RAMP_subset_page-clicks_v2.csv'] = ramp_201903_pc
-ramp_subset['2019-04_RAMP_subset_country-device-info.csv'] = ramp_201904_ai
-ramp_subset['2019-04_RAMP_subset_page-clicks_v2.csv'] = ramp_201904_pc
-ramp_subset['2019-05_RAMP_subset_country-device-info.csv'] = ramp_201905_ai
-ramp_subset['2019-05_RAMP_subset_page-clicks_v2.csv'] = ramp_201905_pc
-
-# Download the data and save to the 'ramp_data' directory.
-for file_name, file_pointer in ramp_subset.items():
-    r = requests.get(file_pointer, stream=True)
-    with open(ramp_data_dir + file_name, 'wb') as dl:
-        for chunk in r.iter_content(chunk_size=512):
-            dl.write(chunk)
-
-# Create a list to hold the names of individual RAMP data files.
-# Note that only page-click data are being used here.
-click_data_files = []
-for r, d, n in os.walk(ramp_data_dir):
-    for f in n:
-        if fnmatch.fnmatch(f, '*page-clicks*'):
-            fname = os.path.join(r, f)
-            click_data_files.append(fname)
-
-# Read the first RAMP data file. 
-ramp_data = pd.read_csv(click_data_files[0])
-
-# Read the other RAMP data files. Since these files are large and can take
-# some time to load, the next two lines can be commented out to run the rest
-# of this script on one file for testing and debugging purposes.
-for f in click_data_files[1:]:
-    ramp_data = ramp_data.append(pd.read_csv(f))
-
-# Read the file with the manually collected data about IR size, platform,
-# country, etc.
-ir_info = pd.read_csv(data_dir + 'RAMP_IR_base_info.csv')
-
-# Define the columns that for the output data frame and file.
-# More detailed column definitions are included in the file
-# "RAMP_summary_stats_documentation.md."
-cols = ['ir',                                            # ir_index_root
-        'pc_index',                                      # ir_page_click_index
-        'ai_index',                                      # ir_access_info_index
-        'inst',                                          # Institution
-        'repoName',                                      # Repository Name
-        'rURL',                                          # URL
-        'countItems',                                    # Items in repository on 2019-05-27
-        'countCcdUrls',                                  # COUNT unique CC URLs Jan1 to May31 2019
-        'countItemUrls',                                 # COUNT undeduplicated (including both http & https of a single URL) ITEM URLs in RAMP Jan1 to May31
-        'countItemUris',                                 # COUNT unique (deduplicated) ITEM URLS and/or OAI identifiers
-        'useRatio',                                      # Use Ratio (COUNT unique ITEM URIS in RAMP/ COUNT items in IR)
-        'sumCcd',                                        # SUM of CCD in full dataset
-        'ccdAggSum',                                     # SUM of clicks on unique CC urls (should equal sumCcd)
-        'ccdAggCount',                                   # COUNT of unique CC urls (should equal countCcdUrls)
-        'ccdAggMean',                                    # Average clicks per CC url
-        'ccdAggStd',                                     # Standard deviation of clicks on CC urls
-        'ccdAggMin',                                     # Minimum number of clicks on CC urls
-        'ccdAgg25',                                      # First quartile num clicks on CC urls
-        'ccdAgg50',                                      # Second quartile num clicks on CC urls
-        'ccdAgg75',                                      # Third quartile num clicks on CC urls
-        'ccdAggMax',                                     # Max number of clicks on CC urls
-        'itemAggSum',                                    # SUM of clicks on unique ITEM uris (should equal sumCcd)
-        'itemAggCount',                                  # COUNT of unique ITEM uris (should equal countItemUrls)
-        'itemAggMean',                                   # Average clicks per ITEM uri
-        'itemAggStd',                                    # Standard deviation of clicks on ITEM uris
-        'itemAggMin',                                    # Minimum number of clicks on ITEM uris
-        'itemAgg25',                                     # First quartile num clicks on ITEM uris
-        'itemAgg50',                                     # Second quartile num clicks on ITEM uris
-        'itemAgg75',                                     # Third quartile num clicks on ITEM uris
-        'itemAggMax',                                    # Max number of clicks on ITEM uris
-        'serp1',                                         # COUNT CCD URLs with Position <=10'
-        'serp1CcdSum',                                   # SUM CCD clicks on URLs with Position <=10
-        'serp100',                                       # COUNT CCD URLs with Position <=1000
-        'serp100CcdSum',                                 # SUM CCD clicks on URLs with Position <= 1000
-        'irCountry',                                     # Country where the IR is located
-        'irType',                                        # Type of repository (university, consortia, etc.)
-        'irPlat',                                        # IR Platform
-        'normIrPlat',                                    # Normalized IR platform names - no versions, etc.
-        'ctMethod',                                      # Item Count Method
-        'ctEtd',                                         # ETD on 2019-06-07
-        'pctEtd',                                        # Ratio of ETD in the IR: ctEtd / countItems
-        'gsSO']                                          # GS site operator 2019-06-07
-
-# Create the data frame to store the summary statistics.
-outDf = pd.DataFrame(columns=cols)
+# The rest of this script only runs when it is run directly, not when it is
+# imported (e.g. by the processes that read the page-click files).
+if __name__ == '__main__':
+
+    # Record the time and memory used by each stage of the script.
+    report = RunReport(profile_stages=profile_stages,
+                       profile_prefix=results_dir + 'RAMP_summary_stats_' + str(fname_date))
+    errors_path = results_dir + 'RAMP_summary_stats_' + str(fname_date) + '_errors.json'
+
+    # Download the January - May 2019 RAMP data subset from Dryad.
+    # Files that were already downloaded are skipped, and interrupted downloads
+    # are resumed, so there is no need to comment out these lines after the
+    # first run.
+
+    # These are the file URLs.
+    ramp_201901_ai = 'https://datadryad.org/stash/downloads/file_stream/237857'
+    ramp_201901_pc = 'https://datadryad.org/stash/downloads/file_stream/237862'
+    ramp_201902_ai = 'https://datadryad.org/stash/downloads/file_stream/237856'
+    ramp_201902_pc = 'https://datadryad.org/stash/downloads/file_stream/237861'
+    ramp_201903_ai = 'https://datadryad.org/stash/downloads/file_stream/237858'
+    ramp_201903_pc = 'https://datadryad.org/stash/downloads/file_stream/237863'
+    ramp_201904_ai = 'https://datadryad.org/stash/downloads/file_stream/237859'
+    ramp_201904_pc = 'https://datadryad.org/stash/downloads/file_stream/237864'
+    ramp_201905_ai = 'https://datadryad.org/stash/downloads/file_stream/237860'
+    ramp_201905_pc = 'https://datadryad.org/stash/downloads/file_stream/237865'
+
+    # Build a dictionary to match filenames with corresponding file URLs.
+    ramp_subset = {}
+    ramp_subset['2019-01_RAMP_subset_country-device-info.csv'] = ramp_201901_ai
+    ramp_subset['2019-01_RAMP_subset_page-clicks_v2.csv'] = ramp_201901_pc
+    ramp_subset['2019-02_RAMP_subset_country-device-info.csv'] = ramp_201902_ai
+    ramp_subset['2019-02_RAMP_subset_page-clicks_v2.csv'] = ramp_201902_pc
+    ramp_subset['2019-03_RAMP_subset_country-device-info.csv'] = ramp_201903_ai
+    ramp_subset['2019-03_RAMP_subset_page-clicks_v2.csv'] = ramp_201903_pc
+    ramp_subset['2019-04_RAMP_subset_country-device-info.csv'] = ramp_201904_ai
+    ramp_subset['2019-04_RAMP_subset_page-clicks_v2.csv'] = ramp_201904_pc
+    ramp_subset['2019-05_RAMP_subset_country-device-info.csv'] = ramp_201905_ai
+    ramp_subset['2019-05_RAMP_subset_page-clicks_v2.csv'] = ramp_201905_pc
+
+    # Download the data and save to the 'ramp_data' directory.
+    with report.stage('download', rows=len(ramp_subset)):
+        downloads = download_files(ramp_subset, ramp_data_dir, download_workers)
+    for file_name, status in downloads.items():
+        print(file_name + ': ' + str(status))
+        # A failed download leaves its month out of the output, so it is an error.
+        if isinstance(status, Exception):
+            report.errors.append(error_record('download', status, file=file_name))
+
+    # Read the file with the manually collected data about IR size, platform,
+    # country, etc.
+    ir_info = pd.read_csv(data_dir + 'RAMP_IR_base_info.csv')
+    if rerun_irs:
+        ir_info = ir_info[ir_info['ir_index_root'].isin(rerun_irs)]
+
+    # Create a list to hold the names of individual RAMP data files.
+    # Note that only page-click data are being used here.
+    click_data_files = find_ramp_files(ramp_data_dir, '*page-clicks*')
+
+    # In preview mode, only estimate the unique URL and item counts from the stored
+    # sketches, and stop.
+    if preview:
+        url_cache = NormalizationCache(url_cache_path)
+        with report.stage('preview') as stage:
+            sketches = update_sketches(click_data_files, sketch_dir, normalizers_for(ir_info), url_cache,
+                                       chunk_size or 1000000, cache_dir)
+            for window, (start, end) in (date_windows or {None: (None, None)}).items():
+                out_name = 'RAMP_summary_preview_' + (window + '_' if window else '') + str(fname_date)
+                preview_stats(sketches, ir_info, start, end).to_csv(results_dir + out_name + '.csv', index=False)
+            stage['rows'] = len(sketches)
+        if url_cache_path:
+            url_cache.save()
+        report.save(results_dir + 'RAMP_summary_stats_' + str(fname_date) + '_run_report.json')
+        print(report.summary())
+        print("Done. The preview files, 'RAMP_summary_preview_*" + str(fname_date) + ".csv', are in the "
+              "'results' directory.")
+        if report.errors:
+            report.save_errors(errors_path)
+            print(str(len(report.errors)) + ' errors. See ' + errors_path + '.')
+            sys.exit(1)
+        sys.exit(0)
+
+    # Since these files are large and can take some time to load, the list can be
+    # sliced (e.g. click_data_files[:1]) to run the rest of this script on one file
+    # for testing and debugging purposes.
+    # The files are read in parallel, and each one is reduced to per-URL click sums
+    # by the process that reads it. If partials are stored, only files that haven't
+    # been read before are read, and the sums of all stored months are merged.
+    # With date windows, clicks are summed per URL and segment of the windows in the
+    # same pass, and the sums of each window's segments are then added up. With a
+    # database, the files are loaded into it once, and the sums are queried. When only
+    # some IR are rerun, only their rows are read, through the side index of each file.
+    with report.stage('ingest') as stage:
+        if rerun_irs:
+            bounds = window_bounds(date_windows) if date_windows else None
+            url_clicks = indexed_url_clicks(click_data_files, file_index_dir,
+                                            list(ir_info['ir_page_click_index']), bounds=bounds)
+            window_clicks = window_url_clicks(url_clicks, date_windows, bounds) if date_windows else {None: url_clicks}
+        elif store_path:
+            store = open_store(store_path)
+            load_files(store, click_data_files + find_ramp_files(ramp_data_dir, '*country-device*'),
+                       chunk_size or 1000000, cache_dir)
+            if date_windows:
+                window_clicks = {name: query_url_clicks(store, start, end)
+                                 for name, (start, end) in date_windows.items()}
+            else:
+                window_clicks = {None: query_url_clicks(store)}
+        elif date_windows:
+            bounds = window_bounds(date_windows)
+            window_clicks = window_url_clicks(load_url_clicks(click_data_files, chunk_size, cache_dir, workers, bounds),
+                                              date_windows, bounds)
+        elif partials_dir:
+            window_clicks = {None: update_partials(click_data_files, partials_dir, chunk_size, cache_dir, workers)}
+        else:
+            window_clicks = {None: load_url_clicks(click_data_files, chunk_size, cache_dir, workers)}
+        stage['rows'] = sum(len(c) for c in window_clicks.values())
+
+    # Estimate the memory saved by loading each file with the compact schema.
+    if memory_report_rows:
+        with report.stage('memory_report'):
+            memory = memory_report(click_data_files + find_ramp_files(ramp_data_dir, '*country-device*'),
+                                   memory_report_rows)
+        for m in memory.itertuples():
+            print(m.file + ': ' + str(round(m.compact_mb, 1)) + ' MB in memory, ' + str(round(m.saved_mb, 1)) +
+                  ' MB (' + str(round(m.saved_pct, 1)) + '%) less than with inferred types.')
+        report.info['memory'] = memory.to_dict('records')
+
+    # Define the columns that for the output data frame and file.
+    # More detailed column definitions are included in the file
+    # "RAMP_summary_stats_documentation.md."
+    cols = ['ir',                                            # ir_index_root
+            'pc_index',                                      # ir_page_click_index
+            'ai_index',                                      # ir_access_info_index
+            'inst',                                          # Institution
+            'repoName',                                      # Repository Name
+            'rURL',                                          # URL
+            'countItems',                                    # Items in repository on 2019-05-27
+            'countCcdUrls',                                  # COUNT unique CC URLs Jan1 to May31 2019
+            'countItemUrls',                                 # COUNT undeduplicated (including both http & https of a single URL) ITEM URLs in RAMP Jan1 to May31
+            'countItemUris',                                 # COUNT unique (deduplicated) ITEM URLS and/or OAI identifiers
+            'useRatio',                                      # Use Ratio (COUNT unique ITEM URIS in RAMP/ COUNT items in IR)
+            'sumCcd',                                        # SUM of CCD in full dataset
+            'ccdAggSum',                                     # SUM of clicks on unique CC urls (should equal sumCcd)
+            'ccdAggCount',                                   # COUNT of unique CC urls (should equal countCcdUrls)
+            'ccdAggMean',                                    # Average clicks per CC url
+            'ccdAggStd',                                     # Standard deviation of clicks on CC urls
+            'ccdAggMin',                                     # Minimum number of clicks on CC urls
+            'ccdAgg25',                                      # First quartile num clicks on CC urls
+            'ccdAgg50',                                      # Second quartile num clicks on CC urls
+            'ccdAgg75',                                      # Third quartile num clicks on CC urls
+            'ccdAggMax',                                     # Max number of clicks on CC urls
+            'itemAggSum',                                    # SUM of clicks on unique ITEM uris (should equal sumCcd)
+            'itemAggCount',                                  # COUNT of unique ITEM uris (should equal countItemUrls)
+            'itemAggMean',                                   # Average clicks per ITEM uri
+            'itemAggStd',                                    # Standard deviation of clicks on ITEM uris
+            'itemAggMin',                                    # Minimum number of clicks on ITEM uris
+            'itemAgg25',                                     # First quartile num clicks on ITEM uris
+            'itemAgg50',                                     # Second quartile num clicks on ITEM uris
+            'itemAgg75',                                     # Third quartile num clicks on ITEM uris
+            'itemAggMax',                                    # Max number of clicks on ITEM uris
+            'itemTop1Share',                                 # Share of clicks on ITEM uris held by the top 1% of them
+            'itemTop10Share',                                # Share of clicks on ITEM uris held by the top 10% of them
+            'itemGini',                                      # Gini coefficient of clicks on ITEM uris
+            'serp1',                                         # COUNT CCD URLs with Position <=10'
+            'serp1CcdSum',                                   # SUM CCD clicks on URLs with Position <=10
+            'serp100',                                       # COUNT CCD URLs with Position <=1000
+            'serp100CcdSum',                                 # SUM CCD clicks on URLs with Position <= 1000
+            'irCountry',                                     # Country where the IR is located
+            'irType',                                        # Type of repository (university, consortia, etc.)
+            'irPlat',                                        # IR Platform
+            'normIrPlat',                                    # Normalized IR platform names - no versions, etc.
+            'ctMethod',                                      # Item Count Method
+            'ctEtd',                                         # ETD on 2019-06-07
+            'pctEtd',                                        # Ratio of ETD in the IR: ctEtd / countItems
+            'gsSO']                                          # GS site operator 2019-06-07
+
+    # Compute the RAMP statistics for all IR in one pass over the per-URL click sums,
+    # once per date window if windows are set. The result for each window is a dictionary
+    # of statistics per IR, keyed by the IR's page-click index. Item URLs are inferred by
+    # the normalizer for each IR's platform (see "ramp_normalize"); URLs that recur in
+    # several windows are only normalized once.
+    normalizers = normalizers_for(ir_info)
+    url_cache = NormalizationCache(url_cache_path)
+    # The most clicked items and URLs of each IR are selected in the same pass.
+    window_stats = {}
+    window_top = {}
+    with report.stage('summarize', rows=sum(len(c) for c in window_clicks.values())):
+        for window, url_clicks in window_clicks.items():
+            top = []
+            window_stats[window] = summarize_url_clicks(url_clicks, normalizers, url_cache, report,
+                                                        report.errors, top, top_items).to_dict('index')
+            window_top[window] = top[0] if top else None
+    if url_cache_path:
+        url_cache.save()
+    # IR whose normalizer failed are already recorded as errors and left out of the
+    # statistics.
+    normalize_failed = {e['pc_index'] for e in report.errors if e['stage'] == 'normalize'}
+    print('Normalized ' + str(url_cache.hits + url_cache.misses) + ' unique URLs (' +
+          str(url_cache.rows) + ' rows), ' + str(round(100 * url_cache.hit_rate(), 1)) +
+          '% from the URL cache.')
+
+    # Write one output file per date window, or a single file without windows.
+    for window, ramp_stats in window_stats.items():
+        out_name = 'RAMP_summary_stats_' + (window + '_' if window else '') + str(fname_date)
+
+        # Collect the summary statistics of each IR as a row, with the column types
+        # declared in SUMMARY_DTYPES (see "ramp_results").
+        results = ResultBuilder(cols, SUMMARY_DTYPES)
 
-"""
-This long "for" loop generates RAMP summary statistics for each IR included in the IR_base_info.csv file.
-Variables are defined in the data table definitions for the output file described in 
-"RAMP_summary_stats_documentation.md." See Python pandas documentation for more information about
-statistical functions.
-"""
-for i, r in ir_info.iterrows():
-    try:
-        ir = r['ir_index_root']
-        pc_index = r['ir_page_click_index']
-        ai_index = r['ir_access_info_index']
-        inst = r['Institution']
-        repoName = r['Repository Name']
-        rURL = r['URL']
-        countItems = int(r['Items in repository on 2019-05-27'])
-        ir_ramp_data = ramp_data[(ramp_data['index'] == pc_index) & (ramp_data['citableContent'] == 'Yes') & (ramp_data['clicks'] > 0)].copy()
         """
-        Deduplicate item URLs. A more detailed definition of what an "item"
-        is in this context is included in the data table definitions
-        for the output file. See "RAMP_summary_stats_documentation.md."
+        This long "for" loop collects RAMP summary statistics for each IR included in the IR_base_info.csv file.
+        Variables are defined in the data table definitions for the output file described in 
+        "RAMP_summary_stats_documentation.md." See Python pandas documentation for more information about
+        statistical functions.
         """
-        ir_ramp_data = construct_html_urls(ir_ramp_data, r['Platform'])
-        # Uncomment the next line to output raw RAMP data
-        # for each IR in the subset.
-        # ir_ramp_data.to_csv(results_dir + ir + "_ramp_data.csv", index=False)
-        countCcdUrls = len(pd.unique(ir_ramp_data['url']))
-        countItemUrls = len(pd.unique(ir_ramp_data['html_url']))
-        countItemUris = len(pd.unique(ir_ramp_data['unique_item_uri']))
-        useRatio = round(countItemUris / countItems, 2)
-        sumCcd = ir_ramp_data['clicks'].sum()
-        ccdAgg = ir_ramp_data.groupby('url').agg({'clicks': 'sum'})
-        ccdAggSum = ccdAgg['clicks'].sum()
-        ccdAggDesc = ccdAgg.describe()
-        ccdAggCount = ccdAggDesc.loc['count'][0]
-        ccdAggMean = ccdAggDesc.loc['mean'][0]
-        ccdAggStd = ccdAggDesc.loc['std'][0]
-        ccdAggMin = ccdAggDesc.loc['min'][0]
-        ccdAgg25 = ccdAggDesc.loc['25%'][0]
-        ccdAgg50 = ccdAggDesc.loc['50%'][0]
-        ccdAgg75 = ccdAggDesc.loc['75%'][0]
-        ccdAggMax = ccdAggDesc.loc['max'][0]
-        itemAgg = ir_ramp_data.groupby('unique_item_uri').agg({'clicks': 'sum'})
-        itemAggSum = itemAgg['clicks'].sum()
-        itemAggDesc = itemAgg.describe()
-        itemAggCount = itemAggDesc.loc['count'][0]
-        itemAggMean = itemAggDesc.loc['mean'][0]
-        itemAggStd = itemAggDesc.loc['std'][0]
-        itemAggMin = itemAggDesc.loc['min'][0]
-        itemAgg25 = itemAggDesc.loc['25%'][0]
-        itemAgg50 = itemAggDesc.loc['50%'][0]
-        itemAgg75 = itemAggDesc.loc['75%'][0]
-        itemAggMax = itemAggDesc.loc['max'][0]
-        serp1Df = ir_ramp_data[ir_ramp_data['position'] <= 10]
-        serp1 = len(serp1Df)
-        serp1CcdSum = serp1Df['clicks'].sum()
-        serp100Df = ir_ramp_data[ir_ramp_data['position'] <= 1000]
-        serp100 = len(serp100Df)
-        serp100CcdSum = serp100Df['clicks'].sum()
-        irCountry = r['Country']
-        irType = r['Type']
-        irPlat = r['Platform']
-        normIrPlat = r['Normalized_Platform']
-        ctMethod = r['Item Count Method']
-        ctEtd = r['ETD on 2019-06-07']
-        # Some IR don't have ETD
-        pctEtd = 0
-        if ctEtd == '.':
-            pctEtd = '.'
+        for i, r in ir_info.iterrows():
+            if r['ir_page_click_index'] in normalize_failed and r['ir_page_click_index'] not in ramp_stats:
+                continue
+            try:
+                ir_key = r['ir_index_root'] if window is None else window + '/' + r['ir_index_root']
+                with report.stage('ir', ir=ir_key) as ir_stage:
+                    ir = r['ir_index_root']
+                    pc_index = r['ir_page_click_index']
+                    ai_index = r['ir_access_info_index']
+                    inst = r['Institution']
+                    repoName = r['Repository Name']
+                    rURL = r['URL']
+                    countItems = int(r['Items in repository on 2019-05-27'])
+                    """
+                    The RAMP statistics for every IR are computed together before this loop
+                    by summarize_url_clicks. Item URLs are deduplicated there. A more detailed
+                    definition of what an "item" is in this context is included in the data table
+                    definitions for the output file. See "RAMP_summary_stats_documentation.md."
+                    """
+                    ir_stats = ramp_stats[pc_index]
+                    countCcdUrls = ir_stats['countCcdUrls']
+                    ir_stage['rows'] = countCcdUrls
+                    countItemUrls = ir_stats['countItemUrls']
+                    countItemUris = ir_stats['countItemUris']
+                    useRatio = round(countItemUris / countItems, 2)
+                    sumCcd = ir_stats['sumCcd']
+                    ccdAggSum = ir_stats['ccdAggSum']
+                    ccdAggCount = ir_stats['ccdAggCount']
+                    ccdAggMean = ir_stats['ccdAggMean']
+                    ccdAggStd = ir_stats['ccdAggStd']
+                    ccdAggMin = ir_stats['ccdAggMin']
+                    ccdAgg25 = ir_stats['ccdAgg25']
+                    ccdAgg50 = ir_stats['ccdAgg50']
+                    ccdAgg75 = ir_stats['ccdAgg75']
+                    ccdAggMax = ir_stats['ccdAggMax']
+                    itemAggSum = ir_stats['itemAggSum']
+                    itemAggCount = ir_stats['itemAggCount']
+                    itemAggMean = ir_stats['itemAggMean']
+                    itemAggStd = ir_stats['itemAggStd']
+                    itemAggMin = ir_stats['itemAggMin']
+                    itemAgg25 = ir_stats['itemAgg25']
+                    itemAgg50 = ir_stats['itemAgg50']
+                    itemAgg75 = ir_stats['itemAgg75']
+                    itemAggMax = ir_stats['itemAggMax']
+                    itemTop1Share = ir_stats['itemTop1Share']
+                    itemTop10Share = ir_stats['itemTop10Share']
+                    itemGini = ir_stats['itemGini']
+                    serp1 = ir_stats['serp1']
+                    serp1CcdSum = ir_stats['serp1CcdSum']
+                    serp100 = ir_stats['serp100']
+                    serp100CcdSum = ir_stats['serp100CcdSum']
+                    irCountry = r['Country']
+                    irType = r['Type']
+                    irPlat = r['Platform']
+                    normIrPlat = r['Normalized_Platform']
+                    ctMethod = r['Item Count Method']
+                    ctEtd = r['ETD on 2019-06-07']
+                    # Some IR don't have ETD
+                    pctEtd = 0
+                    if ctEtd == '.':
+                        pctEtd = '.'
+                    else:
+                        pctEtd = round(int(ctEtd) / countItems, 2)
+                    gsSO = r['GS site operator 2019-06-07']
+                    results.add([ir, pc_index, ai_index, inst, repoName, rURL, countItems, countCcdUrls, countItemUrls,
+                                 countItemUris, useRatio, sumCcd, ccdAggSum, ccdAggCount, ccdAggMean, ccdAggStd, ccdAggMin, ccdAgg25,
+                                 ccdAgg50, ccdAgg75, ccdAggMax, itemAggSum, itemAggCount, itemAggMean, itemAggStd,
+                                 itemAggMin, itemAgg25, itemAgg50, itemAgg75, itemAggMax, itemTop1Share,
+                                 itemTop10Share, itemGini,
+                                 serp1, serp1CcdSum, serp100, serp100CcdSum, irCountry, irType,
+                                 irPlat, normIrPlat, ctMethod, ctEtd, pctEtd, gsSO])
+            except Exception as e:
+                print(r['ir_index_root'])
+                print(e)
+                report.errors.append(error_record('ir', e, ir=r['ir_index_root'], pc_index=r['ir_page_click_index'],
+                                                  window=window))
+
+        # Make the output data frame once, from all of the rows.
+        with report.stage('output', rows=len(results)):
+            outDf = results.to_frame()
+            write_results(outDf, results_dir + out_name, output_formats)
+
+            # Write the most clicked items and URLs of each IR.
+            if window_top[window] is not None:
+                top = window_top[window].rename(columns={'index': 'pc_index'})
+                top.insert(0, 'ir', top['pc_index'].map(ir_info.set_index('ir_page_click_index')['ir_index_root']))
+                top.to_csv(results_dir + 'RAMP_top_items_' + (window + '_' if window else '') + str(fname_date) + '.csv',
+                           index=False)
+
+    # Check that the inferred item URLs and OAI-PMH identifiers resolve, with a few
+    # requests to each IR at a time.
+    if resolve_items:
+        with report.stage('resolve') as stage:
+            targets = pd.concat([item_targets(url_clicks, normalizers, url_cache)
+                                 for url_clicks in window_clicks.values()]).drop_duplicates()
+            resolve_cache = ResolveCache(resolve_cache_path)
+            resolved = targets.merge(resolve(targets['html_url'], resolve_cache),
+                                     how='left', left_on='html_url', right_on='target').drop(columns=['target'])
+            resolve_cache.save()
+            resolved.to_csv(results_dir + 'RAMP_item_resolution_' + str(fname_date) + '.csv', index=False)
+            stage['rows'] = len(resolved)
+        print(resolved['status'].value_counts().to_string())
+
+    # Sum clicks and impressions in the country-device files by IR, country, device and
+    # global region, reading the files in chunks. Country codes are matched to regions
+    # through an index of the lowercase codes in the "north_south.csv" lookup table.
+    with report.stage('access') as stage:
+        access_data_files = find_ramp_files(ramp_data_dir, '*country-device*')
+        country_codes = read_country_codes(country_codes_dir + 'north_south.csv')
+        if store_path:
+            access_counts = query_access_counts(store)
         else:
-            pctEtd = round(int(ctEtd) / countItems, 2)
-        gsSO = r['GS site operator 2019-06-07']
-        tdf = pd.DataFrame([[ir, pc_index, ai_index, inst, repoName, rURL, countItems, countCcdUrls, countItemUrls,
-                             countItemUris, useRatio, sumCcd, ccdAggSum, ccdAggCount, ccdAggMean, ccdAggStd, ccdAggMin, ccdAgg25,
-                             ccdAgg50, ccdAgg75, ccdAggMax, itemAggSum, itemAggCount, itemAggMean, itemAggStd,
-                             itemAggMin, itemAgg25, itemAgg50, itemAgg75, itemAggMax,
-                             serp1, serp1CcdSum, serp100, serp100CcdSum, irCountry, irType,
-                             irPlat, normIrPlat, ctMethod, ctEtd, pctEtd, gsSO]], columns=cols)
-        outDf = outDf.append(tdf)
-    except Exception as e:
-        print(r['ir_index_root'])
-        print(e)
-
-outDf.to_csv(results_dir + "RAMP_summary_stats_" + str(fname_date) + ".csv", index=False)
-
-print("Done. The output file, 'RAMP_summary_stats_" + str(fname_date) + ".csv' is in the 'results' directory.")
+            access_counts = stream_country_device(access_data_files, chunk_size or 1000000, cache_dir)
+        if rerun_irs:
+            # The tables, like the summary statistics, only include the rerun IR.
+            access_counts = access_counts[access_counts.index.get_level_values('index')
+                                          .isin(ir_info['ir_access_info_index'])]
+        unmatched = unmatched_countries(access_counts, country_codes)
+        if unmatched:
+            print('Country codes not in north_south.csv (left out of all tables but the IR table): ' +
+                  ', '.join(unmatched))
+        write_access_tables(summarize_country_device(access_counts, country_codes), results_dir, fname_date)
+        stage['rows'] = int(access_counts['rows'].sum())
+
+    # Save the run report next to the output file.
+    report.info.update({'page_click_files': len(click_data_files), 'country_device_files': len(access_data_files),
+                        'chunk_size': chunk_size, 'workers': workers, 'cache_dir': cache_dir,
+                        'partials_dir': partials_dir, 'url_cache_hit_rate': url_cache.hit_rate(),
+                        'date_windows': date_windows, 'store_path': store_path,
+                        'output_formats': output_formats, 'rerun_irs': rerun_irs,
+                        'resolve_items': resolve_items, 'top_items': top_items})
+    report.save(results_dir + 'RAMP_summary_stats_' + str(fname_date) + '_run_report.json')
+    print(report.summary())
+
+    print("Done. The output files, 'RAMP_summary_stats_*" + str(fname_date) + ".csv' and the "
+          "'RAMP_country_device_*_" + str(fname_date) + ".csv' tables, are in the 'results' directory.")
+
+    # Make failures visible: save the error records and exit with a non-zero status.
+    if report.errors:
+        report.save_errors(errors_path)
+        print(str(len(report.errors)) + ' errors; IR and files with errors are missing from the output. See ' +
+              errors_path + '.')
+        sys.exit(1)
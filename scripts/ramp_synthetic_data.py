@@ -0,0 +1,328 @@
+"""Generate synthetic RAMP data files for testing and benchmarking
+
+GitHub repository URL: <https://github.com/imls-measuring-up/ramp-analyses-scripts>
+
+The RAMP data subset published at Dryad (<https://doi.org/10.5061/dryad.fbg79cnr0>)
+is several gigabytes, which makes it impractical for quick tests. The functions in
+this module write monthly page-click and country-device CSV files with the same file
+names and columns as the Dryad files, for the IR listed in "RAMP_IR_base_info.csv,"
+at any scale.
+
+Content file URLs have the shapes the URL normalizers expect for each IR's platform:
+DSpace bitstreams (with or without "xmlui," "jspui" or "dspace" in the path), EPrints
+and Fedora PDF paths with numeric item IDs, Northeastern "neu:" file paths, and bepress
+Digital Commons "viewcontent.cgi" URLs with 'article' and 'context' parameters. Some
+URLs use http instead of https, and some rows are item pages that aren't citable
+content. Clicks per URL follow a long-tailed (Zipf) distribution, as in the real data.
+The same seed always produces the same files.
+
+Country-device files use the lowercase ISO 3166 three letter country codes found in
+the RAMP data, taken from "north_south.csv" in the "country_codes" directory, plus a
+few codes that aren't in that file.
+
+Run this module as a script to write a synthetic data set, e.g.
+
+    python ramp_synthetic_data.py --out-dir ../synthetic_data/ --months 5 --rows 1000000
+
+Dependencies:
+
+Python modules pandas and numpy, available from <https://pandas.pydata.org/> and
+<https://numpy.org/>, and the "ramp_cache" module included in the same directory.
+
+"""
+
+
+import os
+
+import argparse
+
+import calendar
+
+import numpy as np
+
+import pandas as pd
+
+from urllib.parse import urlparse
+
+from ramp_cache import RAMP_SCHEMAS
+
+
+# Content file URL templates by IR platform. Each DSpace IR uses one of the DSpace
+# templates, chosen from its base URL.
+URL_TEMPLATES = {
+    'DSpace': {
+        'xmlui': '{host}/xmlui/bitstream/handle/{prefix}/{item}/{name}.pdf?sequence=1&isAllowed=y',
+        'jspui': '{host}/jspui/bitstream/{prefix}/{item}/{file}/{name}.pdf',
+        'dspace': '{host}/dspace/bitstream/handle/{prefix}/{item}/{name}.pdf',
+        'plain': '{host}/bitstream/handle/{prefix}/{item}/{name}.pdf?sequence={file}',
+    },
+    'EPrints 3': '{host}/{item}/{file}/{name}.pdf',
+    'Fedora': '{host}/rutgers-lib/{item}/PDF/{file}/play/',
+    'Fedora/Samvera': '{host}/files/neu:{item_id}/{name}.pdf',
+    'Digital Commons': '{host}/cgi/viewcontent.cgi?article={article:04d}&context={context}',
+}
+
+# Item page URL templates, used for rows that aren't citable content.
+PAGE_TEMPLATES = {
+    'DSpace': '{host}/handle/{prefix}/{item}',
+    'EPrints 3': '{host}/{item}/',
+    'Fedora': '{host}/rutgers-lib/{item}/',
+    'Fedora/Samvera': '{host}/files/neu:{item_id}',
+    'Digital Commons': '{host}/{context}/{article}/',
+}
+
+# Digital Commons publication names used for the 'context' URL parameter.
+BEPRESS_CONTEXTS = ['etd', 'faculty_pubs', 'theses', 'honors', 'articles']
+
+# Devices reported in the RAMP country-device data, and their share of rows.
+DEVICES = {'DESKTOP': 0.6, 'MOBILE': 0.35, 'TABLET': 0.05}
+
+# Country codes that occur in RAMP data but not in "north_south.csv."
+UNKNOWN_COUNTRIES = ['zzz', 'xkk']
+
+
+def zipf_weights(n, s=1.1):
+    """Return normalized Zipf weights for n ranks, used to make a few URLs
+       and countries much more popular than the rest."""
+
+    w = 1 / np.arange(1, n + 1) ** s
+    return w / w.sum()
+
+
+def dspace_style(base_url):
+    """Return the DSpace URL template name for an IR, based on its base URL."""
+
+    for style in ['xmlui', 'jspui', 'dspace']:
+        if style in base_url:
+            return style
+    return 'plain'
+
+
+def make_url_catalog(ir_info, items_per_ir=1000, seed=0):
+    """Make the content file and item page URLs of a synthetic IR collection.
+
+    Parameters
+    ----------
+
+    ir_info:
+        A pandas data frame read from "RAMP_IR_base_info.csv."
+    items_per_ir:
+        The number of items in each IR. Each item has one to three content files.
+    seed:
+        The random seed.
+
+    Returns
+    -------
+
+    catalog:
+        A data frame with 'index', 'url' and 'citableContent' columns, one row
+        per URL. URLs of IR with unknown platforms are item pages only.
+
+    """
+
+    rng = np.random.default_rng(seed)
+    rows = []
+    for i, r in ir_info.iterrows():
+        platform = r['Platform']
+        p = urlparse(r['URL'])
+        host = 'https://' + p.netloc
+        template = URL_TEMPLATES.get(platform)
+        if platform == 'DSpace':
+            template = template[dspace_style(r['URL'])]
+        prefix = str(rng.integers(1, 99999))
+        context = BEPRESS_CONTEXTS[i % len(BEPRESS_CONTEXTS)]
+        files = rng.integers(1, 4, items_per_ir)
+        for n in range(items_per_ir):
+            item = 1000 + n
+            values = {'host': host, 'prefix': prefix, 'item': item, 'item_id': np.base_repr(item * 7919, 36).lower(),
+                      'article': item, 'context': context}
+            page = PAGE_TEMPLATES.get(platform, '{host}/items/{item}').format(**values)
+            rows.append((r['ir_page_click_index'], page, 'No'))
+            if template is None:
+                continue
+            for f in range(1, files[n] + 1):
+                url = template.format(file=f, name='file' + str(f), **values)
+                # Some URLs are reported with http, which the item URIs deduplicate.
+                if rng.random() < 0.1:
+                    url = url.replace('https://', 'http://', 1)
+                rows.append((r['ir_page_click_index'], url, 'Yes'))
+                # Digital Commons has one content file per article.
+                if platform == 'Digital Commons':
+                    break
+    return pd.DataFrame(rows, columns=['index', 'url', 'citableContent'])
+
+
+def month_dates(month, n, rng):
+    """Return n random dates ('YYYY-MM-DD' strings) in a month ('YYYY-MM')."""
+
+    year, m = [int(x) for x in month.split('-')]
+    days = rng.integers(1, calendar.monthrange(year, m)[1] + 1, n)
+    return pd.Series(days).map(lambda d: month + '-' + str(d).zfill(2)).values
+
+
+def performance_columns(n, rng):
+    """Return random clicks, impressions, CTR and position columns for n rows.
+       About a third of the rows have no clicks, as in the RAMP data."""
+
+    impressions = rng.geometric(0.15, n)
+    clicks = rng.binomial(impressions, 0.12)
+    return {'clicks': clicks, 'impressions': impressions,
+            'ctr': np.round(clicks / impressions, 4),
+            'position': np.round(1 + rng.lognormal(1.5, 1.3, n), 2)}
+
+
+def make_page_clicks(catalog, n_rows, month, seed=0):
+    """Make a month of synthetic page-click data.
+
+    Parameters
+    ----------
+
+    catalog:
+        A data frame returned by make_url_catalog.
+    n_rows:
+        The number of rows.
+    month:
+        The month, e.g. '2019-01'.
+    seed:
+        The random seed.
+
+    Returns
+    -------
+
+    ramp_data:
+        A data frame with the columns of the RAMP page-click files.
+
+    """
+
+    rng = np.random.default_rng(seed)
+    # Shuffle the URLs before assigning Zipf weights so popular URLs are spread
+    # over all IR.
+    order = rng.permutation(len(catalog))
+    urls = catalog.iloc[order[rng.choice(len(catalog), n_rows, p=zipf_weights(len(catalog)))]]
+    columns = {'url': urls['url'].values, 'index': urls['index'].values,
+               'date': month_dates(month, n_rows, rng),
+               'citableContent': urls['citableContent'].values}
+    columns.update(performance_columns(n_rows, rng))
+    return pd.DataFrame(columns)[list(RAMP_SCHEMAS['*page-clicks*'])]
+
+
+def make_country_device(ir_info, countries, n_rows, month, seed=0):
+    """Make a month of synthetic country-device data.
+
+    Parameters
+    ----------
+
+    ir_info:
+        A pandas data frame read from "RAMP_IR_base_info.csv."
+    countries:
+        A list of lowercase three letter country codes, most common first.
+    n_rows:
+        The number of rows.
+    month:
+        The month, e.g. '2019-01'.
+    seed:
+        The random seed.
+
+    Returns
+    -------
+
+    access_data:
+        A data frame with the columns of the RAMP country-device files.
+
+    """
+
+    rng = np.random.default_rng(seed)
+    countries = np.array(countries)
+    columns = {'country': countries[rng.choice(len(countries), n_rows, p=zipf_weights(len(countries)))],
+               'device': rng.choice(list(DEVICES), n_rows, p=list(DEVICES.values())),
+               'index': rng.choice(ir_info['ir_access_info_index'].values, n_rows),
+               'date': month_dates(month, n_rows, rng)}
+    columns.update(performance_columns(n_rows, rng))
+    return pd.DataFrame(columns)[list(RAMP_SCHEMAS['*country-device*'])]
+
+
+def read_country_codes(path, seed=0):
+    """Read the country codes from "north_south.csv," lowercased as in the RAMP
+       data, in a random order of popularity, plus a few unknown codes."""
+
+    codes = pd.read_csv(path, encoding='latin-1')['Countryabbre'].str.lower()
+    codes = list(codes.sample(frac=1, random_state=seed))
+    # Put the USA first, since most RAMP IR are in the USA.
+    codes.remove('usa')
+    return ['usa'] + codes + UNKNOWN_COUNTRIES
+
+
+def write_synthetic_subset(out_dir, ir_info, country_codes_path, months=None, page_click_rows=100000,
+                           country_device_rows=20000, items_per_ir=1000, seed=0, chunk_size=1000000):
+    """Write a synthetic RAMP data subset, one page-click and one country-device
+       file per month, named like the files published at Dryad.
+
+    Parameters
+    ----------
+
+    out_dir:
+        The directory to write the files to. It is created if it doesn't exist.
+    ir_info:
+        A pandas data frame read from "RAMP_IR_base_info.csv."
+    country_codes_path:
+        The path of "north_south.csv."
+    months:
+        A list of months, e.g. ['2019-01', '2019-02']. Defaults to January - May 2019.
+    page_click_rows:
+        The number of page-click rows per month.
+    country_device_rows:
+        The number of country-device rows per month.
+    items_per_ir:
+        The number of items in each synthetic IR.
+    seed:
+        The random seed.
+    chunk_size:
+        The number of rows to generate and write at a time.
+
+    Returns
+    -------
+
+    files:
+        A list of the paths of the files written.
+
+    """
+
+    if months is None:
+        months = ['2019-0' + str(m) for m in range(1, 6)]
+    os.makedirs(out_dir, exist_ok=True)
+    catalog = make_url_catalog(ir_info, items_per_ir, seed)
+    countries = read_country_codes(country_codes_path, seed)
+
+    files = []
+    for m, month in enumerate(months):
+        outputs = [(month + '_RAMP_subset_page-clicks_v2.csv', page_click_rows,
+                    lambda n, s: make_page_clicks(catalog, n, month, s)),
+                   (month + '_RAMP_subset_country-device-info.csv', country_device_rows,
+                    lambda n, s: make_country_device(ir_info, countries, n, month, s))]
+        for k, (file_name, n_rows, make) in enumerate(outputs):
+            path = os.path.join(out_dir, file_name)
+            for c, start in enumerate(range(0, max(n_rows, 1), chunk_size)):
+                n = min(chunk_size, n_rows - start)
+                chunk = make(n, [seed, m, k, c])
+                chunk.to_csv(path, mode='w' if c == 0 else 'a', header=c == 0, index=False)
+            files.append(path)
+    return files
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write a synthetic RAMP data subset.')
+    parser.add_argument('--out-dir', default='../synthetic_data/', help='directory to write the files to')
+    parser.add_argument('--ir-info', default='../ir_data/RAMP_IR_base_info.csv', help='path of RAMP_IR_base_info.csv')
+    parser.add_argument('--country-codes', default='../country_codes/north_south.csv', help='path of north_south.csv')
+    parser.add_argument('--months', type=int, default=5, help='number of months, starting with 2019-01')
+    parser.add_argument('--rows', type=int, default=100000, help='page-click rows per month')
+    parser.add_argument('--country-device-rows', type=int, default=20000, help='country-device rows per month')
+    parser.add_argument('--items', type=int, default=1000, help='items per IR')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    args = parser.parse_args()
+
+    months = [str(2019 + m // 12) + '-' + str(m % 12 + 1).zfill(2) for m in range(args.months)]
+    files = write_synthetic_subset(args.out_dir, pd.read_csv(args.ir_info), args.country_codes, months,
+                                   args.rows, args.country_device_rows, args.items, args.seed)
+    for f in files:
+        print('Wrote ' + f)
@@ -0,0 +1,160 @@
+"""Compute RAMP summary statistics for several date windows in one pass
+
+GitHub repository URL: <https://github.com/imls-measuring-up/ramp-analyses-scripts>
+
+"ramp_summary_stats_normalize_urls.py" computes its statistics for all of the page-click
+data it reads, January 1 - May 31, 2019 for the RAMP subset at Dryad. The functions in
+this module compute the same statistics for several date windows, e.g. each month, each
+quarter, or rolling three month windows, without reading the page-click files once per
+window.
+
+The start and end dates of all windows split the calendar into segments, such that every
+window is a run of whole segments. While the files are read, each row is assigned to its
+segment by its 'date', and clicks are summed per segment, IR and URL rather than per IR
+and URL only (see aggregate_url_clicks in "ramp_aggregate"). The per-URL sums of a window
+are then the sums of its segments. Monthly and quarterly windows have one segment per
+month, so overlapping windows don't multiply the work done while reading the files.
+
+Dependencies:
+
+Python modules pandas and numpy, available from <https://pandas.pydata.org/> and
+<https://numpy.org/>.
+
+"""
+
+
+import numpy as np
+
+import pandas as pd
+
+
+def calendar_windows(start, end, months=1, step=None):
+    """Make date windows of whole calendar months.
+
+    Parameters
+    ----------
+
+    start, end:
+        The first and last day of the period covered, e.g. '2019-01-01' and
+        '2019-05-31'. Only months that lie within the period are used.
+    months:
+        The length of each window in months, e.g. 1 for monthly and 3 for
+        quarterly windows.
+    step:
+        The number of months between the starts of consecutive windows. Defaults
+        to months; use e.g. months=3, step=1 for rolling three month windows.
+
+    Returns
+    -------
+
+    windows:
+        A dictionary mapping window names, e.g. '2019-01' or '2019-01_2019-03',
+        to (first day, last day) pairs of pandas timestamps.
+
+    """
+
+    step = step or months
+    first = pd.Timestamp(start).to_period('M')
+    if pd.Timestamp(start) != first.start_time:
+        first += 1
+    last = pd.Timestamp(end).to_period('M')
+    if pd.Timestamp(end).normalize() != last.end_time.normalize():
+        last -= 1
+    windows = {}
+    period = first
+    while period + (months - 1) <= last:
+        final = period + (months - 1)
+        name = str(period) if months == 1 else str(period) + '_' + str(final)
+        windows[name] = (period.start_time, final.end_time.normalize())
+        period += step
+    return windows
+
+
+def window_bounds(windows):
+    """Return the boundaries of the segments the date windows are made of: a
+       sorted numpy datetime64 array of the first day of each window and the
+       day after the last day of each window."""
+
+    edges = set()
+    for start, end in windows.values():
+        edges.update([pd.Timestamp(start), pd.Timestamp(end) + pd.Timedelta(days=1)])
+    return np.array(sorted(edges), dtype='datetime64[ns]')
+
+
+def date_segments(dates, bounds):
+    """Assign dates to the segments between window boundaries.
+
+    Parameters
+    ----------
+
+    dates:
+        A pandas series of dates, e.g. the 'date' column of RAMP page-click data,
+        as strings, categoricals or datetimes.
+    bounds:
+        A numpy array of boundaries, as returned by window_bounds.
+
+    Returns
+    -------
+
+    segments:
+        A numpy array of segment numbers: segment i is the days from bounds[i]
+        up to (not including) bounds[i + 1]. Dates that are missing or outside
+        of all segments get -1.
+
+    """
+
+    if isinstance(dates.dtype, pd.CategoricalDtype):
+        # Only the categories have to be parsed and looked up.
+        category_segments = date_segments(pd.Series(dates.cat.categories), bounds)
+        codes = dates.cat.codes.to_numpy()
+        return np.where(codes >= 0, category_segments[codes], -1)
+    values = pd.to_datetime(dates).to_numpy(dtype='datetime64[ns]')
+    segments = np.searchsorted(bounds, values, side='right') - 1
+    segments[(segments >= len(bounds) - 1) | np.isnat(values)] = -1
+    return segments
+
+
+def window_segments(windows, bounds):
+    """Return a dictionary mapping window names to numpy arrays of the numbers
+       of the segments each window is made of."""
+
+    segments = {}
+    for name, (start, end) in windows.items():
+        first = np.searchsorted(bounds, np.datetime64(pd.Timestamp(start), 'ns'))
+        after = np.searchsorted(bounds, np.datetime64(pd.Timestamp(end) + pd.Timedelta(days=1), 'ns'))
+        segments[name] = np.arange(first, after)
+    return segments
+
+
+def window_url_clicks(segment_clicks, windows, bounds=None):
+    """Combine per-segment, per-URL sums into the per-URL sums of each window.
+
+    Parameters
+    ----------
+
+    segment_clicks:
+        A pandas data frame of per-URL sums indexed by segment, RAMP page-click
+        index and URL, e.g. returned by load_url_clicks with window boundaries.
+    windows:
+        A dictionary mapping window names to (first day, last day) pairs.
+    bounds:
+        The boundaries the segments were made with. Defaults to
+        window_bounds(windows).
+
+    Returns
+    -------
+
+    url_clicks:
+        A dictionary mapping window names to data frames of per-URL sums indexed
+        by RAMP page-click index and URL, as returned by merge_url_clicks.
+
+    """
+
+    if bounds is None:
+        bounds = window_bounds(windows)
+    segments = segment_clicks.index.get_level_values('segment')
+    url_clicks = {}
+    for name, window in window_segments(windows, bounds).items():
+        selected = segment_clicks[segments.isin(window)].droplevel('segment')
+        url_clicks[name] = selected.groupby(level=['index', 'url'], sort=False, observed=True).sum()
+    return url_clicks
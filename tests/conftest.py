@@ -0,0 +1,10 @@
+"""Make the modules in the 'scripts' directory importable by the tests, as they are
+when the scripts are run from that directory."""
+
+
+import os
+
+import sys
+
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
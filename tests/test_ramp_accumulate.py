@@ -0,0 +1,76 @@
+"""Check the per-IR statistics in "ramp_accumulate" against pandas' groupby."""
+
+
+import numpy as np
+
+import pandas as pd
+
+import pytest
+
+from ramp_accumulate import DESCRIBE_STATS, count_unique, describe_groups, sum_by_code, top_by_group
+
+
+def click_sums(n=20000, n_groups=7, seed=0):
+    # Skewed click sums, as in the RAMP data, with one IR that has a single value.
+    rng = np.random.default_rng(seed)
+    groups = np.array(['ir' + str(g) for g in rng.integers(0, n_groups, n)] + ['single'], dtype=object)
+    values = np.append(rng.zipf(1.7, n) % 100000, 42).astype(np.int64)
+    return groups, values
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_describe_groups_matches_pandas(seed):
+    groups, values = click_sums(seed=seed)
+    desc = describe_groups(groups, values)
+    series = pd.Series(values, index=pd.Index(groups, name='index'))
+    expected = series.groupby(level=0, sort=False).describe()
+    expected.insert(0, 'sum', series.groupby(level=0, sort=False).sum())
+    assert list(desc.columns) == DESCRIBE_STATS
+    # The standard deviation can differ from pandas in its last digit, but not on
+    # these values, which are summed in the same order.
+    pd.testing.assert_frame_equal(desc, expected[DESCRIBE_STATS], check_exact=True)
+
+
+def test_describe_groups_concentration():
+    groups, values = click_sums()
+    desc = describe_groups(groups, values, concentration=True)
+    for label, group in pd.Series(values).groupby(groups):
+        ordered = np.sort(group.to_numpy())
+        n, total = len(ordered), ordered.sum()
+        gini = np.abs(ordered[:, None] - ordered[None, :]).sum() / (2 * n * n * ordered.mean()) if n < 5000 else None
+        top10 = ordered[::-1][:int(np.ceil(n / 10))].sum() / total
+        top1 = ordered[::-1][:int(np.ceil(n / 100))].sum() / total
+        assert desc.loc[label, 'top10'] == pytest.approx(top10)
+        assert desc.loc[label, 'top1'] == pytest.approx(top1)
+        if gini is not None:
+            assert desc.loc[label, 'gini'] == pytest.approx(gini)
+    assert desc.loc['single', 'gini'] == 0
+
+
+def test_sum_by_code_and_count_unique_match_pandas():
+    rng = np.random.default_rng(3)
+    groups = rng.integers(0, 5, 10000)
+    codes = rng.integers(-1, 300, 10000)
+    values = rng.integers(1, 50, 10000)
+    frame = pd.DataFrame({'group': groups, 'code': codes, 'value': values})
+
+    sum_groups, sum_codes, sums = sum_by_code(groups, codes, values)
+    expected = frame[frame['code'] >= 0].groupby(['group', 'code'], sort=False)['value'].sum()
+    assert list(zip(sum_groups, sum_codes)) == list(expected.index)
+    assert (sums == expected.to_numpy()).all()
+
+    # Missing codes count as one value, as pd.unique counts missing values.
+    expected = frame.assign(code=frame['code'].where(frame['code'] >= 0)).groupby('group')['code'].agg(
+        lambda c: len(pd.unique(c)))
+    assert (count_unique(groups, codes, 5) == expected.to_numpy()).all()
+
+
+def test_top_by_group_matches_sort():
+    rng = np.random.default_rng(4)
+    groups = rng.integers(0, 6, 5000)
+    # Few distinct values, so there are many ties.
+    values = rng.integers(0, 20, 5000)
+    positions = top_by_group(groups, values, 7)
+    expected = pd.DataFrame({'group': groups, 'value': values, 'position': np.arange(len(groups))}).sort_values(
+        ['group', 'value', 'position'], ascending=[True, False, True]).groupby('group').head(7)
+    assert (positions == expected['position'].to_numpy()).all()
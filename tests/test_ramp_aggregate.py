@@ -0,0 +1,148 @@
+"""Check the per-IR statistics in "ramp_aggregate" against pandas computations on small
+page-click frames, and that an IR whose URLs can't be normalized doesn't stop the others."""
+
+
+import pandas as pd
+
+import pytest
+
+from ramp_aggregate import (ENCODED_COLS, aggregate_url_clicks, citable_clicks, describe_urls, encode_urls,
+                            merge_url_clicks, summarize_url_clicks)
+
+from ramp_normalize import (EPRINTS_FEDORA_ID, DSpaceNormalizer, ItemIdNormalizer, NormalizationCache,
+                            make_eprints_fedora_html_url, make_eprints_fedora_item_uri)
+
+
+PAGE_CLICKS = pd.DataFrame({
+    'url': ['https://a.edu/12/1/x.pdf', 'https://a.edu/12/2/y.pdf', 'https://a.edu/34/1/z.pdf',
+            'https://a.edu/12/1/x.pdf', 'https://b.edu/56/1/x.pdf', 'https://b.edu/78/1/x.pdf',
+            'https://c.edu/90/1/x.pdf', 'https://c.edu/91/1/x.pdf', 'https://a.edu/99/1/n.pdf'],
+    'index': ['a_page_clicks', 'a_page_clicks', 'a_page_clicks', 'a_page_clicks', 'b_page_clicks',
+              'b_page_clicks', 'c_page_clicks', 'c_page_clicks', 'a_page_clicks'],
+    'clicks': [3, 1, 6, 2, 5, 4, 7, 1, 9],
+    'position': [4.0, 15.0, 2000.0, 8.0, 1.0, None, 30.0, 3.0, 1.0],
+    'citableContent': ['Yes', 'Yes', 'Yes', 'Yes', 'Yes', 'Yes', 'Yes', 'Yes', 'No'],
+})
+
+EPRINTS = ItemIdNormalizer(EPRINTS_FEDORA_ID.pattern)
+
+
+class BrokenNormalizer(ItemIdNormalizer):
+    """A normalizer that fails on every URL."""
+
+    def __init__(self):
+        super().__init__(EPRINTS_FEDORA_ID.pattern)
+        self.key = 'broken'
+
+    def normalize(self, urls):
+        raise ValueError('cannot normalize')
+
+
+def url_clicks():
+    return aggregate_url_clicks(citable_clicks(PAGE_CLICKS))
+
+
+def test_encode_urls_records_normalizer_errors():
+    normalizers = {'a_page_clicks': EPRINTS, 'b_page_clicks': BrokenNormalizer(),
+                   'c_page_clicks': EPRINTS}
+    urls = url_clicks().reset_index()
+    with pytest.raises(ValueError):
+        encode_urls(urls, normalizers)
+
+    errors = []
+    encoded, dictionary = encode_urls(urls, normalizers, errors=errors)
+    assert [(e['stage'], e['pc_index'], e['normalizer'], e['error']) for e in errors] == \
+        [('normalize', 'b_page_clicks', 'broken', 'ValueError')]
+    assert list(encoded['index'].unique()) == ['a_page_clicks', 'c_page_clicks']
+    # The codes of the remaining rows still decode to their URLs and items.
+    kept = urls[urls['index'] != 'b_page_clicks']
+    assert list(dictionary['url'][encoded['url_code']]) == list(kept['url'])
+    assert list(dictionary['html_url'][encoded['html_code']]) == [u.rsplit('/', 2)[0] for u in kept['url']]
+
+
+def test_summarize_url_clicks_keeps_the_other_irs():
+    errors = []
+    normalizers = {'a_page_clicks': EPRINTS, 'b_page_clicks': BrokenNormalizer(),
+                   'c_page_clicks': EPRINTS}
+    stats = summarize_url_clicks(url_clicks(), normalizers, errors=errors)
+    assert len(errors) == 1 and errors[0]['pc_index'] == 'b_page_clicks'
+    assert list(stats.index) == ['a_page_clicks', 'c_page_clicks']
+
+    expected = summarize_url_clicks(url_clicks(), {'a_page_clicks': EPRINTS, 'c_page_clicks': EPRINTS})
+    pd.testing.assert_frame_equal(stats, expected)
+
+
+def reference_stats(ramp_data, pc_index):
+    # The statistics of one IR, computed as the original script did.
+    ir_ramp_data = ramp_data[(ramp_data['index'] == pc_index) & (ramp_data['citableContent'] == 'Yes') &
+                             (ramp_data['clicks'] > 0)].copy()
+    ir_ramp_data['html_url'] = ir_ramp_data['url'].map(make_eprints_fedora_html_url)
+    ir_ramp_data['unique_item_uri'] = ir_ramp_data['url'].map(make_eprints_fedora_item_uri)
+    stats = {'countCcdUrls': len(pd.unique(ir_ramp_data['url'])),
+             'countItemUrls': len(pd.unique(ir_ramp_data['html_url'])),
+             'countItemUris': len(pd.unique(ir_ramp_data['unique_item_uri'])),
+             'sumCcd': ir_ramp_data['clicks'].sum()}
+    for prefix, key in [('ccdAgg', 'url'), ('itemAgg', 'unique_item_uri')]:
+        agg = ir_ramp_data.groupby(key).agg({'clicks': 'sum'})
+        stats[prefix + 'Sum'] = agg['clicks'].sum()
+        desc = agg['clicks'].describe()
+        for stat, suffix in [('count', 'Count'), ('mean', 'Mean'), ('std', 'Std'), ('min', 'Min'),
+                             ('25%', '25'), ('50%', '50'), ('75%', '75'), ('max', 'Max')]:
+            stats[prefix + suffix] = desc[stat]
+    for serp, max_position in [('serp1', 10), ('serp100', 1000)]:
+        serp_data = ir_ramp_data[ir_ramp_data['position'] <= max_position]
+        stats[serp] = len(serp_data)
+        stats[serp + 'CcdSum'] = serp_data['clicks'].sum()
+    return stats
+
+
+def test_summarize_url_clicks_matches_pandas():
+    normalizers = {'a_page_clicks': EPRINTS, 'b_page_clicks': EPRINTS, 'c_page_clicks': EPRINTS,
+                   'd_page_clicks': EPRINTS}
+    # Clicks summed in two partial aggregates give the same statistics.
+    partials = [aggregate_url_clicks(citable_clicks(part)) for part in [PAGE_CLICKS[:4], PAGE_CLICKS[4:]]]
+    stats = summarize_url_clicks(merge_url_clicks(partials), normalizers)
+    assert list(stats.index) == list(normalizers)
+    for pc_index in ['a_page_clicks', 'b_page_clicks', 'c_page_clicks']:
+        expected = reference_stats(PAGE_CLICKS, pc_index)
+        row = stats.loc[pc_index, list(expected)]
+        assert row.to_numpy() == pytest.approx(list(expected.values()), rel=1e-12, nan_ok=True)
+    # IR without citable clicks get zero counts and sums.
+    assert stats.loc['d_page_clicks', ['countCcdUrls', 'sumCcd', 'serp100']].tolist() == [0, 0, 0]
+
+
+def test_encoded_counts_match_pandas():
+    urls = pd.DataFrame({
+        'index': ['a_page_clicks', 'a_page_clicks', 'a_page_clicks', 'a_page_clicks', 'b_page_clicks',
+                  'b_page_clicks', 'c_page_clicks', 'c_page_clicks', 'c_page_clicks'],
+        'url': ['https://a.edu/12/1/x.pdf', 'http://a.edu/12/2/y.pdf', 'https://a.edu/about', 'https://a.edu/help',
+                'https://a.edu/12/1/x.pdf', 'https://b.edu/56/1/x.pdf',
+                'https://c.edu/bitstream/handle/1/55/a.pdf', 'https://c.edu/bitstream/handle/1/55/b.pdf',
+                'https://c.edu/xmlui/bitstream/handle/1/66/a.pdf'],
+        'clicks': [3, 1, 6, 2, 5, 4, 7, 1, 9]})
+    for c in ['serp1', 'serp1CcdSum', 'serp100', 'serp100CcdSum']:
+        urls[c] = 0
+    # Two IR share a normalizer, so their URLs share codes.
+    normalizers = {'a_page_clicks': EPRINTS, 'b_page_clicks': EPRINTS, 'c_page_clicks': DSpaceNormalizer()}
+    for url_cache in [None, NormalizationCache()]:
+        encoded, dictionary = encode_urls(urls, normalizers, url_cache)
+        assert encoded.loc[0, 'url_code'] == encoded.loc[4, 'url_code']
+
+        # The codes decode to the URLs and to the normalizers' item URLs and URIs.
+        items = pd.concat([normalizers[i].normalize(u.reset_index(drop=True)).set_axis(u.index)
+                           for i, u in urls.groupby('index')['url']]).sort_index()
+        expected = pd.concat([urls[['index', 'url']], items], axis=1)
+        for col, code_col in ENCODED_COLS.items():
+            codes = encoded[code_col].to_numpy()
+            decoded = pd.Series(dictionary[col][codes], dtype=object).where(codes >= 0, None)
+            assert decoded.tolist() == expected[col].astype(object).where(expected[col].notna(), None).tolist()
+
+        # Missing item URLs and URIs count as one value, like pd.unique.
+        stats = describe_urls(encoded)
+        counts = expected.groupby('index')[['url', 'html_url', 'unique_item_uri']].nunique(dropna=False)
+        assert stats[['countCcdUrls', 'countItemUrls', 'countItemUris']].to_numpy().tolist() == \
+            counts.to_numpy().tolist()
+        # The item aggregates leave out URLs without an item, as groupby does.
+        item_sums = expected.assign(clicks=urls['clicks']).groupby(['index', 'unique_item_uri'])['clicks'].sum()
+        assert stats['itemAggCount'].tolist() == item_sums.groupby(level='index').size().tolist()
+        assert stats['itemAggMax'].tolist() == item_sums.groupby(level='index').max().tolist()
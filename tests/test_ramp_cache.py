@@ -0,0 +1,89 @@
+"""Check that the Parquet cache in "ramp_cache" gives back the data of the RAMP CSV files,
+is only rebuilt when their contents change, and remembers files it can't convert."""
+
+
+import os
+
+import json
+
+import pandas as pd
+
+import pytest
+
+import ramp_cache
+
+from ramp_cache import cache_paths, cached_file, is_cached, iter_cached, read_cached
+
+
+pytest.importorskip('pyarrow')
+
+
+ROWS = """url,index,clicks,impressions,ctr,date,position,citableContent
+https://a.edu/1.pdf,a_page_clicks,3,40,0.075,2019-01-01,4.5,Yes
+https://a.edu/2.pdf,a_page_clicks,{clicks},12,0.0,2019-01-02,12.0,No
+https://b.edu/1.pdf,b_page_clicks,1,2,0.5,2019-01-02,,Yes
+"""
+
+
+def write_file(tmp_path, clicks=0):
+    path = tmp_path / '2019-01_RAMP_subset_page-clicks_v2.csv'
+    path.write_text(ROWS.format(clicks=clicks))
+    return str(path)
+
+
+def test_cached_file_matches_csv(tmp_path):
+    path = write_file(tmp_path)
+    cache_dir = str(tmp_path / 'cache')
+    parquet_path = cached_file(path, cache_dir)
+    assert parquet_path == cache_paths(path, cache_dir)[0] and is_cached(path, cache_dir)
+
+    expected = pd.read_csv(path)
+    data = read_cached(parquet_path)
+    assert data['index'].dtype == 'category' and data['citableContent'].dtype == 'category'
+    assert data['clicks'].dtype == 'int64'
+    pd.testing.assert_frame_equal(data.astype({'index': object, 'citableContent': object}).astype(expected.dtypes),
+                                  expected)
+    chunks = list(iter_cached(parquet_path, ['url', 'clicks'], chunk_size=2))
+    assert [len(c) for c in chunks] == [2, 1]
+    assert pd.concat(chunks, ignore_index=True)['clicks'].tolist() == expected['clicks'].tolist()
+
+
+def test_cache_is_kept_for_unchanged_contents(tmp_path, monkeypatch):
+    path = write_file(tmp_path)
+    cache_dir = str(tmp_path / 'cache')
+    cached_file(path, cache_dir)
+    # A new modification time alone only costs a hash.
+    os.utime(path, (0, 0))
+    assert is_cached(path, cache_dir)
+    monkeypatch.setattr(ramp_cache, 'file_sha256', None)
+    assert is_cached(path, cache_dir)
+    monkeypatch.undo()
+
+    write_file(tmp_path, clicks=5)
+    assert not is_cached(path, cache_dir)
+    assert read_cached(cached_file(path, cache_dir))['clicks'].tolist() == [3, 5, 1]
+
+
+def test_failed_conversion_is_remembered(tmp_path, monkeypatch):
+    path = write_file(tmp_path, clicks='')
+    cache_dir = str(tmp_path / 'cache')
+    assert cached_file(path, cache_dir) is None
+    parquet_path, meta_path = cache_paths(path, cache_dir)
+    with open(meta_path) as f:
+        assert 'missing or fractional' in json.load(f)['error']
+    assert not os.path.exists(parquet_path) and not is_cached(path, cache_dir)
+
+    # Later runs go straight to the CSV file, without hashing or converting it.
+    def fail(*args, **kwargs):
+        raise AssertionError('the file was hashed or converted again')
+
+    monkeypatch.setattr(ramp_cache, 'file_sha256', fail)
+    monkeypatch.setattr(ramp_cache, 'write_cache', fail)
+    assert cached_file(path, cache_dir) is None
+    monkeypatch.undo()
+
+    # A fixed file is converted.
+    write_file(tmp_path, clicks=2)
+    assert cached_file(path, cache_dir) == parquet_path
+    with open(meta_path) as f:
+        assert 'error' not in json.load(f)
@@ -0,0 +1,91 @@
+"""Check the access tables of "ramp_country_device," computed from chunked sums, against
+pandas computations on the merged rows, as in the R script."""
+
+
+import pandas as pd
+
+import pytest
+
+from ramp_country_device import (ACCESS_TABLES, aggregate_country_device, read_country_codes,
+                                 stream_country_device, summarize_country_device, unmatched_countries)
+
+
+COUNTRY_CODES = pd.DataFrame({'Country': ['United States', 'Brazil', 'Germany', 'Åland Islands'],
+                              'Countryabbre': ['USA', 'BRA', 'DEU', 'ALA'], 'Location': [1, 0, 1, 1]})
+
+ACCESS_DATA = pd.DataFrame({
+    'country': ['usa', 'bra', 'usa', 'deu', 'zzz', 'usa', 'bra', 'ala', 'xkk'],
+    'device': ['DESKTOP', 'MOBILE', 'DESKTOP', 'TABLET', 'DESKTOP', 'MOBILE', 'DESKTOP', 'DESKTOP', 'MOBILE'],
+    'index': ['a_access_info', 'a_access_info', 'b_access_info', 'a_access_info', 'b_access_info',
+              'a_access_info', 'b_access_info', 'b_access_info', 'a_access_info'],
+    'clicks': [5, 2, 7, 1, 4, 3, 6, 2, 8],
+    'impressions': [50, 20, 70, 10, 40, 30, 60, 20, 80],
+    'ctr': [0.1] * 9,
+    'date': ['2019-01-01'] * 9,
+    'position': [1.0] * 9,
+})
+
+
+def write_files(tmp_path):
+    codes_path = str(tmp_path / 'north_south.csv')
+    COUNTRY_CODES.to_csv(codes_path, index=False, encoding='latin-1')
+    files = []
+    for month, part in [('2019-01', ACCESS_DATA[:4]), ('2019-02', ACCESS_DATA[4:])]:
+        files.append(str(tmp_path / (month + '_RAMP_subset_country-device-info.csv')))
+        part.to_csv(files[-1], index=False)
+    return codes_path, files
+
+
+def reference_tables(access_data):
+    # The R script merges every row with the lookup table (dropping unmatched
+    # countries) and then groups the merged rows.
+    lookup = COUNTRY_CODES.assign(country=COUNTRY_CODES['Countryabbre'].str.lower())[['country', 'Location']]
+    merged = access_data.merge(lookup, on='country')
+    tables = {}
+    for name, keys in ACCESS_TABLES.items():
+        rows = access_data if name == 'ir' else merged
+        table = rows.groupby(keys).agg(clicks=('clicks', 'sum'), impressions=('impressions', 'sum'),
+                                       rows=('clicks', 'size'))
+        if name == 'location_device':
+            table['percent'] = table['clicks'] / table.groupby(level='Location')['clicks'].transform('sum') * 100
+        else:
+            table['percent'] = table['clicks'] / table['clicks'].sum() * 100
+        tables[name] = table.reset_index()
+    return tables
+
+
+def flat(counts):
+    # The files are read with categorical text columns.
+    counts = counts.reset_index().astype({'index': object, 'country': object, 'device': object})
+    return counts.sort_values(['index', 'country', 'device'], ignore_index=True)
+
+
+def comparable(table, keys):
+    table = table.astype({k: object for k in keys if k != 'Location'}).astype({'rows': 'int64'})
+    if 'Location' in table:
+        table['Location'] = table['Location'].astype('int64')
+    return table.sort_values(keys, ignore_index=True)
+
+
+@pytest.mark.parametrize('chunk_size', [2, 100])
+def test_access_tables_match_pandas(tmp_path, chunk_size):
+    codes_path, files = write_files(tmp_path)
+    country_codes = read_country_codes(codes_path)
+    assert country_codes['ala'] == 1
+
+    counts = stream_country_device(files, chunk_size=chunk_size)
+    pd.testing.assert_frame_equal(flat(counts), flat(aggregate_country_device(ACCESS_DATA)))
+    assert unmatched_countries(counts, country_codes) == ['xkk', 'zzz']
+
+    tables = summarize_country_device(counts, country_codes)
+    expected = reference_tables(ACCESS_DATA)
+    for name, keys in ACCESS_TABLES.items():
+        table = tables[name]
+        assert table['clicks'].is_monotonic_decreasing, name
+        columns = keys + ['clicks', 'impressions', 'rows', 'percent']
+        pd.testing.assert_frame_equal(comparable(table[columns], keys), comparable(expected[name], keys),
+                                      check_dtype=False)
+    assert tables['country'].set_index('country')['Location'].to_dict() == {'usa': 1, 'bra': 0, 'deu': 1,
+                                                                           'ala': 1}
+    # The percent of the north/south by device tables adds up to 100 in each region.
+    assert tables['location_device'].groupby('Location')['percent'].sum().tolist() == pytest.approx([100, 100])
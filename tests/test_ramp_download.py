@@ -0,0 +1,138 @@
+"""Check "ramp_download" against a local stand-in for the Dryad server: skipping files that
+match their manifest record, resuming partial files and reporting failures."""
+
+
+import os
+
+import json
+
+import hashlib
+
+import threading
+
+import pytest
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ramp_download import MANIFEST_NAME, DownloadError, download_file, download_files, make_session
+
+
+CONTENT = bytes(range(256)) * 64
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Serve the server's files, answering Range requests like Dryad."""
+
+    def log_message(self, *args):
+        pass
+
+    def send_file(self, body):
+        data = self.server.files.get(self.path.lstrip('/'))
+        self.server.requests.append((self.command, self.path, self.headers.get('Range')))
+        if data is None:
+            self.send_response(500)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        start = 0
+        status = 200
+        ranged = self.headers.get('Range')
+        if ranged:
+            start = int(ranged[len('bytes='):].rstrip('-'))
+            if start >= len(data):
+                self.send_response(416)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            status = 206
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(data) - start))
+        self.end_headers()
+        if body:
+            self.wfile.write(data[start:])
+
+    def do_HEAD(self):
+        self.send_file(False)
+
+    def do_GET(self):
+        self.send_file(True)
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    server.files = {'a.csv': CONTENT}
+    server.requests = []
+    server.url = 'http://127.0.0.1:' + str(server.server_address[1]) + '/'
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_file_matching_its_manifest_is_skipped_offline(server, tmp_path):
+    files = {'a.csv': server.url + 'a.csv'}
+    assert download_files(files, str(tmp_path)) == {'a.csv': 'downloaded'}
+    assert (tmp_path / 'a.csv').read_bytes() == CONTENT
+    record = json.loads((tmp_path / MANIFEST_NAME).read_text())['a.csv']
+    assert record['sha256'] == hashlib.sha256(CONTENT).hexdigest()
+
+    # Stop the server: files matching the manifest must not need it.
+    server.shutdown()
+    server.server_close()
+    assert download_files(files, str(tmp_path)) == {'a.csv': 'skipped'}
+    # A new modification time only means the file is hashed again.
+    os.utime(tmp_path / 'a.csv', ns=(0, 0))
+    assert download_files(files, str(tmp_path)) == {'a.csv': 'skipped'}
+    assert json.loads((tmp_path / MANIFEST_NAME).read_text())['a.csv']['mtime_ns'] == 0
+
+
+def test_partial_file_is_resumed(server, tmp_path):
+    path = str(tmp_path / 'a.csv')
+    with open(path + '.part', 'wb') as f:
+        f.write(CONTENT[:1000])
+    with make_session() as session:
+        status, record = download_file(session, server.url + 'a.csv', path)
+    assert status == 'resumed'
+    assert ('GET', '/a.csv', 'bytes=1000-') in server.requests
+    assert open(path, 'rb').read() == CONTENT
+    assert record['sha256'] == hashlib.sha256(CONTENT).hexdigest()
+    assert not os.path.exists(path + '.part')
+
+
+def test_complete_partial_file_gets_416(server, tmp_path):
+    path = str(tmp_path / 'a.csv')
+    with open(path + '.part', 'wb') as f:
+        f.write(CONTENT)
+    with make_session() as session:
+        status, record = download_file(session, server.url + 'a.csv', path)
+    assert status == 'resumed'
+    assert ('GET', '/a.csv', 'bytes=' + str(len(CONTENT)) + '-') in server.requests
+    assert open(path, 'rb').read() == CONTENT
+
+
+def test_checksum_mismatch_downloads_again(server, tmp_path):
+    files = {'a.csv': server.url + 'a.csv'}
+    download_files(files, str(tmp_path))
+    # Corrupt the file without changing its size.
+    (tmp_path / 'a.csv').write_bytes(bytes(len(CONTENT)))
+    server.requests.clear()
+    assert download_files(files, str(tmp_path)) == {'a.csv': 'downloaded'}
+    assert [r[0] for r in server.requests] == ['HEAD', 'GET']
+    assert (tmp_path / 'a.csv').read_bytes() == CONTENT
+
+    # A file the server sends with the wrong hash isn't kept.
+    (tmp_path / 'a.csv').unlink()
+    results = download_files(files, str(tmp_path), checksums={'a.csv': '0' * 64})
+    assert isinstance(results['a.csv'], DownloadError)
+    assert not (tmp_path / 'a.csv').exists() and not (tmp_path / 'a.csv.part').exists()
+
+
+def test_server_failure_is_returned(server, tmp_path):
+    files = {'a.csv': server.url + 'a.csv', 'b.csv': server.url + 'b.csv'}
+    results = download_files(files, str(tmp_path))
+    assert results['a.csv'] == 'downloaded'
+    assert isinstance(results['b.csv'], Exception)
+    assert not (tmp_path / 'b.csv').exists()
+    assert list(json.loads((tmp_path / MANIFEST_NAME).read_text())) == ['a.csv']
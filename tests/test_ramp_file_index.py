@@ -0,0 +1,78 @@
+"""Check that reading single IR and dates through the side indexes of "ramp_file_index",
+as the summary script does when only some IR are rerun, gives the same rows and sums as
+pandas."""
+
+
+import os
+
+import pandas as pd
+
+from ramp_file_index import build_file_index, indexed_url_clicks, read_filtered
+
+
+# The rows of each IR and date are interleaved, so a partitioned copy is needed.
+PAGE_CLICKS = pd.DataFrame({
+    'url': ['https://a.edu/1.pdf', 'https://b.edu/1.pdf', 'https://a.edu/2.pdf', 'https://b.edu/2.pdf',
+            'https://a.edu/1.pdf', 'https://b.edu/1.pdf', 'https://c.edu/1.pdf'],
+    'index': ['a_page_clicks', 'b_page_clicks', 'a_page_clicks', 'b_page_clicks', 'a_page_clicks',
+              'b_page_clicks', 'c_page_clicks'],
+    'clicks': [1, 2, 3, 4, 5, 6, 7],
+    'impressions': [10, 20, 30, 40, 50, 60, 70],
+    'ctr': [0.1] * 7,
+    'date': ['2019-01-01', '2019-01-01', '2019-01-02', '2019-01-01', '2019-01-01', '2019-01-03', '2019-01-01'],
+    'position': [1.0, 12.0, 3.0, 1001.0, 2.0, 5.0, 9.0],
+    'citableContent': ['Yes', 'Yes', 'Yes', 'No', 'Yes', 'Yes', 'Yes'],
+})
+
+
+def write_file(tmp_path):
+    path = str(tmp_path / '2019-01_RAMP_subset_page-clicks_v2.csv')
+    # Leave out the last line break, which the partitioned copy has to add.
+    with open(path, 'w') as f:
+        f.write(PAGE_CLICKS.to_csv(index=False).rstrip('\n'))
+    return path
+
+
+def url_sums(data):
+    data = data[(data['citableContent'] == 'Yes') & (data['clicks'] > 0)]
+    data = data.assign(serp1=data['position'] <= 10, serp100=data['position'] <= 1000,
+                       serp1CcdSum=data['clicks'].where(data['position'] <= 10, 0),
+                       serp100CcdSum=data['clicks'].where(data['position'] <= 1000, 0))
+    return data.groupby(['index', 'url'], sort=False)[['clicks', 'serp1', 'serp1CcdSum', 'serp100',
+                                                       'serp100CcdSum']].sum().astype('int64')
+
+
+def flat(url_clicks):
+    # The module keeps the IR index as a categorical column.
+    url_clicks = url_clicks.reset_index().astype({'index': object, 'url': object})
+    return url_clicks.sort_values(['index', 'url'], ignore_index=True)
+
+
+def test_read_filtered_matches_pandas(tmp_path):
+    path = write_file(tmp_path)
+    index_dir = str(tmp_path / 'file_index')
+    saved = build_file_index(path, index_dir)
+    assert saved['data'].endswith('.partitioned')
+    assert sum(r[-1] for r in saved['ranges']) == len(PAGE_CLICKS)
+
+    rows = read_filtered(path, index_dir, ['b_page_clicks', 'c_page_clicks'], end='2019-01-02')
+    expected = PAGE_CLICKS[PAGE_CLICKS['index'].isin(['b_page_clicks', 'c_page_clicks']) &
+                           (PAGE_CLICKS['date'] <= '2019-01-02')]
+    assert sorted(rows['url'] + rows['date'].astype(str)) == sorted(expected['url'] + expected['date'])
+    assert rows['clicks'].sum() == expected['clicks'].sum()
+    assert len(read_filtered(path, index_dir)) == len(PAGE_CLICKS)
+
+
+def test_rerun_sums_match_pandas(tmp_path):
+    path = write_file(tmp_path)
+    index_dir = str(tmp_path / 'file_index')
+    url_clicks = indexed_url_clicks([path], index_dir, ['a_page_clicks', 'b_page_clicks'])
+    expected = url_sums(PAGE_CLICKS[PAGE_CLICKS['index'].isin(['a_page_clicks', 'b_page_clicks'])])
+    pd.testing.assert_frame_equal(flat(url_clicks), flat(expected))
+
+    # The index is rebuilt when the file changes.
+    with open(path, 'a') as f:
+        f.write('\nhttps://a.edu/3.pdf,a_page_clicks,8,80,0.1,2019-01-04,4.0,Yes\n')
+    os.utime(path, (0, 0))
+    url_clicks = indexed_url_clicks([path], index_dir, ['a_page_clicks'], start='2019-01-04')
+    assert url_clicks.reset_index()[['url', 'clicks']].values.tolist() == [['https://a.edu/3.pdf', 8]]
@@ -0,0 +1,99 @@
+"""Check that RAMP data files with missing or fractional counts can be read with the
+declared schema in "ramp_load_data," and that the per-URL sums of files read in chunks
+match pandas."""
+
+
+import numpy as np
+
+import pandas as pd
+
+from ramp_load_data import (iter_ramp_file, load_url_clicks, memory_report, read_ramp_file, read_url_clicks,
+                            stream_url_clicks)
+
+
+ROWS = """url,index,clicks,impressions,ctr,date,position,citableContent
+https://scholarworks.montana.edu/xmlui/bitstream/1/5678/a.pdf,montana_page_clicks,3,40,0.075,2019-01-01,4.5,Yes
+https://scholarworks.montana.edu/xmlui/bitstream/1/5679/b.pdf,montana_page_clicks,{clicks},12,0.0,2019-01-02,12.0,Yes
+"""
+
+
+def write_file(tmp_path, clicks):
+    path = tmp_path / '2019-01_RAMP_subset_page-clicks_v2.csv'
+    path.write_text(ROWS.format(clicks=clicks))
+    return str(path)
+
+
+def test_complete_counts_are_int32(tmp_path):
+    data = read_ramp_file(write_file(tmp_path, 0))
+    assert data['clicks'].dtype == 'int32' and data['impressions'].dtype == 'int32'
+    assert data['citableContent'].dtype == bool
+
+
+def test_missing_and_fractional_counts_keep_inferred_type(tmp_path):
+    for clicks in ['', '1.5']:
+        path = write_file(tmp_path, clicks)
+        inferred = pd.read_csv(path)
+        data = read_ramp_file(path)
+        assert data['clicks'].dtype == inferred['clicks'].dtype
+        assert data['impressions'].dtype == 'int32'
+        pd.testing.assert_series_equal(data['clicks'], inferred['clicks'])
+        assert [len(chunk) for chunk in iter_ramp_file(path, chunk_size=1)] == [1, 1]
+        assert len(memory_report([path])) == 1
+
+
+def page_clicks(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'url': ['https://ir' + str(i % 3) + '.edu/' + str(u) + '/1/x.pdf' for i, u in
+                enumerate(rng.integers(0, 60, n))],
+        'index': ['ir' + str(i % 3) + '_page_clicks' for i in range(n)],
+        'clicks': rng.integers(0, 5, n),
+        'impressions': rng.integers(5, 50, n),
+        'ctr': rng.random(n),
+        'date': rng.choice(['2019-01-01', '2019-01-15', '2019-02-01'], n),
+        'position': np.where(rng.random(n) < 0.1, np.nan, rng.integers(1, 1500, n).astype(float)),
+        'citableContent': rng.choice(['Yes', 'No'], n, p=[0.8, 0.2]),
+    })
+
+
+def write_files(tmp_path, data, parts=2):
+    paths = []
+    for i, part in enumerate(np.array_split(np.arange(len(data)), parts)):
+        path = tmp_path / ('2019-0' + str(i + 1) + '_RAMP_subset_page-clicks_v2.csv')
+        data.iloc[part].to_csv(path, index=False)
+        paths.append(str(path))
+    return paths
+
+
+def url_sums(data):
+    data = data[(data['citableContent'] == 'Yes') & (data['clicks'] > 0)]
+    data = data.assign(serp1=data['position'] <= 10, serp100=data['position'] <= 1000,
+                       serp1CcdSum=data['clicks'].where(data['position'] <= 10, 0),
+                       serp100CcdSum=data['clicks'].where(data['position'] <= 1000, 0))
+    sums = data.groupby(['index', 'url'], sort=False)[['clicks', 'serp1', 'serp1CcdSum', 'serp100',
+                                                       'serp100CcdSum']].sum()
+    return sums.astype('int64').reset_index().astype({'index': object, 'url': object})
+
+
+def flat(url_clicks):
+    # The IR index is read as a categorical column.
+    return url_clicks.reset_index().astype({'index': object, 'url': object})
+
+
+def test_streamed_sums_match_pandas(tmp_path):
+    data = page_clicks()
+    paths = write_files(tmp_path, data)
+    expected = url_sums(data)
+    for chunk_size in [7, 100, 1000000]:
+        pd.testing.assert_frame_equal(flat(stream_url_clicks(paths, chunk_size)), expected)
+
+
+def test_parallel_sums_match_pandas(tmp_path):
+    data = page_clicks(seed=1)
+    paths = write_files(tmp_path, data, parts=3)
+    results = read_url_clicks(paths, chunk_size=50, workers=2)
+    assert [path for path, url_clicks, seconds in results] == paths
+    expected = url_sums(data)
+    for workers in [1, 2]:
+        for chunk_size in [50, None]:
+            pd.testing.assert_frame_equal(flat(load_url_clicks(paths, chunk_size, workers=workers)), expected)
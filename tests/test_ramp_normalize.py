@@ -0,0 +1,148 @@
+"""Check that the normalizers give the same item URLs and URIs as the per-row
+reference functions in "ramp_normalize"."""
+
+
+import os
+
+import itertools
+
+import numpy as np
+
+import pandas as pd
+
+import pytest
+
+from ramp_normalize import (EPRINTS_FEDORA_ID, FEDORA_NE_ID, BepressNormalizer, DSpaceNormalizer,
+                            ItemIdNormalizer, NormalizationCache, make_bepress_item_uri,
+                            make_bepress_oai_url, make_dspace_html_url, make_dspace_item_uri,
+                            make_eprints_fedora_html_url, make_eprints_fedora_item_uri,
+                            make_fedora_ne_html_url, make_fedora_ne_item_uri, normalizers_for, split_urls)
+
+
+# Each normalizer with the per-row functions it reproduces.
+REFERENCES = {
+    'dspace': (DSpaceNormalizer(), make_dspace_html_url, make_dspace_item_uri),
+    'eprints': (ItemIdNormalizer(EPRINTS_FEDORA_ID.pattern), make_eprints_fedora_html_url,
+                make_eprints_fedora_item_uri),
+    'fedora-ne': (ItemIdNormalizer(FEDORA_NE_ID.pattern), make_fedora_ne_html_url, make_fedora_ne_item_uri),
+    'bepress': (BepressNormalizer(), make_bepress_oai_url, make_bepress_item_uri),
+}
+
+SCHEMES = ['http', 'https', 'HTTP', 'Https']
+
+HOSTS = ['scholarworks.montana.edu', 'eprints.example.ac.uk:8080', 'user@repo.example.edu',
+         'dépôt.univ.fr', '[::1]', '[2001:db8::1]:8080', 'repo example.edu', 'repo.example.edu;x', '']
+
+PATHS = ['', '/', '/1234/1/x.pdf', '/xmlui/bitstream/handle/1/5678/a.pdf', '/jspui/bitstream/10.1/22/b.pdf',
+         '/dspace/bitstream/123.4/567/c.pdf', '/files/neu:abc123/d.pdf', '/1234/1/x.pdf;jsessionid=AB12',
+         '/a;b/1234/x.pdf', '/thèse/1234/é.pdf', '/1234/1/x y.pdf', '/12\t34/x.pdf',
+         '/cgi/viewcontent.cgi', '/2020/../1234/x.pdf']
+
+QUERIES = ['', '?article=1234&context=theses', '?context=etd_2&article=0001#page=2', '#frag/5678',
+           '?a=/9999;x']
+
+
+def reference_items(urls, html_url, item_uri):
+    return pd.DataFrame({'html_url': [html_url(u) for u in urls], 'unique_item_uri': [item_uri(u) for u in urls]},
+                        dtype=object)
+
+
+def assert_same(normalizer, html_url, item_uri, urls):
+    items = normalizer.normalize(pd.Series(urls, dtype=object))
+    items = items.astype(object).where(items.notna(), None).reset_index(drop=True)
+    expected = reference_items(urls, html_url, item_uri)
+    mismatched = ~(items.eq(expected) | (items.isna() & expected.isna())).all(axis=1)
+    assert not mismatched.any(), pd.concat([pd.Series(urls, name='url'), items, expected.add_suffix('_expected')],
+                                           axis=1)[mismatched].to_string()
+
+
+@pytest.mark.parametrize('name', REFERENCES)
+def test_normalizers_match_reference(name):
+    urls = [s + '://' + h + p + q for s, h, p, q in itertools.product(SCHEMES, HOSTS, PATHS, QUERIES)]
+    assert_same(*REFERENCES[name], urls)
+
+
+@pytest.mark.parametrize('name', REFERENCES)
+def test_normalizers_match_reference_random(name):
+    # Random URLs made of the characters that matter to the split.
+    rng = np.random.default_rng(0)
+    alphabet = list('ab09/?#;:@.[]=&- é') + ['context=', 'article=', '1234', 'neu:', 'handle', 'xmlui']
+    urls = []
+    for _ in range(5000):
+        rest = ''.join(rng.choice(alphabet, size=rng.integers(0, 12)))
+        urls.append(str(rng.choice(SCHEMES)) + '://' + rest)
+    # urlparse rejects some netlocs with brackets; only compare URLs it accepts.
+    urls = [u for u in urls if _parses(u)]
+    assert_same(*REFERENCES[name], urls)
+
+
+def _parses(url):
+    try:
+        make_eprints_fedora_html_url(url)
+    except ValueError:
+        return False
+    return True
+
+
+def test_split_urls_falls_back():
+    parts = split_urls(pd.Series(['https://dépôt.univ.fr/1234/1/x.pdf', 'http://[::1]/1234',
+                                  'HTTP://repo.example.edu/1234', 'http://repo.example.edu/a;b/1234',
+                                  'http://repo.example.edu/1234/x.pdf;v=1']))
+    assert parts['scheme'].isna().tolist() == [True, True, True, True, False]
+    assert parts['path'].iloc[-1] == '/1234/x.pdf'
+
+
+def test_non_ascii_host():
+    normalizer = REFERENCES['eprints'][0]
+    items = normalizer.normalize(pd.Series(['https://dépôt.univ.fr/1234/1/x.pdf']))
+    assert items.loc[0, 'html_url'] == 'https://dépôt.univ.fr/1234'
+
+
+def test_item_id_patterns():
+    ir_info = pd.DataFrame({'ir_page_click_index': ['northeastern_page_clicks', 'other_page_clicks',
+                                                    'ds_page_clicks'],
+                            'Platform': ['Fedora/Samvera', 'Fedora/Samvera', 'DSpace']})
+    url = pd.Series(['https://repository.library.northeastern.edu/files/neu:abc123/fulltext.pdf'])
+    for table in [ir_info, ir_info.assign(**{'Item ID Pattern': [None, FEDORA_NE_ID.pattern, None]})]:
+        normalizers = normalizers_for(table)
+        # Northeastern's pattern is registered; the column can give other IR a pattern.
+        assert normalizers['northeastern_page_clicks'].normalize(url).loc[0, 'unique_item_uri'] == '/files/neu:abc123'
+        assert isinstance(normalizers['ds_page_clicks'], DSpaceNormalizer)
+    # Without a pattern, the platform's default is used.
+    assert normalizers_for(ir_info)['other_page_clicks'].key == 'item-id:' + EPRINTS_FEDORA_ID.pattern
+    assert normalizers['other_page_clicks'].key == 'item-id:' + FEDORA_NE_ID.pattern
+
+    published = normalizers_for(pd.read_csv(os.path.join(os.path.dirname(__file__), '..', 'ir_data',
+                                                         'RAMP_IR_base_info.csv')))
+    assert published['northeastern_page_clicks'].key == 'item-id:' + FEDORA_NE_ID.pattern
+
+
+def test_normalization_cache_matches_reference(tmp_path):
+    path = str(tmp_path / 'url_cache.csv.gz')
+    cache = NormalizationCache(path)
+    first = pd.Series(['https://a.edu/1234/1/x.pdf', 'https://a.edu/1234/2/y.pdf', 'https://a.edu/1234/1/x.pdf',
+                       None, 'not a url'], index=[10, 11, 12, 13, 14], dtype=object)
+    second = pd.Series(['https://a.edu/1234/2/y.pdf', 'https://a.edu/5678/1/z.pdf'], dtype=object)
+    for urls in [first, second]:
+        items = cache.normalize(urls, 'EPrints 3')
+        assert list(items.index) == list(urls.index)
+        known = urls.notna()
+        expected = reference_items(urls[known].tolist(), make_eprints_fedora_html_url, make_eprints_fedora_item_uri)
+        expected.index = urls.index[known]
+        pd.testing.assert_frame_equal(items[known].astype(object).where(items[known].notna(), None), expected)
+        assert items[~known].isna().all(axis=None)
+    # Three unique URLs in the first series and one new one in the second.
+    assert (cache.misses, cache.hits, cache.rows) == (4, 1, 7)
+    assert cache.hit_rate() == 0.2
+
+    # The saved cache answers the same lookups without normalizing again.
+    cache.save()
+    loaded = NormalizationCache(path)
+    pd.testing.assert_frame_equal(loaded.normalize(second, 'EPrints 3').astype(object),
+                                  cache.normalize(second, 'EPrints 3').astype(object))
+    assert (loaded.misses, loaded.hits) == (0, 2)
+
+    # Results stored by another version are ignored.
+    stored = pd.read_csv(path, dtype=object, compression='gzip')
+    stored.assign(version='1').to_csv(path, index=False, compression='gzip')
+    assert NormalizationCache(path).items == {}
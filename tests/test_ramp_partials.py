@@ -0,0 +1,73 @@
+"""Check that the per-month partials stored by "ramp_partials" add up to the pandas sums
+of the months they were made from, and that only new or changed months are read."""
+
+
+import os
+
+import pandas as pd
+
+from ramp_partials import INDEX_NAME, partial_name, partial_path, update_partials
+
+
+MONTHS = {
+    '2019-01': pd.DataFrame({
+        'url': ['https://a.edu/1.pdf', 'https://a.edu/2.pdf', 'https://b.edu/1.pdf', 'https://a.edu/1.pdf'],
+        'index': ['a_page_clicks', 'a_page_clicks', 'b_page_clicks', 'a_page_clicks'],
+        'clicks': [1, 2, 3, 4], 'impressions': [10, 20, 30, 40], 'ctr': [0.1] * 4,
+        'date': ['2019-01-01', '2019-01-02', '2019-01-02', '2019-01-03'],
+        'position': [1.0, 20.0, None, 2000.0], 'citableContent': ['Yes', 'Yes', 'Yes', 'Yes']}),
+    '2019-02': pd.DataFrame({
+        'url': ['https://b.edu/1.pdf', 'https://a.edu/1.pdf', 'https://b.edu/2.pdf'],
+        'index': ['b_page_clicks', 'a_page_clicks', 'b_page_clicks'],
+        'clicks': [5, 6, 0], 'impressions': [50, 60, 70], 'ctr': [0.1] * 3,
+        'date': ['2019-02-01', '2019-02-01', '2019-02-02'],
+        'position': [3.0, 500.0, 1.0], 'citableContent': ['Yes', 'No', 'Yes']}),
+    '2019-03': pd.DataFrame({
+        'url': ['https://a.edu/2.pdf'], 'index': ['a_page_clicks'], 'clicks': [7], 'impressions': [70],
+        'ctr': [0.1], 'date': ['2019-03-01'], 'position': [8.0], 'citableContent': ['Yes']}),
+}
+
+
+def write_month(tmp_path, month):
+    path = str(tmp_path / (month + '_RAMP_subset_page-clicks_v2.csv'))
+    MONTHS[month].to_csv(path, index=False)
+    return path
+
+
+def url_sums(months):
+    data = pd.concat([MONTHS[m] for m in months], ignore_index=True)
+    data = data[(data['citableContent'] == 'Yes') & (data['clicks'] > 0)]
+    data = data.assign(serp1=data['position'] <= 10, serp100=data['position'] <= 1000,
+                       serp1CcdSum=data['clicks'].where(data['position'] <= 10, 0),
+                       serp100CcdSum=data['clicks'].where(data['position'] <= 1000, 0))
+    sums = data.groupby(['index', 'url'])[['clicks', 'serp1', 'serp1CcdSum', 'serp100', 'serp100CcdSum']].sum()
+    return flat(sums.astype('int64'))
+
+
+def flat(url_clicks):
+    # Partials can be merged in any order, so compare the sums sorted by IR and URL.
+    url_clicks = url_clicks.reset_index().astype({'index': object, 'url': object})
+    return url_clicks.sort_values(['index', 'url']).set_index(['index', 'url'])
+
+
+def test_partials_match_pandas_and_only_new_months_are_read(tmp_path, capsys):
+    partials_dir = str(tmp_path / 'partials')
+    files = [write_month(tmp_path, m) for m in ['2019-01', '2019-02']]
+    url_clicks = update_partials(files, partials_dir, workers=1)
+    pd.testing.assert_frame_equal(flat(url_clicks), url_sums(['2019-01', '2019-02']))
+    assert os.path.exists(os.path.join(partials_dir, INDEX_NAME))
+
+    # Only the new month is read. The raw file of an earlier month isn't needed.
+    capsys.readouterr()
+    files.append(write_month(tmp_path, '2019-03'))
+    os.remove(files[0])
+    url_clicks = update_partials(files[1:], partials_dir, workers=1)
+    assert capsys.readouterr().out.count('Read ') == 1
+    pd.testing.assert_frame_equal(flat(url_clicks), url_sums(['2019-01', '2019-02', '2019-03']))
+
+    # A changed file is read again, and a deleted partial leaves its month out.
+    os.utime(files[2], (0, 0))
+    os.remove(partial_path(partials_dir, partial_name(files[0])))
+    url_clicks = update_partials(files[1:], partials_dir, workers=1)
+    assert 'Read 2019-03' in capsys.readouterr().out
+    pd.testing.assert_frame_equal(flat(url_clicks), url_sums(['2019-02', '2019-03']))
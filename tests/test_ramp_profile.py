@@ -0,0 +1,86 @@
+"""Check the error records and run reports of "ramp_profile"."""
+
+
+import os
+
+import json
+
+import pstats
+
+import numpy as np
+
+import pandas as pd
+
+from ramp_profile import RunReport, error_record
+
+
+def failing(n):
+    return 1 / n
+
+
+def test_error_record():
+    try:
+        failing(0)
+    except ZeroDivisionError as e:
+        record = error_record('normalize', e, ir='montana', pc_index='montana_page_clicks')
+    assert {k: v for k, v in record.items() if k != 'traceback'} == {
+        'stage': 'normalize', 'ir': 'montana', 'pc_index': 'montana_page_clicks',
+        'error': 'ZeroDivisionError', 'message': 'division by zero'}
+    assert record['traceback'].startswith('Traceback') and 'in failing' in record['traceback']
+    json.dumps(record)
+
+
+def test_save_errors(tmp_path):
+    path = str(tmp_path / 'RAMP_summary_stats_20261017_errors.json')
+    report = RunReport(enabled=False)
+    report.save_errors(path)
+    assert not (tmp_path / 'RAMP_summary_stats_20261017_errors.json').exists()
+
+    report.errors.append(error_record('download', OSError('offline'), file='2019-01.csv'))
+    report.save_errors(path)
+    with open(path) as f:
+        saved = json.load(f)
+    assert [(e['stage'], e['file'], e['message']) for e in saved] == [('download', '2019-01.csv', 'offline')]
+
+
+def test_run_report_stages(tmp_path):
+    report = RunReport(profile_stages=['summarize'], profile_prefix=str(tmp_path / 'run'))
+    data = pd.DataFrame({'index': ['a', 'b', 'a'], 'clicks': [1, 2, 3]})
+    with report.stage('read', rows=len(data)):
+        with report.stage('parse') as record:
+            block = np.ones(2 ** 24)
+            record['rows'] = int(block.size)
+            del block
+    with report.stage('summarize'):
+        for ir, ir_data in data.groupby('index'):
+            with report.stage('ir', rows=len(ir_data), ir=ir):
+                ir_data['clicks'].sum()
+
+    assert [(r['stage'], r['rows']) for r in report.stages] == [('read', 3), ('read/parse', 2 ** 24),
+                                                                ('summarize', None)]
+    assert {ir: (r['stage'], r['rows']) for ir, r in report.irs.items()} == {'a': ('summarize/ir', 2),
+                                                                             'b': ('summarize/ir', 1)}
+    read, parse, summarize = report.stages
+    assert read['wall_seconds'] >= parse['wall_seconds'] >= 0
+    # The outer stage's peak includes the peaks of the stages inside it.
+    assert read['peak_rss_mb'] >= parse['peak_rss_mb'] > 0
+    assert 'profile' not in read and os.path.exists(summarize['profile'])
+    assert pstats.Stats(summarize['profile']).total_calls > 0
+    assert len(report.summary().splitlines()) == 3
+
+    path = str(tmp_path / 'RAMP_summary_stats_20261017_report.json')
+    report.info['files'] = 1
+    report.save(path)
+    with open(path) as f:
+        saved = json.load(f)
+    assert [r['stage'] for r in saved['stages']] == ['read', 'read/parse', 'summarize']
+    assert sorted(saved['irs']) == ['a', 'b'] and saved['info'] == {'files': 1} and saved['errors'] == []
+
+
+def test_disabled_run_report(tmp_path):
+    report = RunReport(enabled=False, profile_stages=['read'], profile_prefix=str(tmp_path / 'run'))
+    with report.stage('read', rows=3) as record:
+        record['rows'] = 4
+    assert report.stages == [] and report.irs == {}
+    report.save(str(tmp_path / 'report.json'))
+    assert os.listdir(str(tmp_path)) == []
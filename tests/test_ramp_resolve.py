@@ -0,0 +1,107 @@
+"""Check "ramp_resolve" against its StandInServer: the ok/missing classification of item
+URLs and OAI-PMH identifiers, the result cache, retries and the per-host limit."""
+
+
+import threading
+
+import pandas as pd
+
+from ramp_download import make_session
+
+from ramp_resolve import RESOLVE_COLS, ResolveCache, StandInHandler, StandInServer, check_target, resolve
+
+
+HOSTS = ['ir0.example.edu', 'ir1.example.edu']
+
+TARGETS = ['https://ir0.example.edu/handle/1/1', 'https://ir0.example.edu/handle/1/2',
+           'oai:ir1.example.edu:context-1', 'oai:ir1.example.edu:context-2']
+
+KNOWN = ['/handle/1/1', 'oai:ir1.example.edu:context-1']
+
+
+class TrackingHandler(StandInHandler):
+    """Records the largest number of requests answered at a time, and fails the
+       first server.failures requests of each path with status 503."""
+
+    def answer(self, body):
+        server = self.server
+        with server.lock:
+            attempts = server.attempts[self.path] = server.attempts.get(self.path, 0) + 1
+            server.active += 1
+            server.most_active = max(server.most_active, server.active)
+        try:
+            if attempts <= server.failures:
+                server.requests += 1
+                self.send_response(503)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+            else:
+                super().answer(body)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+
+def tracking_server(known, delay=0.0, failures=0):
+    server = StandInServer(known, delay)
+    server.RequestHandlerClass = TrackingHandler
+    server.lock = threading.Lock()
+    server.attempts = {}
+    server.active = server.most_active = 0
+    server.failures = failures
+    return server
+
+
+def test_check_target_classifies_ok_and_missing():
+    with StandInServer(KNOWN) as server, make_session() as session:
+        host_urls = {h: server.url for h in HOSTS}
+        statuses = [check_target(session, t, host_urls=host_urls) for t in TARGETS]
+    assert [r['status'] for r in statuses] == ['ok', 'missing', 'ok', 'missing']
+    assert [r['code'] for r in statuses] == [200, 404, 200, 200]
+    assert statuses[3]['message'].startswith('idDoesNotExist')
+
+
+def test_resolve_and_cache_reuse(tmp_path):
+    path = str(tmp_path / 'resolve_cache.csv.gz')
+    with StandInServer(KNOWN) as server:
+        host_urls = {h: server.url for h in HOSTS}
+        cache = ResolveCache(path)
+        results = resolve(TARGETS + TARGETS[:1], cache, host_urls=host_urls)
+        assert list(results.columns) == RESOLVE_COLS
+        assert list(results['target']) == TARGETS
+        assert list(results['status']) == ['ok', 'missing', 'ok', 'missing']
+        assert server.requests == 4
+        cache.save()
+
+        # A second run loads the stored results and sends no requests.
+        again = resolve(TARGETS, ResolveCache(path), host_urls=host_urls)
+        assert server.requests == 4
+    pd.testing.assert_frame_equal(again[['target', 'status', 'code']], results[['target', 'status', 'code']],
+                                  check_dtype=False)
+
+
+def test_retries_and_failures_are_not_cached():
+    server = tracking_server(KNOWN, failures=1)
+    with server:
+        host_urls = {h: server.url for h in HOSTS}
+        results = resolve(TARGETS, host_urls=host_urls, retries=1, backoff=0.01)
+        assert list(results['status']) == ['ok', 'missing', 'ok', 'missing']
+        assert server.requests == 8
+
+        server.attempts.clear()
+        cache = ResolveCache()
+        results = resolve(TARGETS, cache, host_urls=host_urls, retries=0)
+    assert list(results['status']) == ['failed'] * 4
+    assert list(results['code']) == [503] * 4
+    assert len(cache) == 0
+
+
+def test_per_host_limit():
+    ir0 = tracking_server(['/handle/1/' + str(i) for i in range(20)], delay=0.02)
+    ir1 = tracking_server([], delay=0.02)
+    with ir0, ir1:
+        targets = ['https://' + HOSTS[i % 2] + '/handle/1/' + str(i) for i in range(40)]
+        results = resolve(targets, per_host=3, connections=16, host_urls={HOSTS[0]: ir0.url, HOSTS[1]: ir1.url})
+    assert ir0.most_active == 3 and ir1.most_active == 3
+    expected = ['ok' if i % 2 == 0 and i < 20 else 'missing' for i in range(40)]
+    assert list(results['status']) == expected
@@ -0,0 +1,63 @@
+"""Check that "ramp_results" makes the same output as building the data frame row by row
+in pandas, with the declared column types, and writes it back readably in each format."""
+
+
+import pandas as pd
+
+import pytest
+
+from ramp_results import SUMMARY_DTYPES, ResultBuilder, write_results
+
+
+COLUMNS = ['ir', 'pc_index', 'countCcdUrls', 'useRatio', 'sumCcd', 'ccdAggCount', 'ccdAggStd', 'ctEtd', 'pctEtd']
+
+ROWS = [
+    ['montana', 'montana_page_clicks', 3, 0.25, 12, 3.0, float('nan'), '.', '.'],
+    {'ir': 'osu', 'pc_index': 'osu_page_clicks', 'countCcdUrls': 5, 'useRatio': 0.5, 'sumCcd': 40,
+     'ccdAggCount': 5.0, 'ccdAggStd': 2.5, 'ctEtd': '120', 'pctEtd': '0.4'},
+]
+
+
+def reference_frame():
+    # The frame the original script built by appending one row at a time.
+    frames = [pd.DataFrame([row if isinstance(row, dict) else dict(zip(COLUMNS, row))], columns=COLUMNS)
+              for row in ROWS]
+    return pd.concat(frames, ignore_index=True)
+
+
+def test_result_builder_matches_pandas():
+    results = ResultBuilder(COLUMNS, SUMMARY_DTYPES)
+    for row in ROWS:
+        results.add(row)
+    assert len(results) == 2
+    frame = results.to_frame()
+    assert list(frame.columns) == COLUMNS
+    assert {c: str(t) for c, t in frame.dtypes.items()} == {c: str(pd.Series(dtype=SUMMARY_DTYPES[c]).dtype)
+                                                           for c in COLUMNS}
+    pd.testing.assert_frame_equal(frame, reference_frame().astype({c: SUMMARY_DTYPES[c] for c in COLUMNS}))
+    # The types don't depend on the values of the first row: '.' and '120' are both text.
+    assert frame['ctEtd'].tolist() == ['.', '120']
+
+    with pytest.raises(ValueError):
+        results.add(ROWS[0][:-1])
+
+
+@pytest.mark.parametrize('fmt', ['csv', 'parquet', 'json'])
+def test_write_results(tmp_path, fmt):
+    if fmt == 'parquet':
+        pytest.importorskip('pyarrow')
+    results = ResultBuilder(COLUMNS, SUMMARY_DTYPES)
+    for row in ROWS:
+        results.add(row)
+    frame = results.to_frame()
+    prefix = str(tmp_path / 'RAMP_summary_stats_20261017')
+    paths = write_results(frame, prefix, [fmt])
+    assert paths == [prefix + '.' + fmt]
+
+    if fmt == 'csv':
+        saved = pd.read_csv(paths[0], dtype={'ctEtd': str, 'pctEtd': str})
+    elif fmt == 'parquet':
+        saved = pd.read_parquet(paths[0])
+    else:
+        saved = pd.read_json(paths[0], orient='records', dtype={'ctEtd': str, 'pctEtd': str})
+    pd.testing.assert_frame_equal(saved.astype({c: SUMMARY_DTYPES[c] for c in COLUMNS}), frame)
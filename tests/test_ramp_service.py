@@ -0,0 +1,91 @@
+"""Check the answers of "ramp_service" against pandas computations on small summary
+statistics files, with and without date windows."""
+
+
+import json
+
+import pandas as pd
+
+from ramp_service import SummaryService
+
+
+STATS = pd.DataFrame({
+    'ir': ['montana', 'rutgers', 'uky', 'neu'],
+    'countItems': [10, 40, 20, 30],
+    'countItemUris': [5, 10, 10, 3],
+    'useRatio': [0.5, 0.25, 0.5, 0.1],
+    'sumCcd': [100, 200, 300, 400],
+    'irCountry': ['USA', 'USA', 'USA', 'USA'],
+    'irType': ['Institutional', 'Institutional', 'Institutional', 'Data'],
+    'normIrPlat': ['DSpace', 'Fedora/Samvera', 'DSpace', 'Fedora/Samvera'],
+})
+
+
+def write_run(tmp_path, windows):
+    for window in windows:
+        stats = STATS.assign(countItems=STATS['countItems'] + (len(window) if window else 0))
+        stats.to_csv(tmp_path / ('RAMP_summary_stats_' + (window + '_' if window else '') + '20261017.csv'),
+                     index=False)
+    return SummaryService(str(tmp_path))
+
+
+def get(service, path, **params):
+    query = tuple(sorted((name, value) for name, values in params.items()
+                         for value in (values if isinstance(values, list) else [values])))
+    status, body = service.answer(path, query)
+    return status, json.loads(body)
+
+
+def test_stats_filters_and_columns(tmp_path):
+    service = write_run(tmp_path, [None])
+    status, rows = get(service, '/stats', platform='DSpace', columns='ir,useRatio')
+    assert status == 200
+    expected = STATS[STATS['normIrPlat'] == 'DSpace'][['ir', 'useRatio']]
+    assert rows == expected.to_dict(orient='records')
+
+    # Values of a filter are combined with or, filters with and.
+    status, rows = get(service, '/stats', ir=['montana', 'neu,rutgers'], type='Institutional')
+    assert [r['ir'] for r in rows] == ['montana', 'rutgers']
+
+
+def test_rollup_matches_pandas(tmp_path):
+    service = write_run(tmp_path, [None])
+    status, rows = get(service, '/rollup/platform')
+    groups = STATS.groupby('normIrPlat')
+    assert status == 200
+    assert [r['normIrPlat'] for r in rows] == ['Fedora/Samvera', 'DSpace']
+    for r in rows:
+        group = groups.get_group(r['normIrPlat'])
+        assert r['irs'] == len(group)
+        assert r['countItems'] == group['countItems'].sum()
+        assert r['useRatio'] == round(group['countItemUris'].sum() / group['countItems'].sum(), 2)
+        assert r['medianUseRatio'] == round(group['useRatio'].median(), 2)
+
+    status, rows = get(service, '/rollup/platform', type='Data')
+    assert [(r['normIrPlat'], r['irs']) for r in rows] == [('Fedora/Samvera', 1)]
+
+
+def test_unknown_parameters_windows_and_columns(tmp_path):
+    service = write_run(tmp_path, [None, '2019-01'])
+    assert get(service, '/stats', state='MT') == (400, {'error': 'Unknown parameters: state'})
+    assert get(service, '/stats', window='2019-02') == (400, {'error': 'Unknown window: 2019-02'})
+    assert get(service, '/stats', columns='ir,views') == (400, {'error': 'Unknown columns: views'})
+    assert get(service, '/rollup/state')[0] == 404
+
+
+def test_breakdown(tmp_path):
+    service = write_run(tmp_path, [None, '2019-01', '2019-02'])
+    status, rows = get(service, '/breakdown', ir='uky', columns='countItems')
+    assert status == 200
+    assert rows == [{'window': '2019-01', 'ir': 'uky', 'countItems': 27},
+                    {'window': '2019-02', 'ir': 'uky', 'countItems': 27}]
+    assert get(service, '/windows') == (200, ['2019-01', '2019-02'])
+
+
+def test_windowed_only_run_defaults_to_last_window(tmp_path):
+    service = write_run(tmp_path, ['2019-01', '2019-02'])
+    assert service.default_window == '2019-02'
+    assert get(service, '/stats') == get(service, '/stats', window='2019-02')
+    assert get(service, '/rollup/country')[0] == 200
+    assert get(service, '/')[1]['defaultWindow'] == '2019-02'
+    assert len(get(service, '/breakdown', ir='neu')[1]) == 2
@@ -0,0 +1,95 @@
+"""Check that the HyperLogLog estimates of "ramp_sketch" are within their error of the exact
+unique counts computed with pandas, and that sketches merge and store exactly."""
+
+
+import numpy as np
+
+import pandas as pd
+
+import pytest
+
+from ramp_aggregate import citable_clicks
+
+from ramp_normalize import EPRINTS_FEDORA_ID, ItemIdNormalizer
+
+from ramp_sketch import SKETCH_COLS, DaySketches, relative_error, sketch_clicks, update_sketches
+
+
+EPRINTS = ItemIdNormalizer(EPRINTS_FEDORA_ID.pattern)
+
+NORMALIZERS = {'a_page_clicks': EPRINTS, 'b_page_clicks': EPRINTS}
+
+
+def page_clicks(seed=0):
+    # IR a has thousands of URLs, with up to three files per item and some URLs
+    # without an item; IR b has a few dozen.
+    rng = np.random.default_rng(seed)
+    n = 20000
+    index = np.where(rng.random(n) < 0.98, 'a_page_clicks', 'b_page_clicks')
+    items = np.where(index == 'a_page_clicks', rng.integers(0, 6000, n), rng.integers(0, 30, n))
+    urls = pd.Series(['https://' + i[0] + '.edu/' + str(1000 + item) + '/' + str(f) + '/x.pdf'
+                      for i, item, f in zip(index, items, rng.integers(1, 4, n))])
+    urls[rng.random(n) < 0.01] = 'https://a.edu/about'
+    return pd.DataFrame({'url': urls, 'index': index, 'clicks': rng.integers(0, 5, n),
+                         'date': pd.Series(pd.date_range('2019-01-01', '2019-01-31')).dt.strftime('%Y-%m-%d')
+                         .to_numpy()[rng.integers(0, 31, n)],
+                         'position': rng.uniform(1, 50, n), 'citableContent': 'Yes'})
+
+
+def exact_counts(data, start, end):
+    data = citable_clicks(data[(data['date'] >= start) & (data['date'] <= end)])
+    items = EPRINTS.normalize(data['url'].reset_index(drop=True)).set_axis(data.index)
+    data = pd.concat([data[['index', 'url']], items], axis=1)
+    counts = data.groupby('index')[list(SKETCH_COLS.values())].nunique(dropna=False)
+    return counts.set_axis(list(SKETCH_COLS), axis=1)
+
+
+@pytest.mark.parametrize('start,end', [('2019-01-01', '2019-01-31'), ('2019-01-10', '2019-01-12')])
+def test_estimates_are_within_error_of_pandas(start, end):
+    data = page_clicks()
+    sketches = DaySketches()
+    sketch_clicks(sketches, citable_clicks(data), NORMALIZERS)
+    estimates = sketches.counts(start, end)
+    expected = exact_counts(data, start, end)
+    assert sorted(estimates.index) == sorted(expected.index)
+    estimates = estimates.loc[expected.index]
+    # Within four standard errors, plus one for the small counts of IR b.
+    assert ((estimates - expected).abs() <= 4 * relative_error() * expected + 1).all(axis=None), \
+        pd.concat([estimates, expected], axis=1, keys=['estimate', 'exact']).to_string()
+
+
+def test_sketches_merge_and_store_exactly(tmp_path):
+    data = page_clicks()
+    whole = DaySketches()
+    sketch_clicks(whole, citable_clicks(data), NORMALIZERS)
+    merged = DaySketches(capacity=1)
+    for part in [data[:5000], data[5000:]]:
+        sketches = DaySketches()
+        sketch_clicks(sketches, citable_clicks(part), NORMALIZERS)
+        merged.update(sketches)
+    pd.testing.assert_frame_equal(merged.counts(), whole.counts())
+    with pytest.raises(ValueError):
+        merged.update(DaySketches(precision=10))
+
+    path = str(tmp_path / 'sketches.npz')
+    whole.save(path)
+    pd.testing.assert_frame_equal(DaySketches.load(path).counts('2019-01-05', '2019-01-20'),
+                                  whole.counts('2019-01-05', '2019-01-20'))
+
+
+def test_update_sketches_reuses_stored_files(tmp_path, capsys):
+    data = page_clicks()
+    files = []
+    for month, part in [('2019-01', data[:10000]), ('2019-02', data[10000:])]:
+        files.append(str(tmp_path / (month + '_RAMP_subset_page-clicks_v2.csv')))
+        part.assign(impressions=10, ctr=0.1).to_csv(files[-1], index=False)
+    sketch_dir = str(tmp_path / 'sketches')
+    first = update_sketches(files, sketch_dir, NORMALIZERS)
+    whole = DaySketches()
+    sketch_clicks(whole, citable_clicks(data), NORMALIZERS)
+    pd.testing.assert_frame_equal(first.counts(), whole.counts())
+
+    capsys.readouterr()
+    again = update_sketches(files, sketch_dir, NORMALIZERS)
+    assert 'Using stored sketches for 2 of 2' in capsys.readouterr().out
+    pd.testing.assert_frame_equal(again.counts(), whole.counts())
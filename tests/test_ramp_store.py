@@ -0,0 +1,76 @@
+"""Check that the sums queried from the SQLite store in "ramp_store" match the same sums
+computed with pandas from the RAMP data files."""
+
+
+import pandas as pd
+
+from ramp_store import is_loaded, load_files, open_store, query_access_counts, query_url_clicks
+
+
+PAGE_CLICKS = pd.DataFrame({
+    'url': ['https://a.edu/1.pdf', 'https://a.edu/2.pdf', 'https://a.edu/1.pdf', 'https://b.edu/3.pdf',
+            'https://b.edu/3.pdf', 'https://b.edu/4.pdf', 'https://a.edu/5.pdf'],
+    'index': ['a_page_clicks', 'a_page_clicks', 'a_page_clicks', 'b_page_clicks', 'b_page_clicks',
+              'b_page_clicks', 'a_page_clicks'],
+    'clicks': [3, 1, 2, 5, 4, 0, 7],
+    'impressions': [30, 10, 20, 50, 40, 5, 70],
+    'ctr': [0.1] * 7,
+    'date': ['2019-01-01', '2019-01-01', '2019-01-02', '2019-01-02', '2019-02-03', '2019-02-03', '2019-02-04'],
+    # Every position of b.edu/3.pdf is missing.
+    'position': [4.0, 1500.0, 11.0, None, None, 2.0, 900.0],
+    'citableContent': ['Yes', 'Yes', 'Yes', 'Yes', 'Yes', 'Yes', 'No'],
+})
+
+COUNTRY_DEVICE = pd.DataFrame({
+    'country': ['usa', 'usa', 'can', 'usa'],
+    'device': ['DESKTOP', 'DESKTOP', 'MOBILE', 'MOBILE'],
+    'index': ['a_access_info', 'a_access_info', 'a_access_info', 'b_access_info'],
+    'clicks': [1, 2, 3, 4],
+    'impressions': [10, 20, 30, 40],
+    'ctr': [0.1] * 4,
+    'date': ['2019-01-01', '2019-01-02', '2019-01-02', '2019-02-01'],
+    'position': [1.0, 2.0, 3.0, 4.0],
+})
+
+
+def url_sums(data):
+    data = data[(data['citableContent'] == 'Yes') & (data['clicks'] > 0)]
+    groups = data.assign(serp1=data['position'] <= 10, serp100=data['position'] <= 1000,
+                         serp1CcdSum=data['clicks'].where(data['position'] <= 10, 0),
+                         serp100CcdSum=data['clicks'].where(data['position'] <= 1000, 0))
+    sums = groups.groupby(['index', 'url'], sort=False)[['clicks', 'serp1', 'serp1CcdSum', 'serp100',
+                                                         'serp100CcdSum']].sum()
+    return sums.astype('int64')
+
+
+def make_store(tmp_path):
+    PAGE_CLICKS.to_csv(tmp_path / '2019-01_RAMP_subset_page-clicks_v2.csv', index=False)
+    COUNTRY_DEVICE.to_csv(tmp_path / '2019-01_RAMP_subset_country-device-info_v2.csv', index=False)
+    store = open_store(str(tmp_path / 'ramp.sqlite'))
+    files = [str(tmp_path / '2019-01_RAMP_subset_page-clicks_v2.csv'),
+             str(tmp_path / '2019-01_RAMP_subset_country-device-info_v2.csv')]
+    assert load_files(store, files) == {'2019-01_RAMP_subset_page-clicks_v2.csv': 7,
+                                        '2019-01_RAMP_subset_country-device-info_v2.csv': 4}
+    assert all(is_loaded(store, f) for f in files) and load_files(store, files) == {}
+    return store
+
+
+def test_url_clicks_match_pandas_with_missing_positions(tmp_path):
+    store = make_store(tmp_path)
+    url_clicks = query_url_clicks(store)
+    pd.testing.assert_frame_equal(url_clicks, url_sums(PAGE_CLICKS), check_index_type=False)
+    assert url_clicks.loc[('b_page_clicks', 'https://b.edu/3.pdf')].tolist() == [9, 0, 0, 0, 0]
+
+    january = query_url_clicks(store, end='2019-01-31')
+    pd.testing.assert_frame_equal(january, url_sums(PAGE_CLICKS[PAGE_CLICKS['date'] <= '2019-01-31']),
+                                  check_index_type=False)
+    store.close()
+
+
+def test_access_counts_match_pandas(tmp_path):
+    store = make_store(tmp_path)
+    counts = query_access_counts(store, start='2019-01-02')
+    data = COUNTRY_DEVICE[COUNTRY_DEVICE['date'] >= '2019-01-02'].assign(rows=1)
+    expected = data.groupby(['index', 'country', 'device'], sort=False)[['clicks', 'impressions', 'rows']].sum()
+    pd.testing.assert_frame_equal(counts, expected.astype('int64'), check_index_type=False)
+    store.close()
@@ -0,0 +1,71 @@
+"""Check that "ramp_synthetic_data" writes RAMP-shaped files that the same seed reproduces,
+and whose content file URLs the normalizers can turn into items."""
+
+
+import os
+
+import filecmp
+
+import pandas as pd
+
+from ramp_cache import RAMP_SCHEMAS
+
+from ramp_normalize import normalizers_for
+
+from ramp_synthetic_data import make_url_catalog, write_synthetic_subset
+
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+
+IR_INFO = pd.read_csv(os.path.join(ROOT, 'ir_data', 'RAMP_IR_base_info.csv'))
+
+COUNTRY_CODES = os.path.join(ROOT, 'country_codes', 'north_south.csv')
+
+
+def write_subset(out_dir, seed=0):
+    return write_synthetic_subset(str(out_dir), IR_INFO, COUNTRY_CODES, ['2019-02', '2020-01'], page_click_rows=500,
+                                  country_device_rows=200, items_per_ir=20, seed=seed, chunk_size=200)
+
+
+def test_files_have_ramp_names_and_columns(tmp_path):
+    files = write_subset(tmp_path)
+    assert [os.path.basename(f) for f in files] == [
+        '2019-02_RAMP_subset_page-clicks_v2.csv', '2019-02_RAMP_subset_country-device-info.csv',
+        '2020-01_RAMP_subset_page-clicks_v2.csv', '2020-01_RAMP_subset_country-device-info.csv']
+    for path, month in zip(files, ['2019-02', '2019-02', '2020-01', '2020-01']):
+        data = pd.read_csv(path)
+        schema = RAMP_SCHEMAS['*page-clicks*' if 'page-clicks' in path else '*country-device*']
+        assert list(data.columns) == list(schema)
+        assert len(data) == (500 if 'page-clicks' in path else 200)
+        dates = pd.to_datetime(data['date'])
+        assert (dates.dt.strftime('%Y-%m') == month).all()
+        assert ((data['clicks'] >= 0) & (data['clicks'] <= data['impressions'])).all()
+        pd.testing.assert_series_equal(data['ctr'], (data['clicks'] / data['impressions']).round(4),
+                                       check_names=False, atol=1e-9)
+        if 'page-clicks' in path:
+            assert set(data['index']) <= set(IR_INFO['ir_page_click_index'])
+            assert set(data['citableContent']) == {'Yes', 'No'}
+        else:
+            assert set(data['index']) <= set(IR_INFO['ir_access_info_index'])
+            assert set(data['device']) <= {'DESKTOP', 'MOBILE', 'TABLET'}
+
+    # The same seed writes the same files; another seed doesn't.
+    again = write_subset(tmp_path / 'again')
+    assert all(filecmp.cmp(a, b, shallow=False) for a, b in zip(files, again))
+    other = write_subset(tmp_path / 'other', seed=1)
+    assert not filecmp.cmp(files[0], other[0], shallow=False)
+
+
+def test_citable_urls_normalize_to_items():
+    catalog = make_url_catalog(IR_INFO, items_per_ir=20)
+    normalizers = normalizers_for(IR_INFO)
+    citable = catalog[catalog['citableContent'] == 'Yes']
+    for pc_index, urls in citable.groupby('index')['url']:
+        items = normalizers[pc_index].normalize(urls.reset_index(drop=True))
+        assert items['unique_item_uri'].notna().all(), pc_index
+        # Each item's files (and their http copies) come down to one item URI.
+        assert items['unique_item_uri'].nunique() == 20, pc_index
+    # IR without a known platform only have item pages.
+    platforms = IR_INFO.set_index('ir_page_click_index')['Platform']
+    assert set(citable['index']) == set(platforms.index[platforms.isin(['DSpace', 'EPrints 3', 'Fedora',
+                                                                        'Fedora/Samvera', 'Digital Commons'])])
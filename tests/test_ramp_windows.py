@@ -0,0 +1,81 @@
+"""Check that the per-window sums of "ramp_windows," computed from one pass of per-segment
+sums, match pandas sums of the rows in each window."""
+
+
+import numpy as np
+
+import pandas as pd
+
+import pytest
+
+from ramp_aggregate import aggregate_url_clicks, citable_clicks
+
+from ramp_windows import calendar_windows, date_segments, window_bounds, window_url_clicks
+
+
+PAGE_CLICKS = pd.DataFrame({
+    'url': ['https://a.edu/1.pdf', 'https://a.edu/2.pdf', 'https://b.edu/1.pdf', 'https://a.edu/1.pdf',
+            'https://b.edu/1.pdf', 'https://a.edu/2.pdf', 'https://b.edu/2.pdf', 'https://a.edu/1.pdf'],
+    'index': ['a_page_clicks', 'a_page_clicks', 'b_page_clicks', 'a_page_clicks', 'b_page_clicks',
+              'a_page_clicks', 'b_page_clicks', 'a_page_clicks'],
+    'clicks': [1, 2, 3, 4, 5, 6, 7, 8],
+    'date': ['2019-01-01', '2019-01-31', '2019-02-01', '2019-02-28', '2019-03-15', '2019-04-01',
+             '2019-05-31', '2019-06-01'],
+    'position': [1.0, 20.0, 3.0, 2000.0, 5.0, None, 8.0, 2.0],
+    'citableContent': ['Yes'] * 8,
+})
+
+
+def url_sums(data):
+    data = data[(data['citableContent'] == 'Yes') & (data['clicks'] > 0)]
+    data = data.assign(serp1=data['position'] <= 10, serp100=data['position'] <= 1000,
+                       serp1CcdSum=data['clicks'].where(data['position'] <= 10, 0),
+                       serp100CcdSum=data['clicks'].where(data['position'] <= 1000, 0))
+    sums = data.groupby(['index', 'url'])[['clicks', 'serp1', 'serp1CcdSum', 'serp100', 'serp100CcdSum']].sum()
+    return flat(sums.astype('int64'))
+
+
+def flat(url_clicks):
+    url_clicks = url_clicks.reset_index().astype({'index': object, 'url': object})
+    return url_clicks.sort_values(['index', 'url'], ignore_index=True)
+
+
+def test_calendar_windows():
+    ts = pd.Timestamp
+    assert calendar_windows('2019-01-01', '2019-03-31') == {
+        '2019-01': (ts('2019-01-01'), ts('2019-01-31')), '2019-02': (ts('2019-02-01'), ts('2019-02-28')),
+        '2019-03': (ts('2019-03-01'), ts('2019-03-31'))}
+    # Partial months at either end are left out.
+    assert list(calendar_windows('2019-01-02', '2019-05-30')) == ['2019-02', '2019-03', '2019-04']
+    assert list(calendar_windows('2019-01-01', '2019-05-31', months=3)) == ['2019-01_2019-03']
+    assert list(calendar_windows('2019-01-01', '2019-05-31', months=3, step=1)) == [
+        '2019-01_2019-03', '2019-02_2019-04', '2019-03_2019-05']
+
+
+def test_date_segments():
+    bounds = window_bounds({'q': ('2019-01-01', '2019-03-31'), 'm': ('2019-02-01', '2019-02-28')})
+    assert list(bounds) == list(np.array(['2019-01-01', '2019-02-01', '2019-03-01', '2019-04-01'],
+                                         dtype='datetime64[ns]'))
+    dates = pd.Series(['2018-12-31', '2019-01-01', '2019-02-28', '2019-03-31', '2019-04-01', None])
+    expected = [-1, 0, 1, 2, -1, -1]
+    assert list(date_segments(dates, bounds)) == expected
+    assert list(date_segments(dates.astype('category'), bounds)) == expected
+    assert list(date_segments(pd.to_datetime(dates), bounds)) == expected
+
+
+@pytest.mark.parametrize('windows', [
+    calendar_windows('2019-01-01', '2019-05-31'),
+    calendar_windows('2019-01-01', '2019-05-31', months=3, step=1),
+    {'all': ('2019-01-01', '2019-05-31'), 'mid': ('2019-01-15', '2019-03-15'), 'day': ('2019-06-01', '2019-06-01')},
+])
+def test_window_sums_match_pandas(windows):
+    bounds = window_bounds(windows)
+    clicks = citable_clicks(PAGE_CLICKS)
+    # Sum the segments in two parts, as when reading two files.
+    segment_clicks = pd.concat([aggregate_url_clicks(part, bounds) for part in [clicks[:4], clicks[4:]]])
+    url_clicks = window_url_clicks(segment_clicks, windows)
+    assert list(url_clicks) == list(windows)
+    dates = pd.to_datetime(PAGE_CLICKS['date'])
+    for name, (start, end) in windows.items():
+        rows = PAGE_CLICKS[(dates >= pd.Timestamp(start)) & (dates <= pd.Timestamp(end))]
+        pd.testing.assert_frame_equal(flat(url_clicks[name]), url_sums(rows))